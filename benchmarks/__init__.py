@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import redis
+
+
+def get_redis_conn(redis_url=None, fake=False):
+    '''
+    Get a redis connection, to a real redis server or to an in-process
+    fakeredis server.
+
+    Arguments:
+    :redis_url -- string (default: none)
+    :fake -- boolean (default: false)
+
+    Returns: redis.client.Redis
+    '''
+    if fake:
+        import fakeredis
+        return fakeredis.FakeRedis()
+    if redis_url:
+        return redis.Redis.from_url(redis_url)
+    return redis.Redis()
+
+
+def get_percentile(values, percentile):
+    '''
+    Get the percentile of a list of values (nearest rank).
+
+    Arguments:
+    :values -- list of numbers
+    :percentile -- number, between 0 and 100
+
+    Returns: number, or, none, if there are no values
+    '''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(round(percentile / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+def get_net_bytes(redis_conn):
+    '''
+    Get the bytes the redis server has received and sent, since it was
+    started (INFO stats).
+
+    Arguments:
+    :redis_conn -- redis.client.Redis
+
+    Returns: tuple, input bytes and output bytes, or, none, if the server
+             does not report them (fakeredis)
+    '''
+    try:
+        stats = redis_conn.info('stats')
+    except redis.exceptions.ResponseError:
+        return None
+    if 'total_net_input_bytes' not in stats:
+        return None
+    return stats['total_net_input_bytes'], stats['total_net_output_bytes']
+
+
+def get_net_bytes_delta(net_bytes_from, net_bytes_to, net_bytes_overhead=None):
+    '''
+    Get the bytes received and sent by the redis server between two
+    get_net_bytes() calls, less the bytes of the INFO calls themselves.
+
+    Arguments:
+    :net_bytes_from -- tuple or none
+    :net_bytes_to -- tuple or none
+    :net_bytes_overhead -- tuple (default: none), bytes of a INFO call
+
+    Returns: tuple, or, none, if the server does not report them
+    '''
+    if net_bytes_from is None or net_bytes_to is None:
+        return None
+    overhead = net_bytes_overhead or (0, 0)
+    return tuple(max(b - a - o, 0) for a, b, o
+                 in zip(net_bytes_from, net_bytes_to, overhead))
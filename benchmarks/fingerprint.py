@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Bytes per element of the SmartQueue bucket, storing elements or its 64/128
+bits fingerprints, for URL like elements.
+
+Usage:
+
+    $ python -m benchmarks.fingerprint --redis-url redis://localhost:6379/15
+    $ python -m benchmarks.fingerprint --fake
+
+Bucket size is measured with MEMORY USAGE (redis >= 4.0). If the server does
+not support it (fakeredis), only the payload bytes are reported.
+'''
+
+import argparse
+import json
+
+import redis
+
+from benchmarks import get_redis_conn
+from pimpamqueues.smartqueue import SmartQueue
+
+
+FINGERPRINT_BITS = [None, 64, 128]
+
+NUM_ELEMENTS = 100000
+ELEMENT_PREFIX = 'https://www.example.com/some/path/to/a/page?id='
+
+
+def get_memory_usage(redis_conn, key):
+    '''
+    Get the bytes used by a key, sampling all its elements.
+
+    Arguments:
+    :redis_conn -- redis.client.Redis
+    :key -- string
+
+    Returns: integer, or, none, if server does not support MEMORY USAGE
+    '''
+    try:
+        return redis_conn.execute_command('MEMORY USAGE', key, 'SAMPLES', 0)
+    except redis.exceptions.ResponseError:
+        return None
+
+
+def run(redis_conn, num_elements=NUM_ELEMENTS):
+    '''
+    Push num_elements unique elements for each fingerprint width.
+
+    Arguments:
+    :redis_conn -- redis.client.Redis
+    :num_elements -- integer (default: NUM_ELEMENTS)
+
+    Returns: list of dicts
+    '''
+    elements = ['%s%s' % (ELEMENT_PREFIX, i) for i in range(num_elements)]
+
+    results = []
+    for fingerprint_bits in FINGERPRINT_BITS:
+        queue = SmartQueue(id_args=['benchmark', 'fingerprint'],
+                           keep_previous=False, redis_conn=redis_conn,
+                           fingerprint_bits=fingerprint_bits)
+        queue.push_some(elements)
+
+        num_payload_bytes = sum(len(queue.get_bucket_element(element))
+                                for element in elements)
+        num_bytes = get_memory_usage(redis_conn, queue.key_queue_bucket)
+
+        queue.delete()
+
+        results.append({
+            'fingerprint_bits': fingerprint_bits,
+            'num_elements': num_elements,
+            'bucket_bytes': num_bytes,
+            'bytes_per_element': (float(num_bytes) / num_elements
+                                  if num_bytes else None),
+            'payload_bytes_per_element': (float(num_payload_bytes) /
+                                          num_elements),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--redis-url', default=None)
+    parser.add_argument('--fake', action='store_true',
+                        help='use an in-process fakeredis server')
+    parser.add_argument('--num-elements', type=int, default=NUM_ELEMENTS)
+    args = parser.parse_args()
+
+    redis_conn = get_redis_conn(args.redis_url, args.fake)
+    for result in run(redis_conn, args.num_elements):
+        print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Throughput of BucketQueue.push_some and SmartQueue.push_some against block
+size and pipeline depth.
+
+Usage:
+
+    $ python -m benchmarks.push_some --redis-url redis://localhost:6379/15
+    $ python -m benchmarks.push_some --fake
+'''
+
+import argparse
+import json
+import time
+
+from benchmarks import get_redis_conn
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+
+
+QUEUE_CLASSES = [BucketQueue, SmartQueue]
+
+NUM_ELEMENTS = 100000
+NUM_BLOCK_SIZES = [100, 1000, 10000]
+NUM_PIPELINE_DEPTHS = [1, 10, 100]
+
+
+def run(redis_conn, num_elements=NUM_ELEMENTS):
+    '''
+    Push num_elements unique elements for each queue type, block size and
+    pipeline depth.
+
+    Arguments:
+    :redis_conn -- redis.client.Redis
+    :num_elements -- integer (default: NUM_ELEMENTS)
+
+    Returns: list of dicts
+    '''
+    elements = ['element:%s' % (i, ) for i in range(num_elements)]
+
+    results = []
+    for queue_class in QUEUE_CLASSES:
+        for num_block_size in NUM_BLOCK_SIZES:
+            for num_pipeline_depth in NUM_PIPELINE_DEPTHS:
+                queue = queue_class(id_args=['benchmark', 'push_some'],
+                                    keep_previous=False,
+                                    redis_conn=redis_conn)
+
+                time_start = time.time()
+                queue.push_some(elements, num_block_size=num_block_size,
+                                num_pipeline_depth=num_pipeline_depth)
+                seconds = time.time() - time_start
+
+                queue.delete()
+
+                results.append({
+                    'queue': queue_class.__name__,
+                    'num_elements': num_elements,
+                    'num_block_size': num_block_size,
+                    'num_pipeline_depth': num_pipeline_depth,
+                    'seconds': seconds,
+                    'elements_per_second': num_elements / seconds,
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--redis-url', default=None)
+    parser.add_argument('--fake', action='store_true',
+                        help='use an in-process fakeredis server')
+    parser.add_argument('--num-elements', type=int, default=NUM_ELEMENTS)
+    args = parser.parse_args()
+
+    redis_conn = get_redis_conn(args.redis_url, args.fake)
+    for result in run(redis_conn, args.num_elements):
+        print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark suite for SimpleQueue, BucketQueue and SmartQueue. It measures
+throughput, p50/p99 latency and network bytes of push, push_some, pop,
+pop_some and is_element over element sizes, block sizes, to_first/force
+flags, disambiguator on/off and SmartQueue reply/two phase modes, and emits
+the results as JSON.
+
+Network bytes are the server INFO stats input/output counters, they are
+null on servers which do not report them (fakeredis).
+
+Usage:
+
+    $ python -m benchmarks.suite --redis-url redis://localhost:6379/15 \
+        --output results.json
+    $ python -m benchmarks.suite --fake --quick
+    $ python -m benchmarks.suite --fake --compare results.json
+
+With --compare, it exits with a non zero status if any benchmark throughput
+drops more than --max-regression (a ratio, 0.2 by default) against a
+previous run.
+'''
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import redis
+
+from benchmarks import get_net_bytes
+from benchmarks import get_net_bytes_delta
+from benchmarks import get_percentile
+from benchmarks import get_redis_conn
+from pimpamqueues import __version__
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.smartqueue import REPLY_COUNT
+
+
+ID_ARGS = ['benchmark', 'suite']
+
+ELEMENT_SIZES = [16, 256, 4096]
+NUM_BLOCK_SIZES = [100, 1000, 10000]
+
+NUM_CALLS = 2000
+NUM_CALLS_SOME = 20
+NUM_ELEMENTS_SOME = 10000
+NUM_ELEMENTS_POP_SOME = 100
+
+MAX_REGRESSION = 0.2
+
+
+class Lowercase(object):
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+
+def get_elements(num_elements, element_size, prefix='e'):
+    '''
+    Get a list of unique elements of a fixed size.
+
+    Arguments:
+    :num_elements -- integer
+    :element_size -- integer, bytes per element
+    :prefix -- string (default: 'e')
+
+    Returns: list of strings
+    '''
+    elements = []
+    for i in range(num_elements):
+        element = '%s%s:' % (prefix, i)
+        elements.append(element + 'x' * max(element_size - len(element), 0))
+    return elements
+
+
+def get_queue_variants(redis_conn):
+    '''
+    Get the queues to be benchmarked, with the flags each one supports.
+
+    Arguments:
+    :redis_conn -- redis.client.Redis
+
+    Returns: list of tuples, (queue, params, push kwargs)
+    '''
+    variants = [
+        (SimpleQueue(ID_ARGS, redis_conn=redis_conn), {}, {}),
+        (SimpleQueue(ID_ARGS, redis_conn=redis_conn), {'to_first': True},
+         {'to_first': True}),
+        (BucketQueue(ID_ARGS, redis_conn=redis_conn), {}, {}),
+        (SmartQueue(ID_ARGS, redis_conn=redis_conn), {}, {}),
+        (SmartQueue(ID_ARGS, redis_conn=redis_conn), {'to_first': True},
+         {'to_first': True}),
+        (SmartQueue(ID_ARGS, redis_conn=redis_conn), {'force': True},
+         {'force': True}),
+        (SmartQueue(ID_ARGS, redis_conn=redis_conn,
+                    disambiguator=Lowercase), {'disambiguator': True}, {}),
+        (SmartQueue(ID_ARGS, redis_conn=redis_conn), {'reply': REPLY_COUNT},
+         {'reply': REPLY_COUNT}),
+        (SmartQueue(ID_ARGS, redis_conn=redis_conn, fingerprint_bits=64,
+                    two_phase=True), {'two_phase': True},
+         {'reply': REPLY_COUNT}),
+    ]
+    return variants
+
+
+def measure(call, num_calls, redis_conn):
+    '''
+    Call a function num_calls times and get each call latency, and the
+    network bytes of all calls.
+
+    Arguments:
+    :call -- callable, it receives the call number
+    :num_calls -- integer
+    :redis_conn -- redis.client.Redis
+
+    Returns: tuple, total seconds, list of latencies (seconds) and network
+             bytes (input, output or none)
+    '''
+    net_bytes_before = get_net_bytes(redis_conn)
+    net_bytes_start = get_net_bytes(redis_conn)
+    net_bytes_overhead = get_net_bytes_delta(net_bytes_before,
+                                             net_bytes_start)
+
+    latencies = []
+    time_start = time.time()
+    for i in range(num_calls):
+        time_call = time.time()
+        call(i)
+        latencies.append(time.time() - time_call)
+    seconds = time.time() - time_start
+
+    net_bytes = get_net_bytes_delta(net_bytes_start,
+                                    get_net_bytes(redis_conn),
+                                    net_bytes_overhead)
+    return seconds, latencies, net_bytes
+
+
+def get_result(benchmark, queue, params, num_elements, seconds, latencies,
+               net_bytes=None):
+    '''
+    Get a benchmark result.
+
+    Returns: dict
+    '''
+    net_input_bytes, net_output_bytes = net_bytes or (None, None)
+    return {
+        'benchmark': benchmark,
+        'queue': queue.__class__.__name__,
+        'params': params,
+        'num_calls': len(latencies),
+        'num_elements': num_elements,
+        'seconds': seconds,
+        'calls_per_second': len(latencies) / seconds if seconds else None,
+        'elements_per_second': num_elements / seconds if seconds else None,
+        'p50_ms': get_percentile(latencies, 50) * 1000,
+        'p99_ms': get_percentile(latencies, 99) * 1000,
+        'net_input_bytes': net_input_bytes,
+        'net_output_bytes': net_output_bytes,
+        'net_bytes_per_element': ((net_input_bytes + net_output_bytes) /
+                                  float(num_elements)
+                                  if net_bytes and num_elements else None),
+    }
+
+
+def bench_push(queue, params, kwargs, config):
+    '''
+    Push one element per call.
+    '''
+    kwargs = dict((k, v) for k, v in kwargs.items() if k != 'reply')
+    for element_size in config['element_sizes']:
+        queue.delete()
+        elements = get_elements(config['num_calls'], element_size)
+        seconds, latencies, net_bytes = measure(
+            lambda i: queue.push(elements[i], **kwargs), config['num_calls'],
+            queue.redis)
+        yield get_result('push', queue,
+                         dict(params, element_size=element_size),
+                         config['num_calls'], seconds, latencies, net_bytes)
+
+
+def bench_push_some(queue, params, kwargs, config):
+    '''
+    Push num_elements_some elements per call.
+    '''
+    num_elements = config['num_elements_some']
+    for element_size in config['element_sizes']:
+        for num_block_size in config['num_block_sizes']:
+            queue.delete()
+            elements = [get_elements(num_elements, element_size, 'c%s:' % i)
+                        for i in range(config['num_calls_some'])]
+            seconds, latencies, net_bytes = measure(
+                lambda i: queue.push_some(elements[i],
+                                          num_block_size=num_block_size,
+                                          **kwargs),
+                config['num_calls_some'], queue.redis)
+            yield get_result('push_some', queue,
+                             dict(params, element_size=element_size,
+                                  num_block_size=num_block_size),
+                             num_elements * config['num_calls_some'],
+                             seconds, latencies, net_bytes)
+
+
+def bench_push_some_duplicates(queue, params, kwargs, config):
+    '''
+    Push num_elements_some elements per call, all of them already queued.
+    '''
+    if not hasattr(queue, 'is_element'):
+        return
+    num_elements = config['num_elements_some']
+    for element_size in config['element_sizes']:
+        queue.delete()
+        elements = get_elements(num_elements, element_size)
+        queue.push_some(elements, **kwargs)
+        seconds, latencies, net_bytes = measure(
+            lambda i: queue.push_some(elements, **kwargs),
+            config['num_calls_some'], queue.redis)
+        yield get_result('push_some_duplicates', queue,
+                         dict(params, element_size=element_size),
+                         num_elements * config['num_calls_some'],
+                         seconds, latencies, net_bytes)
+
+
+def bench_pop(queue, params, kwargs, config):
+    '''
+    Pop one element per call.
+    '''
+    queue.delete()
+    queue.push_some(get_elements(config['num_calls'], 256))
+    seconds, latencies, net_bytes = measure(lambda i: queue.pop(),
+                                            config['num_calls'], queue.redis)
+    yield get_result('pop', queue, dict(params), config['num_calls'],
+                     seconds, latencies, net_bytes)
+
+
+def bench_pop_some(queue, params, kwargs, config):
+    '''
+    Pop num_elements_pop_some elements per call.
+    '''
+    num_elements = config['num_elements_pop_some']
+    queue.delete()
+    queue.push_some(get_elements(num_elements * config['num_calls_some'],
+                                 256))
+    seconds, latencies, net_bytes = measure(
+        lambda i: queue.pop_some(num_elements), config['num_calls_some'],
+        queue.redis)
+    yield get_result('pop_some', queue,
+                     dict(params, num_elements=num_elements),
+                     num_elements * config['num_calls_some'], seconds,
+                     latencies, net_bytes)
+
+
+def bench_is_element(queue, params, kwargs, config):
+    '''
+    Check one element per call, half of them are queued.
+    '''
+    if not hasattr(queue, 'is_element'):
+        return
+    queue.delete()
+    elements = get_elements(config['num_calls'], 256)
+    queue.push_some(elements[::2])
+    seconds, latencies, net_bytes = measure(
+        lambda i: queue.is_element(elements[i]), config['num_calls'],
+        queue.redis)
+    yield get_result('is_element', queue, dict(params), config['num_calls'],
+                     seconds, latencies, net_bytes)
+
+
+BENCHMARKS = [
+    bench_push,
+    bench_push_some,
+    bench_push_some_duplicates,
+    bench_pop,
+    bench_pop_some,
+    bench_is_element,
+]
+
+
+def get_config(quick=False):
+    '''
+    Get the benchmark parameters.
+
+    Arguments:
+    :quick -- boolean (default: false), a small run, for smoke testing
+
+    Returns: dict
+    '''
+    if quick:
+        return {
+            'element_sizes': [16, 256],
+            'num_block_sizes': [100, 1000],
+            'num_calls': 200,
+            'num_calls_some': 3,
+            'num_elements_some': 1000,
+            'num_elements_pop_some': NUM_ELEMENTS_POP_SOME,
+        }
+    return {
+        'element_sizes': ELEMENT_SIZES,
+        'num_block_sizes': NUM_BLOCK_SIZES,
+        'num_calls': NUM_CALLS,
+        'num_calls_some': NUM_CALLS_SOME,
+        'num_elements_some': NUM_ELEMENTS_SOME,
+        'num_elements_pop_some': NUM_ELEMENTS_POP_SOME,
+    }
+
+
+def run(redis_conn, config):
+    '''
+    Run every benchmark on every queue variant.
+
+    Arguments:
+    :redis_conn -- redis.client.Redis
+    :config -- dict
+
+    Returns: dict, run metadata and results
+    '''
+    results = []
+    for queue, params, kwargs in get_queue_variants(redis_conn):
+        for benchmark in BENCHMARKS:
+            results.extend(benchmark(queue, params, kwargs, config))
+        queue.delete()
+
+    return {
+        'meta': {
+            'pimpamqueues': __version__,
+            'python': platform.python_version(),
+            'redis_py': redis.__version__,
+            'time': time.time(),
+            'config': config,
+        },
+        'results': results,
+    }
+
+
+def get_result_key(result):
+    '''
+    Get a key which identifies a benchmark result across runs.
+
+    Returns: string
+    '''
+    return json.dumps([result['benchmark'], result['queue'],
+                       result['params']], sort_keys=True)
+
+
+def compare(run_results, baseline_results, max_regression=MAX_REGRESSION):
+    '''
+    Compare the throughput of a run against a previous run.
+
+    Arguments:
+    :run_results -- dict
+    :baseline_results -- dict
+    :max_regression -- float (default: MAX_REGRESSION)
+
+    Returns: list of dicts, benchmarks which regressed more than
+             max_regression
+    '''
+    baseline = dict((get_result_key(result), result)
+                    for result in baseline_results['results'])
+
+    regressions = []
+    for result in run_results['results']:
+        previous = baseline.get(get_result_key(result))
+        if not previous or not previous['elements_per_second']:
+            continue
+        ratio = result['elements_per_second'] / previous['elements_per_second']
+        if ratio < 1 - max_regression:
+            regressions.append({
+                'key': get_result_key(result),
+                'elements_per_second': result['elements_per_second'],
+                'baseline_elements_per_second':
+                    previous['elements_per_second'],
+                'ratio': ratio,
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--redis-url', default=None)
+    parser.add_argument('--fake', action='store_true',
+                        help='use an in-process fakeredis server')
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--output', default=None,
+                        help='write JSON results to a file')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of a previous run')
+    parser.add_argument('--max-regression', type=float,
+                        default=MAX_REGRESSION)
+    args = parser.parse_args()
+
+    redis_conn = get_redis_conn(args.redis_url, args.fake)
+    run_results = run(redis_conn, get_config(args.quick))
+
+    output = json.dumps(run_results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(run_results, json.load(f),
+                                  args.max_regression)
+        for regression in regressions:
+            sys.stderr.write('%s\n' % (json.dumps(regression), ))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
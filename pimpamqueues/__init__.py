@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import itertools
 import math
+import threading
 
 
 NUM_BLOCK_SIZE = 1000
+NUM_PIPELINE_DEPTH = 100
+NUM_DISAMBIGUATE_CHUNK_SIZE = 100
 
 QUEUE_COLLECTION_OF_URLS = 'urls'
 QUEUE_COLLECTION_OF_JOBS = 'jobs'
@@ -22,6 +26,24 @@ __version__ = "%s" % (".".join(str(v) for v in [VERSION_MAJOR, VERSION_MINOR,
 
 class Tools(object):
 
+    @staticmethod
+    def get_key_ids(id_args, cluster=False):
+        '''
+        Get the queue identifier part of redis key ids. For redis cluster,
+        it is wrapped as a hash tag, so all keys of a queue are stored in
+        the same hash slot.
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :cluster -- boolean (default: false)
+
+        Returns: string
+        '''
+        key_ids = '.'.join(id_args)
+        if cluster:
+            return '{%s}' % (key_ids, )
+        return key_ids
+
     @staticmethod
     def get_block_slices(num_elements, num_block_size=None):
         '''
@@ -53,3 +75,96 @@ class Tools(object):
             block_slices.append([position_from, position_to])
 
         return block_slices
+
+    @staticmethod
+    def get_blocks(elements, num_block_size=None):
+        '''
+        Get blocks of elements from any iterable, even an unbounded one. Only
+        one block is held in memory at a time, elements are pulled from the
+        iterable as each block is filled.
+
+        Arguments:
+        :elements -- an iterable of elements
+        :num_block_size -- integer (default: none), how big are going to be
+                           the blocks
+
+        Returns: generator of lists
+        '''
+        if num_block_size is None:
+            num_block_size = NUM_BLOCK_SIZE
+
+        elements = iter(elements)
+        while True:
+            block = list(itertools.islice(elements, num_block_size))
+            if not block:
+                return
+            yield block
+
+    @staticmethod
+    def disambiguate_some(disambiguator, elements):
+        '''
+        Treat a list of elements with a disambiguator, at once with its
+        disambiguate_some static method if it has one, otherwise one by one
+        with its disambiguate static method.
+
+        Arguments:
+        :disambiguator -- class, a class with a disambiguate static method,
+                          and optionally a disambiguate_some static method
+                          which receives a list of strings and returns a
+                          list of strings
+        :elements -- a list of strings
+
+        Returns: list of strings
+        '''
+        disambiguate_some = getattr(disambiguator, 'disambiguate_some', None)
+        if disambiguate_some is not None:
+            return list(disambiguate_some(elements))
+        disambiguate = disambiguator.disambiguate
+        return [disambiguate(element) for element in elements]
+
+    @staticmethod
+    def iter_pages(get_page, cursor, prefetch=False):
+        '''
+        Iterate the elements of a paged (or cursor based) read, one page at
+        a time, so at most one page (two with prefetch) is held in memory.
+        With prefetch, the next page is read on a background thread while
+        the current one is consumed.
+
+        Arguments:
+        :get_page -- callable, it receives a cursor and returns a tuple, the
+                     next cursor (none on the last page) and the page
+                     elements
+        :cursor -- the first cursor
+        :prefetch -- boolean (default: false)
+
+        Returns: generator of elements
+        '''
+        if not prefetch:
+            while cursor is not None:
+                cursor, page = get_page(cursor)
+                for element in page:
+                    yield element
+            return
+
+        def fetch(cursor, result):
+            try:
+                result.append(get_page(cursor))
+            except Exception as e:
+                result.append(e)
+
+        result = []
+        thread = threading.Thread(target=fetch, args=(cursor, result))
+        thread.daemon = True
+        thread.start()
+        while thread is not None:
+            thread.join()
+            if isinstance(result[0], Exception):
+                raise result[0]
+            (cursor, page), result = result[0], []
+            thread = None
+            if cursor is not None:
+                thread = threading.Thread(target=fetch, args=(cursor, result))
+                thread.daemon = True
+                thread.start()
+            for element in page:
+                yield element
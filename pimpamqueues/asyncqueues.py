@@ -0,0 +1,769 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import redis.asyncio
+from redis.exceptions import NoScriptError
+
+from pimpamqueues import QUEUE_COLLECTION_OF_ELEMENTS
+
+from pimpamqueues import Tools
+from pimpamqueues.cluster import ClusterTools
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_BUCKET_PUSH
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH_FORCE
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_PUSH_TRACKED
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_POP_TRACKED
+from pimpamqueues.luascripts import SCRIPT_BUCKET_POP_TRACKED
+from pimpamqueues.exceptions import PimPamQueuesError
+from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
+from pimpamqueues.exceptions import PimPamQueuesDisambiguatorInvalidError
+
+
+class AsyncBatcher(object):
+    '''
+    Collects the redis commands issued by concurrent callers during the same
+    event loop iteration and sends them to the redis server in one
+    pipeline. There is one batcher per asyncio redis connection, so queues
+    which share a connection also share pipelines. The batcher is kept on
+    the connection itself, so both are collected together.
+    '''
+
+    ATTRIBUTE_NAME = 'pimpamqueues_batcher'
+
+    def __init__(self, redis_conn):
+        '''
+        Create a AsyncBatcher object.
+
+        Arguments:
+        :redis_conn -- redis.asyncio.Redis
+        '''
+        self.redis = redis_conn
+        self.commands = []
+        self.tasks = set()
+
+    @staticmethod
+    def get(redis_conn):
+        '''
+        Get the batcher of a asyncio redis connection.
+
+        Arguments:
+        :redis_conn -- redis.asyncio.Redis
+
+        Returns: AsyncBatcher
+        '''
+        batcher = getattr(redis_conn, AsyncBatcher.ATTRIBUTE_NAME, None)
+        if batcher is None:
+            batcher = AsyncBatcher(redis_conn)
+            setattr(redis_conn, AsyncBatcher.ATTRIBUTE_NAME, batcher)
+        return batcher
+
+    def call(self, command, *args):
+        '''
+        Add a command to the next pipeline.
+
+        Arguments:
+        :command -- string, a redis.asyncio.client.Pipeline method name
+        :args -- command arguments
+
+        Returns: asyncio.Future, the command result
+        '''
+        return self.__add(command, args)
+
+    def call_script(self, name, keys, args):
+        '''
+        Add a call of a registered Lua script to the next pipeline. Script
+        is called by its SHA1 digest.
+
+        Arguments:
+        :name -- string, a pimpamqueues.luascripts.lua_scripts script name
+        :keys -- list of strings, script's KEYS
+        :args -- list of strings, script's ARGV
+
+        Returns: asyncio.Future, the script result
+        '''
+        args = [lua_scripts.get_sha(name), len(keys)] + keys + list(args)
+        return self.__add('evalsha', args, name)
+
+    def __add(self, command, args, name=None):
+        '''
+        Add a command to the next pipeline, the pipeline is sent once the
+        running event loop iteration finishes.
+
+        Arguments:
+        :command -- string
+        :args -- command arguments
+        :name -- string (default: none), script name for evalsha commands
+
+        Returns: asyncio.Future
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self.commands:
+            loop.call_soon(self.__flush)
+        self.commands.append((command, args, name, future))
+        return future
+
+    def __flush(self):
+        '''
+        Send all collected commands. Running tasks are referenced until
+        they are done, so they are not collected mid-flight.
+        '''
+        commands, self.commands = self.commands, []
+        task = asyncio.ensure_future(self.__execute(commands))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def __execute(self, commands):
+        '''
+        Send a bunch of commands in one pipeline and resolve its futures.
+        Any error fails the futures which are not resolved yet.
+
+        Arguments:
+        :commands -- list of tuples
+        '''
+        try:
+            await self.__execute_pipeline(commands)
+        except Exception as e:
+            for command, args, name, future in commands:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def __execute_pipeline(self, commands):
+        '''
+        Send a bunch of commands in one pipeline and resolve its futures.
+
+        Arguments:
+        :commands -- list of tuples
+        '''
+        try:
+            for name in set(c[2] for c in commands if c[2] is not None):
+                if not lua_scripts.is_loaded(self.redis, name):
+                    await self.redis.script_load(lua_scripts.get_source(name))
+                    lua_scripts.set_loaded(self.redis, name)
+
+            pipe = self.redis.pipeline(transaction=False)
+            for command, args, name, future in commands:
+                getattr(pipe, command)(*args)
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for command, args, name, future in commands:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (command, args, name, future), result in zip(commands, results):
+            if name is not None and isinstance(result, NoScriptError):
+                try:
+                    await self.redis.script_load(
+                        lua_scripts.get_source(name))
+                    lua_scripts.set_loaded(self.redis, name, reloaded=True)
+                    result = await self.redis.evalsha(*args)
+                except Exception as e:
+                    result = e
+            elif name is not None and not isinstance(result, Exception):
+                lua_scripts.add_hits()
+
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class AsyncSimpleQueue(object):
+    '''
+    A lightweight asyncio queue. Simple Queue. It works on the same redis
+    keys than SimpleQueue does, with the same track_stats flag.
+    '''
+
+    QUEUE_TYPE_NAME = SimpleQueue.QUEUE_TYPE_NAME
+
+    get_key_queue = SimpleQueue.get_key_queue
+    get_key_stats = SimpleQueue.get_key_stats
+    get_key_enqueued = SimpleQueue.get_key_enqueued
+
+    def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 redis_conn=None, cluster=None, track_stats=False,
+                 codec=None):
+        '''
+        Create a AsyncSimpleQueue object. For a fresh queue, await delete().
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :redis_conn -- redis.asyncio.Redis (default: None), a redis
+                       connection will be created using the default
+                       redis.asyncio.Redis connection params.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :track_stats -- boolean (default: false), a flag to keep pushed and
+                        popped counters and enqueue times, as SimpleQueue
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, as SimpleQueue
+        '''
+        self.id_args = id_args
+        self.collection_of = collection_of
+        self.track_stats = track_stats
+        self.codec = codec
+
+        if redis_conn is None:
+            redis_conn = redis.asyncio.Redis()
+        self.redis = redis_conn
+
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+        self.batcher = AsyncBatcher.get(redis_conn)
+
+        self.key_queue = self.get_key_queue()
+        self.key_queue_stats = self.get_key_stats()
+        self.key_queue_enqueued = self.get_key_enqueued()
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<AsyncSimpleQueue: %s>' % (self.key_queue, )
+
+    async def push(self, element, to_first=False):
+        '''
+        Push a element into the queue. Element can be pushed to the first or
+        last position (by default is pushed to the last position).
+
+        Arguments:
+        :element -- string
+        :to_first -- boolean (default: False)
+
+        Raise:
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: long, the number of queued elements
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+        return await self.push_some([element, ], to_first)
+
+    async def push_some(self, elements, to_first=False, num_block_size=None):
+        '''
+        Push a bunch of elements into the queue. Elements can be pushed to the
+        first or last position (by default are pushed to the last position).
+
+        Arguments:
+        :elements -- a collection of strings
+        :to_first -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Returns: long, the number of queued elements
+        '''
+        try:
+
+            elements = CodecTools.encode_some(self.codec, list(elements))
+
+            if to_first:
+                elements.reverse()
+
+            block_slices = Tools.get_block_slices(
+                num_elements=len(elements),
+                num_block_size=num_block_size
+            )
+
+            command = 'lpush' if to_first else 'rpush'
+            if self.track_stats:
+                keys = [self.key_queue, self.key_queue_enqueued,
+                        self.key_queue_stats]
+                futures = [self.batcher.call_script(
+                    SCRIPT_SIMPLE_PUSH_TRACKED, keys,
+                    [command, ] + elements[s[0]:s[1]])
+                    for s in block_slices]
+            else:
+                futures = [self.batcher.call(command, self.key_queue,
+                                             *elements[s[0]:s[1]])
+                           for s in block_slices]
+            return (await asyncio.gather(*futures)).pop()
+
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    async def pop(self, last=False):
+        '''
+        Pop a element from the queue. Element can be popped from the begining
+        or the ending of the queue (by default pops from the begining).
+
+        If no element is poped, it returns None
+
+        Arguments:
+        :last -- boolean (default: false)
+
+        Returns: string, the popped element, or, none, if no element is popped
+        '''
+        if self.track_stats:
+            popped_elements = await self.batcher.call_script(
+                SCRIPT_SIMPLE_POP_TRACKED,
+                [self.key_queue, self.key_queue_enqueued,
+                 self.key_queue_stats], ['last' if last else 'first', 1])
+            element = popped_elements[0] if popped_elements else None
+        else:
+            element = await self.batcher.call('rpop' if last else 'lpop',
+                                              self.key_queue)
+        return CodecTools.decode(self.codec, element)
+
+    async def num(self):
+        '''
+        Get the number of elements that are queued.
+
+        Returns: integer, the number of elements that are queued
+        '''
+        return await self.batcher.call('llen', self.key_queue)
+
+    async def is_empty(self):
+        '''
+        Check if the queue is empty.
+
+        Returns: boolean, true if queue is empty, otherwise false
+        '''
+        return await self.num() == 0
+
+    async def is_not_empty(self):
+        '''
+        Check if the queue is not empty.
+
+        Returns: boolean, true if queue is not empty, otherwise false
+        '''
+        return not await self.is_empty()
+
+    async def elements(self, queue_from=0, queue_to=-1):
+        '''
+        Get some (or even all) queued elements, by the order that they are
+        queued. By default it returns all queued elements.
+
+        Arguments:
+        :queue_from -- integer (default: 0)
+        :queue_to -- integer (default: -1)
+
+        Returns: list
+        '''
+        return CodecTools.decode_some(
+            self.codec, await self.batcher.call('lrange', self.key_queue,
+                                                queue_from, queue_to))
+
+    async def delete(self):
+        '''
+        Delete the queue with all its elements.
+
+        Returns: boolean, true if queue has been deleted, otherwise false
+        '''
+        keys = [self.key_queue, self.key_queue_stats, self.key_queue_enqueued]
+        return True if await self.batcher.call('delete', *keys) else False
+
+
+class AsyncBucketQueue(object):
+    '''
+    A lightweight asyncio queue. Bucket Queue. It works on the same redis
+    keys than BucketQueue does, with the same track_stats flag.
+    '''
+
+    QUEUE_TYPE_NAME = BucketQueue.QUEUE_TYPE_NAME
+
+    get_key_bucket = BucketQueue.get_key_bucket
+    get_key_bucket_signal = BucketQueue.get_key_bucket_signal
+    get_key_bucket_stats = BucketQueue.get_key_bucket_stats
+
+    def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 redis_conn=None, cluster=None, track_stats=False,
+                 codec=None):
+        '''
+        Create a AsyncBucketQueue object. For a fresh queue, await delete().
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :redis_conn -- redis.asyncio.Redis (default: None), a redis
+                       connection will be created using the default
+                       redis.asyncio.Redis connection params.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :track_stats -- boolean (default: false), a flag to keep pushed and
+                        popped counters, as BucketQueue
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, as BucketQueue
+        '''
+        self.id_args = id_args
+        self.collection_of = collection_of
+        self.track_stats = track_stats
+        self.codec = codec
+
+        if redis_conn is None:
+            redis_conn = redis.asyncio.Redis()
+        self.redis = redis_conn
+
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+        self.batcher = AsyncBatcher.get(redis_conn)
+
+        self.key_queue_bucket = self.get_key_bucket()
+        self.key_queue_bucket_signal = self.get_key_bucket_signal()
+        self.key_queue_bucket_stats = self.get_key_bucket_stats()
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<AsyncBucketQueue: %s>' % (self.key_queue_bucket, )
+
+    async def push(self, element):
+        '''
+        Push a element into the queue.
+
+        Arguments:
+        :element -- string
+
+        Returns: string, element if element was queued otherwise a empty string
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+        return element if await self.push_some([element, ]) else ''
+
+    async def push_some(self, elements, num_block_size=None):
+        '''
+        Push a bunch of elements into the queue.
+
+        Arguments:
+        :elements -- a collection of strings
+        :num_block_size -- integer (default: none)
+
+        Returns: list of strings, list of queued elements
+        '''
+        try:
+
+            elements = CodecTools.encode_some(self.codec, list(elements))
+
+            block_slices = Tools.get_block_slices(
+                num_elements=len(elements),
+                num_block_size=num_block_size
+            )
+
+            keys = [self.key_queue_bucket, self.key_queue_bucket_signal]
+            if self.track_stats:
+                keys.append(self.key_queue_bucket_stats)
+            futures = [self.batcher.call_script(SCRIPT_BUCKET_PUSH, keys,
+                                                elements[s[0]:s[1]])
+                       for s in block_slices]
+
+            queued_elements = []
+            for some_elements in await asyncio.gather(*futures):
+                queued_elements.extend(some_elements)
+            return queued_elements
+
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    async def pop(self):
+        '''
+        Pop a random element from the queue.
+
+        If no element is poped, it returns None
+
+        Returns: string, the popped element, or, none, if no element is popped
+        '''
+        if self.track_stats:
+            popped_elements = await self.batcher.call_script(
+                SCRIPT_BUCKET_POP_TRACKED,
+                [self.key_queue_bucket, self.key_queue_bucket_stats], [1, ])
+            element = popped_elements[0] if popped_elements else None
+        else:
+            element = await self.batcher.call('spop', self.key_queue_bucket)
+        return CodecTools.decode(self.codec, element)
+
+    async def num(self):
+        '''
+        Get the number of elements that are queued.
+
+        Returns: integer, the number of elements that are queued
+        '''
+        return await self.batcher.call('scard', self.key_queue_bucket)
+
+    async def is_empty(self):
+        '''
+        Check if the queue is empty.
+
+        Returns: boolean, true if queue is empty, otherwise false
+        '''
+        return await self.num() == 0
+
+    async def is_not_empty(self):
+        '''
+        Check if the queue is not empty.
+
+        Returns: boolean, true if queue is not empty, otherwise false
+        '''
+        return not await self.is_empty()
+
+    async def is_element(self, element):
+        '''
+        Checks if a element is in the queue. It returns true is element is in
+        the queue, otherwise false.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean
+        '''
+        return bool(await self.batcher.call(
+            'sismember', self.key_queue_bucket,
+            CodecTools.encode(self.codec, element)))
+
+    async def elements(self, num_elements=-1):
+        '''
+        Get some (or even all) unordered queued elements.
+        By default it returns all queued elements.
+
+        With a codec, decoded elements are returned in a list, as they may
+        not be hashable.
+
+        Arguments:
+        :num_elements -- integer (default: -1).
+
+        Returns: set, or, list, with a codec
+        '''
+        if num_elements == -1:
+            elements = set(await self.batcher.call('smembers',
+                                                   self.key_queue_bucket))
+        else:
+            elements = set(await self.batcher.call('srandmember',
+                                                   self.key_queue_bucket,
+                                                   num_elements))
+        if self.codec is None:
+            return elements
+        return self.codec.decode_some(list(elements))
+
+    async def delete(self):
+        '''
+        Delete the queue with all its elements.
+
+        Returns: boolean, true if queue has been deleted, otherwise false
+        '''
+        keys = [self.key_queue_bucket, self.key_queue_bucket_signal,
+                self.key_queue_bucket_stats]
+        return True if await self.batcher.call('delete', *keys) else False
+
+
+class AsyncSmartQueue(AsyncSimpleQueue):
+    '''
+    A lightweight asyncio queue. Smart Queue. It works on the same redis
+    keys than SmartQueue does, with the same track_stats flag and codec. Its
+    bucket stores (serialized) elements, so it can not share keys with a
+    SmartQueue which uses fingerprint_bits, dedup_window or dedup_key, and
+    those are rejected.
+    '''
+
+    QUEUE_TYPE_NAME = SmartQueue.QUEUE_TYPE_NAME
+
+    get_key_queue = SmartQueue.get_key_queue
+    get_key_bucket = SmartQueue.get_key_bucket
+    get_key_bucket_fingerprints = SmartQueue.get_key_bucket_fingerprints
+
+    def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 redis_conn=None, disambiguator=None, cluster=None,
+                 track_stats=False, fingerprint_bits=None, dedup_window=None,
+                 dedup_key=None, codec=None):
+        '''
+        Create a AsyncSmartQueue object. For a fresh queue, await delete().
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :redis_conn -- redis.asyncio.Redis (default: None), a redis
+                       connection will be created using the default
+                       redis.asyncio.Redis connection params.
+        :disambiguator -- class (default: none), a class with a disambiguate
+                          static method which receives a string as an argument
+                          and return a string.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :track_stats -- boolean (default: false), a flag to keep pushed and
+                        popped counters and enqueue times, as SmartQueue
+        :fingerprint_bits -- not supported, it has to be none
+        :dedup_window -- not supported, it has to be none
+        :dedup_key -- not supported, it has to be none
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, as SmartQueue
+
+        Raise:
+        :PimPamQueuesDisambiguatorInvalidError(), if disambiguator argument
+                                                  is invalid
+        :PimPamQueuesError(), if fingerprint_bits, dedup_window or dedup_key
+                              are given
+        '''
+        if disambiguator and not disambiguator.__dict__.get('disambiguate'):
+            raise PimPamQueuesDisambiguatorInvalidError()
+
+        if fingerprint_bits or dedup_window or dedup_key is not None:
+            raise PimPamQueuesError('AsyncSmartQueue does not support '
+                                    'fingerprint_bits, dedup_window or '
+                                    'dedup_key')
+
+        self.disambiguator = disambiguator
+
+        super(AsyncSmartQueue, self).__init__(id_args, collection_of,
+                                              redis_conn, cluster,
+                                              track_stats, codec)
+
+        self.key_queue_bucket = self.get_key_bucket()
+
+        self.keys = [self.key_queue, self.key_queue_bucket,
+                     self.key_queue_stats, self.key_queue_enqueued,
+                     self.get_key_bucket_fingerprints(), ]
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<AsyncSmartQueue: %s>' % (self.key_queue, )
+
+    async def push(self, element, to_first=False, force=False):
+        '''
+        Push a element into the queue. Element can be pushed to the first or
+        last position (by default is pushed to the last position).
+
+        Arguments:
+        :element -- string
+        :to_first -- boolean (default: False)
+        :force -- boolean (default: False)
+
+        Raise:
+        :PimPamQueuesError(), if element can not be pushed
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: string, if element was queued returns the queued element,
+                 otherwise, empty string
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+
+        try:
+            if await self.push_some([element, ], to_first, force):
+                return element
+            return ''
+        except Exception:
+            raise PimPamQueuesError("%s was not pushed" % (element))
+
+    async def push_some(self, elements, to_first=False, force=False,
+                        num_block_size=None):
+        '''
+        Push a bunch of elements into the queue. Elements can be pushed to the
+        first or last position (by default are pushed to the last position).
+
+        Arguments:
+        :elements -- a collection of strings
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+        :num_block_size -- integer (default: none)
+
+        Raise:
+        :PimPamQueuesError(), if element can not be pushed
+
+        Returns: list of strings, a list with queued elements
+        '''
+        try:
+
+            elements = self.disambiguate_some(list(elements))
+
+            if to_first:
+                elements.reverse()
+
+            block_slices = Tools.get_block_slices(
+                num_elements=len(elements),
+                num_block_size=num_block_size
+            )
+
+            name = SCRIPT_SMART_PUSH_FORCE if force else SCRIPT_SMART_PUSH
+            push_to = 'lpush' if to_first else 'rpush'
+            keys = [self.key_queue_bucket, self.key_queue]
+            if self.track_stats:
+                keys.extend([self.key_queue_enqueued, self.key_queue_stats])
+            blocks = [elements[s[0]:s[1]] for s in block_slices]
+            futures = [self.batcher.call_script(
+                name, keys,
+                [push_to, ] + CodecTools.encode_some(self.codec, some))
+                for some in blocks]
+
+            queued_elements = []
+            for some_elements, indices in zip(blocks,
+                                              await asyncio.gather(*futures)):
+                queued_elements.extend(some_elements[i - 1] for i in indices)
+            return queued_elements
+
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def disambiguate(self, element):
+        '''
+        Treats a element.
+
+        Arguments:
+        :element -- string
+
+        Returns: string
+        '''
+        if self.disambiguator:
+            return self.disambiguator.disambiguate(element)
+        return element
+
+    def disambiguate_some(self, elements):
+        '''
+        Treats a list of elements.
+
+        Arguments:
+        :elements -- elements
+
+        Returns: list of strings
+        '''
+        if self.disambiguator:
+            return Tools.disambiguate_some(self.disambiguator, elements)
+        return elements
+
+    async def is_element(self, element):
+        '''
+        Checks if a element has been queued. It returns true is element is in
+        the queue's bucket, otherwise false.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean
+        '''
+        return bool(await self.batcher.call(
+            'sismember', self.key_queue_bucket,
+            CodecTools.encode(self.codec, element)))
+
+    async def delete(self):
+        '''
+        Delete the queue with all its elements.
+
+        Returns: boolean, true if queue has been deleted, otherwise false
+        '''
+        return True if await self.batcher.call('delete', *self.keys) else False
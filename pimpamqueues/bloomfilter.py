@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+import struct
+
+
+NUM_CAPACITY = 1000000
+ERROR_RATE = 0.001
+
+
+class BloomFilter(object):
+    '''
+    A local, in-process, Bloom filter. It is used in front of the bucket of
+    BucketQueue and SmartQueue to spot elements that have probably been
+    pushed before, without a round trip.
+
+    A filter does not know about elements pushed by other processes, and
+    BucketQueue popped elements are not removed from it, so neither its
+    positives nor its negatives are trusted: every element is still sent to
+    the push scripts, which check it against the bucket (it is always
+    authoritative) in the same call, and positives which are queued are
+    counted as false positives.
+    '''
+
+    def __init__(self, capacity=NUM_CAPACITY, error_rate=ERROR_RATE,
+                 num_bits=None, num_hashes=None):
+        '''
+        Create a BloomFilter object.
+
+        Memory use is num_bits / 8 bytes. By default, it is sized to keep
+        the error_rate up to capacity elements (about 1.8 MB for a million
+        elements at 0.1%).
+
+        Arguments:
+        :capacity -- integer (default: NUM_CAPACITY), expected number of
+                     elements
+        :error_rate -- float (default: ERROR_RATE), expected false positive
+                       rate at capacity
+        :num_bits -- integer (default: none), filter size, it overrides the
+                     size computed from capacity and error_rate
+        :num_hashes -- integer (default: none), bits set per element, by
+                       default the optimal number for num_bits and capacity
+        '''
+        if num_bits is None:
+            num_bits = int(math.ceil(-capacity * math.log(error_rate) /
+                                     math.log(2) ** 2))
+        if num_hashes is None:
+            num_hashes = int(round(float(num_bits) / capacity * math.log(2)))
+
+        self.capacity = capacity
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = max(num_hashes, 1)
+
+        self.bits = bytearray(int(math.ceil(self.num_bits / 8.0)))
+        self.num_elements = 0
+
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_false_positives = 0
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<BloomFilter: %s bits, %s hashes (%s)>' % (
+            self.num_bits, self.num_hashes, self.num_elements)
+
+    def __contains__(self, element):
+        '''
+        Check if a element has probably been added to the filter. Lookups
+        are counted as hits or misses.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, true if element has probably been added, false if
+                 element has not been added for sure
+        '''
+        for position in self.__get_positions(element):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                self.num_misses += 1
+                return False
+        self.num_hits += 1
+        return True
+
+    def is_element(self, element):
+        '''
+        Check if a element has probably been added to the filter.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean
+        '''
+        return element in self
+
+    def add(self, element):
+        '''
+        Add a element to the filter.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, true if element was not in the filter
+        '''
+        added = False
+        for position in self.__get_positions(element):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.num_elements += 1
+        return added
+
+    def add_some(self, elements):
+        '''
+        Add a bunch of elements to the filter.
+
+        Arguments:
+        :elements -- a collection of strings
+
+        Returns: integer, the number of elements which were not in the filter
+        '''
+        return sum(1 for element in elements if self.add(element))
+
+    def add_false_positives(self, num_false_positives):
+        '''
+        Count hits which have turned out to be false, once checked against
+        the bucket.
+
+        Arguments:
+        :num_false_positives -- integer
+        '''
+        self.num_false_positives += num_false_positives
+
+    def clear(self):
+        '''
+        Remove all elements from the filter. Counters are kept.
+        '''
+        self.bits = bytearray(len(self.bits))
+        self.num_elements = 0
+
+    def get_error_rate(self):
+        '''
+        Get the expected false positive rate, given the filter's fill ratio.
+
+        Returns: float
+        '''
+        num_bits_set = sum(bin(byte).count('1') for byte in self.bits)
+        return (float(num_bits_set) / self.num_bits) ** self.num_hashes
+
+    def stats(self):
+        '''
+        Get the filter counters. The measured false positive rate is the
+        ratio of verified false hits out of the lookups of elements which
+        were not in the bucket.
+
+        Returns: dict
+        '''
+        num_negatives = self.num_misses + self.num_false_positives
+        return {
+            'num_bits': self.num_bits,
+            'num_bytes': len(self.bits),
+            'num_hashes': self.num_hashes,
+            'num_elements': self.num_elements,
+            'num_hits': self.num_hits,
+            'num_misses': self.num_misses,
+            'num_false_positives': self.num_false_positives,
+            'false_positive_rate': (float(self.num_false_positives) /
+                                    num_negatives if num_negatives else 0.0),
+            'error_rate': self.get_error_rate(),
+        }
+
+    def reset_stats(self):
+        '''
+        Reset the filter counters.
+        '''
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_false_positives = 0
+
+    def __get_positions(self, element):
+        '''
+        Get the filter bit positions of a element, using double hashing on
+        the two halves of its MD5 digest.
+
+        Arguments:
+        :element -- string
+
+        Returns: generator of integers
+        '''
+        if not isinstance(element, (bytes, bytearray, memoryview)):
+            element = ('%s' % (element, )).encode('utf-8')
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(element).digest())
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
@@ -1,11 +1,32 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import redis
+import math
+import time
 
 from pimpamqueues import QUEUE_COLLECTION_OF_ELEMENTS
+from pimpamqueues import NUM_PIPELINE_DEPTH
+from pimpamqueues import NUM_BLOCK_SIZE
 
 from pimpamqueues import Tools
+from pimpamqueues.cluster import ClusterTools
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.connections import connections
+from pimpamqueues.instrumentation import instrumented
+from pimpamqueues.instrumentation import Instrumentation
+from pimpamqueues.instrumentation import OPERATION_PUSH
+from pimpamqueues.instrumentation import OPERATION_PUSH_SOME
+from pimpamqueues.instrumentation import OPERATION_POP
+from pimpamqueues.instrumentation import OPERATION_POP_SOME
+from pimpamqueues.instrumentation import COUNTER_BLOCKS
+from pimpamqueues.instrumentation import COUNTER_BYTES_SENT
+from pimpamqueues.instrumentation import COUNTER_DUPLICATES
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_BUCKET_PUSH
+from pimpamqueues.luascripts import SCRIPT_BUCKET_POP_TRACKED
+from pimpamqueues.queuestats import QueueStats
+from pimpamqueues.queuestats import KEY_STATS_PUSHED
+from pimpamqueues.queuestats import KEY_STATS_POPPED
 from pimpamqueues.exceptions import PimPamQueuesError
 from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
 
@@ -19,7 +40,9 @@ class BucketQueue(object):
     QUEUE_TYPE_NAME = 'bucket'
 
     def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
-                 keep_previous=True, redis_conn=None):
+                 keep_previous=True, redis_conn=None, cluster=None,
+                 dedup_filter=None, codec=None, observer=None,
+                 track_stats=False):
         '''
         Create a SimpleQueue object.
 
@@ -29,18 +52,43 @@ class BucketQueue(object):
                           a type descriptor of queued elements
         :keep_previous -- boolean (default: true),
                           a flag to create a fresh queue or not
-        :redis_conn -- redis.client.Redis (default: None), a redis
-                       connection will be created using the default
-                       redis.client.Redis connection params.
+        :redis_conn -- redis.client.Redis (default: None), by default the
+                       shared connection of the connection registry is
+                       used. It can be a redis.cluster.RedisCluster too.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :dedup_filter -- pimpamqueues.bloomfilter.BloomFilter (default: none),
+                         a local filter of pushed elements, which counts
+                         lookups and the false positives that the push
+                         scripts queue
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings.
+                  Equal elements have to be encoded to equal bytes.
+        :observer -- pimpamqueues.instrumentation.Observer (default: none),
+                     an observer of queue operations
+        :track_stats -- boolean (default: false), a flag to keep pushed and
+                        popped counters, for stats()
         '''
         self.id_args = id_args
         self.collection_of = collection_of
+        self.dedup_filter = dedup_filter
+        self.codec = codec
+        self.observer = observer
+        self.track_stats = track_stats
 
         if redis_conn is None:
-            redis_conn = redis.Redis()
+            redis_conn = connections.get()
         self.redis = redis_conn
 
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+
         self.key_queue_bucket = self.get_key_bucket()
+        self.key_queue_bucket_signal = self.get_key_bucket_signal()
+        self.key_queue_bucket_stats = self.get_key_bucket_stats()
 
         if keep_previous is False:
             self.delete()
@@ -53,17 +101,69 @@ class BucketQueue(object):
         '''
         return '<BucketQueue: %s (%s)>' % (self.key_queue_bucket, self.num())
 
-    def get_key_bucket(self):
+    def get_key_bucket(self, cluster=None):
         '''
         Get a key id that will be used to store/retrieve data from
         the redis server.
 
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
         Returns: string
         '''
-        return 'queue:%s:type:%s:of:%s' % ('.'.join(self.id_args),
+        if cluster is None:
+            cluster = self.cluster
+        return 'queue:%s:type:%s:of:%s' % (Tools.get_key_ids(self.id_args,
+                                                             cluster),
                                            BucketQueue.QUEUE_TYPE_NAME,
                                            self.collection_of)
 
+    def get_key_bucket_signal(self, cluster=None):
+        '''
+        Get a key id of the list which is used to notify to blocked consumers
+        that elements have been pushed into the queue.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        return '%s:signal' % (self.get_key_bucket(cluster), )
+
+    def get_key_bucket_stats(self, cluster=None):
+        '''
+        Get a key id of the hash which keeps the queue's pushed and popped
+        counters.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        return '%s:stats' % (self.get_key_bucket(cluster), )
+
+    def migrate_keys(self, source_redis_conn=None):
+        '''
+        Move a queue stored with the key names used without the cluster flag
+        to the queue's key names. On the same (non cluster) redis server keys
+        are renamed, otherwise elements are copied block by block, from
+        source_redis_conn if it is given (source keys are kept) or from the
+        queue's redis connection (source keys are deleted).
+
+        Returns: integer, the number of migrated keys
+        '''
+        key_pairs = [
+            (self.get_key_bucket(cluster=False), self.key_queue_bucket),
+            (self.get_key_bucket_signal(cluster=False),
+             self.key_queue_bucket_signal),
+        ]
+        return ClusterTools.migrate_keys(key_pairs, self.redis,
+                                         source_redis_conn)
+
+    @instrumented(OPERATION_PUSH)
     def push(self, element):
         '''
         Push a element into the queue.
@@ -77,19 +177,35 @@ class BucketQueue(object):
             raise PimPamQueuesElementWithoutValueError()
         return element if self.push_some([element, ]) else ''
 
-    def push_some(self, elements, num_block_size=None):
+    @instrumented(OPERATION_PUSH_SOME)
+    def push_some(self, elements, num_block_size=None, stream=False,
+                  num_pipeline_depth=None):
         '''
-        Push a bunch of elements into the queue.
+        Push a bunch of elements into the queue. Blocks are pipelined,
+        num_pipeline_depth blocks per round trip, and each block is pushed
+        atomically.
+
+        On stream mode, elements are pulled from any iterable (even an
+        unbounded one) num_block_size at a time and each block is sent as
+        soon as it is filled, so memory is bounded by the block size (times
+        num_pipeline_depth, which is 1 by default on stream mode).
 
         Arguments:
         :elements -- a collection of strings
         :num_block_size -- integer (default: none)
+        :stream -- boolean (default: false)
+        :num_pipeline_depth -- integer (default: none), how many blocks are
+                               sent per round trip
 
         Returns: list of strings, list of queued elements
         '''
+        if stream:
+            return list(self.iter_push_some(elements, num_block_size,
+                                            num_pipeline_depth or 1))
+
         try:
 
-            elements = list(elements)
+            elements = CodecTools.encode_some(self.codec, list(elements))
 
             block_slices = Tools.get_block_slices(
                 num_elements=len(elements),
@@ -97,25 +213,115 @@ class BucketQueue(object):
             )
 
             queued_elements = []
-            for s in block_slices:
-                queued_elements.extend(self.__push_some(elements[s[0]:s[1]]))
+            for some_slices in Tools.get_blocks(
+                    block_slices, num_pipeline_depth or NUM_PIPELINE_DEPTH):
+                some_blocks = [elements[s[0]:s[1]] for s in some_slices]
+                for some_elements in self.__push_some_blocks(some_blocks):
+                    queued_elements.extend(some_elements)
             return queued_elements
 
         except Exception as e:
-            raise PimPamQueuesError(e.message)
+            raise PimPamQueuesError(str(e))
 
-    def pop(self):
+    def iter_push_some(self, elements, num_block_size=None,
+                       num_pipeline_depth=1):
+        '''
+        Push a iterable of elements into the queue on stream mode, lazily.
+        Blocks are sent once the previous blocks' queued elements have been
+        consumed.
+
+        Arguments:
+        :elements -- an iterable of strings
+        :num_block_size -- integer (default: none)
+        :num_pipeline_depth -- integer (default: 1), how many blocks are
+                               sent per round trip
+
+        Returns: generator of strings, queued elements
+        '''
+        try:
+            blocks = Tools.get_blocks(elements, num_block_size)
+            for some_blocks in Tools.get_blocks(blocks, num_pipeline_depth):
+                some_blocks = [CodecTools.encode_some(self.codec, b)
+                               for b in some_blocks]
+                for some_elements in self.__push_some_blocks(some_blocks):
+                    for element in some_elements:
+                        yield element
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    @instrumented(OPERATION_POP)
+    def pop(self, block=False, timeout=0):
         '''
         Pop a random element from the queue.
 
+        If block is true and the queue is empty, it waits until a element is
+        pushed or the timeout expires. Waiting is done with BLPOP on a signal
+        list fed by the push script, so the queue is not polled.
+
         If no element is poped, it returns None
 
         Arguments:
-        :last -- boolean (default: false)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element when
+                    block is true, 0 waits forever
 
         Returns: string, the popped element, or, none, if no element is popped
         '''
-        return self.redis.spop(self.key_queue_bucket)
+        element = self.__pop()
+        if element is None and block:
+            element = self.__wait(self.__pop, timeout)
+        return CodecTools.decode(self.codec, element)
+
+    @instrumented(OPERATION_POP_SOME)
+    def pop_some(self, num_elements, num_block_size=None, block=False,
+                 timeout=0):
+        '''
+        Pop a bunch of random elements from the queue in one atomic
+        round trip.
+
+        If block is true and the queue is empty, it waits until a element is
+        pushed or the timeout expires, then pops up to num_elements.
+
+        Arguments:
+        :num_elements -- integer, maximum number of elements to be popped
+        :num_block_size -- integer (default: none)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element when
+                    block is true, 0 waits forever
+
+        Returns: list of strings, the popped elements
+        '''
+        if num_elements < 1:
+            return []
+
+        if self.track_stats:
+            popped_elements = lua_scripts.evalsha(
+                self.redis, SCRIPT_BUCKET_POP_TRACKED,
+                [self.key_queue_bucket, self.key_queue_bucket_stats],
+                [num_elements, ])
+        else:
+            block_slices = Tools.get_block_slices(
+                num_elements=num_elements,
+                num_block_size=num_block_size
+            )
+
+            pipe = self.redis.pipeline(transaction=True)
+            for s in block_slices:
+                pipe.execute_command('SPOP', self.key_queue_bucket,
+                                     min(s[1], num_elements) - s[0])
+
+            popped_elements = []
+            for some_elements in pipe.execute():
+                popped_elements.extend(some_elements)
+
+        if popped_elements or not block:
+            return CodecTools.decode_some(self.codec, popped_elements)
+
+        popped_elements = self.__wait(
+            lambda: self.pop_some(num_elements, num_block_size),
+            timeout
+        )
+        return popped_elements if popped_elements else []
 
     def num(self):
         '''
@@ -151,25 +357,87 @@ class BucketQueue(object):
 
         Returns: boolean
         '''
-        return self.redis.sismember(self.key_queue_bucket, element)
+        return self.redis.sismember(
+            self.key_queue_bucket,
+            self.get_bucket_element(self.get_dedup_value(element)))
+
+    def get_dedup_value(self, element):
+        '''
+        Get the value which makes a element unique, the (serialized)
+        element.
+
+        Arguments:
+        :element -- object
+
+        Returns: string
+        '''
+        return CodecTools.encode(self.codec, element)
+
+    def get_bucket_element(self, element):
+        '''
+        Get the value which represents a element in the bucket, the element
+        itself.
+
+        Arguments:
+        :element -- string
+
+        Returns: string
+        '''
+        return element
 
     def elements(self, num_elements=-1):
         '''
         Get some (or even all) unordered queued elements.
-        By default it returns all queued elements.
+        By default it returns all queued elements, big queues are better
+        read with iter_elements().
 
         Note
         ====
         Elements are not popped.
 
+        With a codec, decoded elements are returned in a list, as they may
+        not be hashable.
+
         Arguments:
         :num_elements -- integer (default: -1).
 
-        Returns: set
+        Returns: set, or, list, with a codec
         '''
         if num_elements is -1:
-            return self.redis.smembers(self.key_queue_bucket)
-        return set(self.redis.srandmember(self.key_queue_bucket, num_elements))
+            elements = self.redis.smembers(self.key_queue_bucket)
+        else:
+            elements = set(self.redis.srandmember(self.key_queue_bucket,
+                                                  num_elements))
+        if self.codec is None:
+            return elements
+        return self.codec.decode_some(list(elements))
+
+    def iter_elements(self, batch=NUM_BLOCK_SIZE, prefetch=False):
+        '''
+        Iterate unordered queued elements with SSCAN, about batch elements
+        per round trip, so big queues are read without blocking the redis
+        server nor holding them in memory.
+
+        Elements queued during the whole iteration are returned at least
+        once, but SSCAN may return a element more than once.
+
+        Note
+        ====
+        Elements are not popped.
+
+        Arguments:
+        :batch -- integer (default: NUM_BLOCK_SIZE), SSCAN count hint
+        :prefetch -- boolean (default: false), a flag to read the next page
+                     while the current one is consumed
+
+        Returns: generator
+        '''
+        def get_page(cursor):
+            cursor, page = self.redis.sscan(self.key_queue_bucket, cursor,
+                                            count=batch)
+            return (cursor or None), CodecTools.decode_some(self.codec, page)
+
+        return Tools.iter_pages(get_page, 0, prefetch)
 
     def delete(self):
         '''
@@ -177,7 +445,62 @@ class BucketQueue(object):
 
         Returns: boolean, true if queue has been deleted, otherwise false
         '''
-        return True if self.redis.delete(self.key_queue_bucket) else False
+        if self.dedup_filter is not None:
+            self.dedup_filter.clear()
+        keys = [self.key_queue_bucket, self.key_queue_bucket_signal,
+                self.key_queue_bucket_stats]
+        return True if self.redis.delete(*keys) else False
+
+    def stats(self):
+        '''
+        Get the queue stats in one round trip, without reading its elements.
+        With track_stats, they include the pushed and popped counters and
+        its rates since the previous stats() call (none on the first call).
+        Elements are popped at random, so there is no head element age.
+
+        Returns: dict, num, and, with track_stats, num_pushed, num_popped,
+                 push_rate and pop_rate (elements per second)
+        '''
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.scard(self.key_queue_bucket)
+        pipe.hmget(self.key_queue_bucket_stats, KEY_STATS_PUSHED,
+                   KEY_STATS_POPPED)
+        pipe.time()
+        num, counters, redis_time = pipe.execute()
+        return QueueStats.get_stats(self, num, counters,
+                                    QueueStats.get_time(redis_time))
+
+    def get_duplicates(self, blocks):
+        '''
+        Get the elements that the dedup filter reports as probably pushed,
+        when there is a dedup filter, without a round trip. They are still
+        sent to the push scripts, which check them against the bucket (it is
+        authoritative), so the queued ones are counted as false positives.
+
+        Arguments:
+        :blocks -- a list of lists of strings
+
+        Returns: set of strings
+        '''
+        if self.dedup_filter is None:
+            return set()
+        return set(element for some_elements in blocks
+                   for element in some_elements
+                   if element in self.dedup_filter)
+
+    def get_push_script(self, elements):
+        '''
+        Get the Lua script call which pushes a block of elements, so it can
+        be pipelined along other commands (QueueGroup). The script replies
+        the queued (serialized) elements.
+
+        Arguments:
+        :elements -- a list of strings
+
+        Returns: tuple, script name, keys and args
+        '''
+        return (self.__lua_push(), self.__get_push_keys(),
+                CodecTools.encode_some(self.codec, list(elements)))
 
     def __push_some(self, elements):
         '''
@@ -188,19 +511,106 @@ class BucketQueue(object):
 
         Returns: list of strings, a list with queued elements
         '''
-        keys = [self.key_queue_bucket, ]
-        return self.redis.eval(self.__lua_push(), len(keys),
-                               *(keys + elements))
+        return lua_scripts.evalsha(self.redis, self.__lua_push(),
+                                   self.__get_push_keys(), elements)
+
+    def __push_some_blocks(self, blocks):
+        '''
+        Push some blocks of elements into the queue in one pipeline.
+
+        Arguments:
+        :blocks -- a list of lists of strings
+
+        Returns: list of lists of strings, queued elements of each block
+        '''
+        num_elements = sum(len(some_elements) for some_elements in blocks)
+        if not num_elements:
+            return [[] for some_elements in blocks]
+        duplicates = self.get_duplicates(blocks)
+
+        if len(blocks) == 1:
+            blocks_queued_elements = [self.__push_some(blocks[0]), ]
+        else:
+            blocks_queued_elements = lua_scripts.evalsha_some(
+                self.redis, self.__lua_push(), self.__get_push_keys(), blocks)
+
+        if self.dedup_filter is not None:
+            self.dedup_filter.add_false_positives(sum(
+                1 for some_elements in blocks_queued_elements
+                for element in some_elements if element in duplicates))
+            for some_elements in blocks:
+                self.dedup_filter.add_some(some_elements)
+
+        if self.observer is not None:
+            self.observer.count(self, COUNTER_BLOCKS, len(blocks))
+            self.observer.count(self, COUNTER_BYTES_SENT, sum(
+                Instrumentation.get_num_bytes(b) for b in blocks))
+            self.observer.count(self, COUNTER_DUPLICATES, num_elements - sum(
+                len(some_elements) for some_elements
+                in blocks_queued_elements))
+
+        return [CodecTools.decode_some(self.codec, some_elements)
+                for some_elements in blocks_queued_elements]
 
     def __lua_push(self):
-        return """
-            local elements = {}
+        '''
+        Get the name of the Lua script which pushes elements into the queue.
 
-            for i=1, #ARGV do
-              if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
-                table.insert(elements, ARGV[i])
-              end
-            end
+        Returns: string
+        '''
+        return SCRIPT_BUCKET_PUSH
 
-            return elements
-        """
+    def __get_push_keys(self):
+        '''
+        Get the keys of the Lua script which pushes elements into the queue.
+
+        Returns: list of strings
+        '''
+        keys = [self.key_queue_bucket, self.key_queue_bucket_signal]
+        if self.track_stats:
+            keys.append(self.key_queue_bucket_stats)
+        return keys
+
+    def __pop(self):
+        '''
+        Pop a random element from the queue.
+
+        Returns: string, the popped (serialized) element, or, none
+        '''
+        if self.track_stats:
+            popped_elements = lua_scripts.evalsha(
+                self.redis, SCRIPT_BUCKET_POP_TRACKED,
+                [self.key_queue_bucket, self.key_queue_bucket_stats], [1, ])
+            return popped_elements[0] if popped_elements else None
+        return self.redis.spop(self.key_queue_bucket)
+
+    def __wait(self, pop, timeout=0):
+        '''
+        Wait until pushed elements are signaled and pop them. A signal does
+        not ensure that there are elements left, as other consumers could
+        have popped them, so it keeps waiting until pop gets something or
+        the timeout expires.
+
+        Arguments:
+        :pop -- callable, it pops and returns elements
+        :timeout -- integer (default: 0), 0 waits forever
+
+        Returns: the popped elements, or, none, if no element is popped
+        '''
+        time_limit = time.time() + timeout
+
+        while True:
+            seconds = 0
+            if timeout:
+                seconds = int(math.ceil(time_limit - time.time()))
+                if seconds <= 0:
+                    return None
+
+            signal = self.redis.blpop([self.key_queue_bucket_signal, ],
+                                      timeout=seconds)
+            if signal is None:
+                return None
+
+            popped = pop()
+            if popped:
+                return popped
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+try:
+    from redis.cluster import RedisCluster
+except ImportError:
+    RedisCluster = None
+
+try:
+    from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+except ImportError:
+    AsyncRedisCluster = None
+
+from pimpamqueues import NUM_BLOCK_SIZE
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+class ClusterTools(object):
+
+    @staticmethod
+    def is_cluster(redis_conn):
+        '''
+        Check if a redis connection is a redis cluster client.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis or redis.cluster.RedisCluster, or
+                       their asyncio versions
+
+        Returns: boolean
+        '''
+        cluster_classes = tuple(c for c in (RedisCluster, AsyncRedisCluster)
+                                if c is not None)
+        return isinstance(redis_conn, cluster_classes)
+
+    @staticmethod
+    def migrate_keys(key_pairs, redis_conn, source_redis_conn=None,
+                     num_block_size=None):
+        '''
+        Migrate keys to new key names. Keys are renamed if they are on the
+        same non cluster redis server and the destination key does not
+        exist. Otherwise, elements are copied block by block (LRANGE/RPUSH
+        for lists, SSCAN/SADD for sets, ZSCAN/ZADD for sorted sets), and
+        appended to the destination key, so big queues do not block the
+        servers; then source keys are deleted, only if source_redis_conn is
+        not given.
+
+        Arguments:
+        :key_pairs -- list of tuples, (source key, destination key)
+        :redis_conn -- redis.client.Redis, destination redis connection
+        :source_redis_conn -- redis.client.Redis (default: none), by default
+                              keys are migrated on redis_conn
+        :num_block_size -- integer (default: none)
+
+        Returns: integer, the number of migrated keys
+        '''
+        if num_block_size is None:
+            num_block_size = NUM_BLOCK_SIZE
+
+        keep_source = source_redis_conn is not None
+        rename = not keep_source and not ClusterTools.is_cluster(redis_conn)
+        if source_redis_conn is None:
+            source_redis_conn = redis_conn
+
+        num_keys = 0
+        for key_from, key_to in key_pairs:
+            if key_from == key_to or not source_redis_conn.exists(key_from):
+                continue
+
+            renamed = rename and redis_conn.renamenx(key_from, key_to)
+            if not renamed:
+                ClusterTools.copy_key(key_from, key_to, redis_conn,
+                                      source_redis_conn, num_block_size)
+                if not keep_source:
+                    redis_conn.delete(key_from)
+
+            num_keys += 1
+        return num_keys
+
+    @staticmethod
+    def copy_key(key_from, key_to, redis_conn, source_redis_conn,
+                 num_block_size):
+        '''
+        Copy a list, a set or a sorted set, block by block, appending its
+        elements to the destination key, or a string, overwriting it.
+
+        Arguments:
+        :key_from -- string
+        :key_to -- string
+        :redis_conn -- redis.client.Redis, destination redis connection
+        :source_redis_conn -- redis.client.Redis
+        :num_block_size -- integer
+        '''
+        key_type = source_redis_conn.type(key_from)
+        if not isinstance(key_type, str):
+            key_type = key_type.decode('utf-8')
+
+        if key_type == 'list':
+            position = 0
+            while True:
+                elements = source_redis_conn.lrange(
+                    key_from, position, position + num_block_size - 1)
+                if not elements:
+                    return
+                redis_conn.rpush(key_to, *elements)
+                position += len(elements)
+
+        elif key_type == 'set':
+            cursor = 0
+            while True:
+                cursor, elements = source_redis_conn.sscan(
+                    key_from, cursor, count=num_block_size)
+                if elements:
+                    redis_conn.sadd(key_to, *elements)
+                if int(cursor) == 0:
+                    return
+
+        elif key_type == 'zset':
+            cursor = 0
+            while True:
+                cursor, elements = source_redis_conn.zscan(
+                    key_from, cursor, count=num_block_size)
+                if elements:
+                    redis_conn.zadd(key_to, dict(elements))
+                if int(cursor) == 0:
+                    return
+
+        elif key_type == 'string':
+            redis_conn.set(key_to, source_redis_conn.get(key_from))
+
+        else:
+            raise PimPamQueuesError('%s is a %s, it can not be copied' %
+                                    (key_from, key_type))
@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import pickle
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+COMPRESS_ZLIB = 'zlib'
+COMPRESS_LZ4 = 'lz4'
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 6
+
+COMPRESSED_HEADER = b'\xc1'
+FORMAT_STORED = b'\x00'
+FORMAT_ZLIB = b'\x01'
+FORMAT_ZLIB_DICTIONARY = b'\x02'
+FORMAT_LZ4 = b'\x03'
+
+ZLIB_MEMORY_LEVEL = 8
+
+try:
+    clock = time.process_time
+except AttributeError:
+    clock = time.clock
+
+
+class Codec(object):
+    '''
+    A codec serializes elements before they are pushed and deserializes
+    them when they are read back, so queues can hold structured elements.
+    Queues encode and decode whole blocks at once, through encode_some()
+    and decode_some(), which codecs can override with a faster batch
+    version.
+
+    A codec is given to a queue with its codec argument, by default
+    elements are sent as they are.
+    '''
+
+    def encode(self, element):
+        '''
+        Serialize a element.
+
+        Arguments:
+        :element -- object
+
+        Returns: bytes
+        '''
+        raise NotImplementedError()
+
+    def decode(self, data):
+        '''
+        Deserialize a element.
+
+        Arguments:
+        :data -- bytes
+
+        Returns: object
+        '''
+        raise NotImplementedError()
+
+    def encode_some(self, elements):
+        '''
+        Serialize a bunch of elements.
+
+        Arguments:
+        :elements -- a collection of objects
+
+        Returns: list of bytes
+        '''
+        encode = self.encode
+        return [encode(element) for element in elements]
+
+    def decode_some(self, datas):
+        '''
+        Deserialize a bunch of elements.
+
+        Arguments:
+        :datas -- a collection of bytes
+
+        Returns: list of objects
+        '''
+        decode = self.decode
+        return [decode(data) for data in datas]
+
+
+class BytesCodec(Codec):
+    '''
+    Raw bytes. bytes and read-only memoryview elements are sent as they are,
+    without being copied, bytearrays and writable memoryviews are copied to
+    bytes, so encoded elements can be hashed (dedup filters, caches), and
+    strings are UTF-8 encoded. Elements are read back as bytes.
+    '''
+
+    def encode(self, element):
+        if isinstance(element, bytes):
+            return element
+        if isinstance(element, memoryview) and element.readonly:
+            return element
+        if isinstance(element, (bytearray, memoryview)):
+            return bytes(element)
+        return element.encode('utf-8')
+
+    def decode(self, data):
+        return data
+
+
+class JsonCodec(Codec):
+    '''
+    JSON, compact and UTF-8 encoded. Keys are sorted, so equal dicts are
+    encoded to equal bytes.
+    '''
+
+    def __init__(self, sort_keys=True):
+        '''
+        Create a JsonCodec object.
+
+        Arguments:
+        :sort_keys -- boolean (default: true)
+        '''
+        self.encoder = json.JSONEncoder(separators=(',', ':'),
+                                        sort_keys=sort_keys)
+
+    def encode(self, element):
+        return self.encoder.encode(element).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(data.decode('utf-8'))
+
+
+class PickleCodec(Codec):
+    '''
+    Pickle, protocol 5 where it is available. Only use it with queues whose
+    elements are pushed by trusted processes, unpickling runs code.
+    '''
+
+    def __init__(self, protocol=PICKLE_PROTOCOL):
+        '''
+        Create a PickleCodec object.
+
+        Arguments:
+        :protocol -- integer (default: PICKLE_PROTOCOL)
+        '''
+        self.protocol = protocol
+
+    def encode(self, element):
+        return pickle.dumps(element, self.protocol)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class MsgpackCodec(Codec):
+    '''
+    MessagePack, ``pip install pimpamqueues[msgpack]``. A block of elements
+    is encoded with one reused packer.
+    '''
+
+    def __init__(self):
+        '''
+        Create a MsgpackCodec object.
+
+        Raise:
+        :PimPamQueuesError(), if msgpack is not installed
+        '''
+        if msgpack is None:
+            raise PimPamQueuesError('MsgpackCodec needs msgpack, '
+                                    'pip install pimpamqueues[msgpack]')
+
+    def encode(self, element):
+        return msgpack.packb(element, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+    def encode_some(self, elements):
+        pack = msgpack.Packer(use_bin_type=True).pack
+        return [pack(element) for element in elements]
+
+
+class CodecTools(object):
+    '''
+    Encode and decode elements with a queue's codec, if it has one.
+    '''
+
+    @staticmethod
+    def encode(codec, element):
+        '''
+        Serialize a element.
+
+        Arguments:
+        :codec -- Codec or none
+        :element -- object
+
+        Returns: bytes, or, element, if there is no codec
+        '''
+        if codec is None:
+            return element
+        return codec.encode(element)
+
+    @staticmethod
+    def encode_some(codec, elements):
+        '''
+        Serialize a bunch of elements.
+
+        Arguments:
+        :codec -- Codec or none
+        :elements -- a list of objects
+
+        Returns: list
+        '''
+        if codec is None:
+            return elements
+        return codec.encode_some(elements)
+
+    @staticmethod
+    def decode(codec, data):
+        '''
+        Deserialize a element, none is kept.
+
+        Arguments:
+        :codec -- Codec or none
+        :data -- bytes or none
+
+        Returns: object
+        '''
+        if codec is None or data is None:
+            return data
+        return codec.decode(data)
+
+    @staticmethod
+    def decode_some(codec, datas):
+        '''
+        Deserialize a bunch of elements.
+
+        Arguments:
+        :codec -- Codec or none
+        :datas -- a list of bytes
+
+        Returns: list
+        '''
+        if codec is None:
+            return datas
+        return codec.decode_some(datas)
+
+
+class CompressedCodec(Codec):
+    '''
+    Compression of large elements, wrapping another codec (or plain bytes).
+    Elements whose encoded size reaches threshold bytes are compressed with
+    zlib (optionally primed with a preset dictionary of common substrings)
+    or lz4, ``pip install pimpamqueues[lz4]``, and stored behind a
+    COMPRESSED_HEADER byte followed by a format byte. Smaller elements are
+    stored as they are, so queues which hold elements pushed without
+    compression keep working. COMPRESSED_HEADER (0xC1) is never the first
+    byte of UTF-8 text, JSON, pickle or msgpack data, the rare element that
+    starts with it is stored behind a header too.
+
+    Compression ratio and CPU time are counted by stats().
+    '''
+
+    def __init__(self, codec=None, threshold=COMPRESS_THRESHOLD,
+                 level=COMPRESS_LEVEL, dictionary=None,
+                 algorithm=COMPRESS_ZLIB):
+        '''
+        Create a CompressedCodec object.
+
+        Arguments:
+        :codec -- Codec (default: none), the codec of elements, by default
+                  elements are bytes (or UTF-8 encoded strings)
+        :threshold -- integer (default: COMPRESS_THRESHOLD), minimum encoded
+                      size, in bytes, of compressed elements
+        :level -- integer (default: COMPRESS_LEVEL), zlib compression level
+        :dictionary -- bytes (default: none), a zlib preset dictionary, every
+                       process which reads the queue needs the same one
+        :algorithm -- string (default: COMPRESS_ZLIB), COMPRESS_ZLIB or
+                      COMPRESS_LZ4
+
+        Raise:
+        :PimPamQueuesError(), if algorithm is unknown or lz4 is not installed
+                              or a dictionary is given for lz4
+        '''
+        if algorithm not in (COMPRESS_ZLIB, COMPRESS_LZ4):
+            raise PimPamQueuesError('%s compression is unknown' % (
+                algorithm, ))
+        if algorithm == COMPRESS_LZ4 and (lz4_frame is None or dictionary):
+            raise PimPamQueuesError('lz4 compression needs lz4, pip install '
+                                    'pimpamqueues[lz4], and no dictionary')
+
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.dictionary = dictionary
+        self.algorithm = algorithm
+
+        self.reset_stats()
+
+    def encode(self, element):
+        return self.encode_some([element, ])[0]
+
+    def decode(self, data):
+        return self.decode_some([data, ])[0]
+
+    def encode_some(self, elements):
+        datas = CodecTools.encode_some(self.codec, list(elements))
+
+        started_at = clock()
+        encoded = []
+        for data in datas:
+            if not isinstance(data, (bytes, bytearray, memoryview)):
+                data = data.encode('utf-8')
+            if len(data) >= self.threshold:
+                compressed = self.__compress(data)
+                self.num_compressed += 1
+                self.num_bytes_in += len(data)
+                self.num_bytes_out += len(compressed)
+                data = compressed
+            elif data[:1] == COMPRESSED_HEADER:
+                data = COMPRESSED_HEADER + FORMAT_STORED + bytes(data)
+            encoded.append(data)
+        self.compress_seconds += clock() - started_at
+        return encoded
+
+    def decode_some(self, datas):
+        started_at = clock()
+        decoded = []
+        for data in datas:
+            if data[:1] == COMPRESSED_HEADER:
+                data = self.__decompress(data[1:2], data[2:])
+                self.num_decompressed += 1
+            decoded.append(data)
+        self.decompress_seconds += clock() - started_at
+        return CodecTools.decode_some(self.codec, decoded)
+
+    def stats(self):
+        '''
+        Get the compression counters. Ratio is the uncompressed size of
+        compressed elements over its compressed size.
+
+        Returns: dict
+        '''
+        return {
+            'num_compressed': self.num_compressed,
+            'num_decompressed': self.num_decompressed,
+            'num_bytes_in': self.num_bytes_in,
+            'num_bytes_out': self.num_bytes_out,
+            'ratio': (float(self.num_bytes_in) / self.num_bytes_out
+                      if self.num_bytes_out else None),
+            'compress_seconds': self.compress_seconds,
+            'decompress_seconds': self.decompress_seconds,
+        }
+
+    def reset_stats(self):
+        '''
+        Reset the compression counters.
+        '''
+        self.num_compressed = 0
+        self.num_decompressed = 0
+        self.num_bytes_in = 0
+        self.num_bytes_out = 0
+        self.compress_seconds = 0.0
+        self.decompress_seconds = 0.0
+
+    def __compress(self, data):
+        '''
+        Compress a element, behind its header.
+
+        Arguments:
+        :data -- bytes
+
+        Returns: bytes
+        '''
+        if self.algorithm == COMPRESS_LZ4:
+            return COMPRESSED_HEADER + FORMAT_LZ4 + lz4_frame.compress(data)
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                                          zlib.MAX_WBITS, ZLIB_MEMORY_LEVEL,
+                                          zlib.Z_DEFAULT_STRATEGY,
+                                          self.dictionary)
+            return COMPRESSED_HEADER + FORMAT_ZLIB_DICTIONARY + \
+                compressor.compress(data) + compressor.flush()
+        return COMPRESSED_HEADER + FORMAT_ZLIB + zlib.compress(data,
+                                                               self.level)
+
+    def __decompress(self, data_format, data):
+        '''
+        Decompress a element, whatever the codec's algorithm is.
+
+        Arguments:
+        :data_format -- bytes, the format byte
+        :data -- bytes, the element without its header
+
+        Raise:
+        :PimPamQueuesError(), if format is unknown, or it can not be
+                              decompressed
+
+        Returns: bytes
+        '''
+        if data_format == FORMAT_STORED:
+            return data
+        if data_format == FORMAT_ZLIB:
+            return zlib.decompress(data)
+        if data_format == FORMAT_ZLIB_DICTIONARY and self.dictionary:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS,
+                                              self.dictionary)
+            return decompressor.decompress(data) + decompressor.flush()
+        if data_format == FORMAT_LZ4 and lz4_frame is not None:
+            return lz4_frame.decompress(data)
+        raise PimPamQueuesError('Element can not be decompressed')
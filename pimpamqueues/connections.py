@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+import redis
+
+try:
+    from redis.backoff import ExponentialBackoff
+    from redis.retry import Retry
+except ImportError:
+    ExponentialBackoff = None
+    Retry = None
+
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+DEFAULT_ALIAS = 'default'
+
+BACKOFF_BASE = 0.01
+BACKOFF_CAP = 1
+
+
+class ConnectionRegistry(object):
+    '''
+    A registry of shared redis clients. Queues which are created without a
+    redis connection borrow the default client, so short-lived queue objects
+    share one connection pool instead of creating (and dropping) a pool per
+    queue. Clients are never closed by queues, only by close().
+
+    Each client is configured by an alias, and it is created the first time
+    it is used.
+    '''
+
+    def __init__(self):
+        '''
+        Create a ConnectionRegistry object.
+        '''
+        self.settings = {}
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def configure(self, alias=DEFAULT_ALIAS, url=None, host='localhost',
+                  port=6379, db=0, password=None, unix_socket_path=None,
+                  max_connections=None, blocking=False, pool_timeout=None,
+                  socket_timeout=None, socket_connect_timeout=None,
+                  socket_keepalive=None, health_check_interval=None,
+                  num_retries=None, backoff_base=BACKOFF_BASE,
+                  backoff_cap=BACKOFF_CAP):
+        '''
+        Configure a client. If the client has been created, its connection
+        pool is closed and the client is created again, with the new
+        settings, the next time it is used.
+
+        Only given settings are passed to redis-py, so redis-py defaults are
+        kept otherwise.
+
+        Arguments:
+        :alias -- string (default: DEFAULT_ALIAS)
+        :url -- string (default: none), a redis:// or unix:// url, it
+                overrides host, port, db, password and unix_socket_path
+        :host -- string (default: 'localhost')
+        :port -- integer (default: 6379)
+        :db -- integer (default: 0)
+        :password -- string (default: none)
+        :unix_socket_path -- string (default: none), a UNIX socket path, for
+                             a redis server on the same host
+        :max_connections -- integer (default: none), connection pool size
+        :blocking -- boolean (default: false), a flag to wait up to
+                     pool_timeout seconds for a free connection when the
+                     pool is exhausted, instead of raising an error
+        :pool_timeout -- number (default: none)
+        :socket_timeout -- number (default: none), seconds
+        :socket_connect_timeout -- number (default: none), seconds
+        :socket_keepalive -- boolean (default: none)
+        :health_check_interval -- integer (default: none), seconds a
+                                  connection can be idle before it is checked
+                                  (PING) when it is used again
+        :num_retries -- integer (default: none), retries of commands which
+                        fail with connection or timeout errors
+        :backoff_base -- number (default: BACKOFF_BASE), seconds of the
+                         first exponential backoff between retries
+        :backoff_cap -- number (default: BACKOFF_CAP), maximum seconds
+                        between retries
+
+        Raise:
+        :PimPamQueuesError(), if retries are not supported by redis-py
+        '''
+        if num_retries and Retry is None:
+            raise PimPamQueuesError('Retries need redis-py 4.0 or newer')
+
+        settings = {
+            'url': url,
+            'host': host,
+            'port': port,
+            'db': db,
+            'password': password,
+            'unix_socket_path': unix_socket_path,
+            'max_connections': max_connections,
+            'blocking': blocking,
+            'pool_timeout': pool_timeout,
+            'socket_timeout': socket_timeout,
+            'socket_connect_timeout': socket_connect_timeout,
+            'socket_keepalive': socket_keepalive,
+            'health_check_interval': health_check_interval,
+            'num_retries': num_retries,
+            'backoff_base': backoff_base,
+            'backoff_cap': backoff_cap,
+        }
+
+        with self.lock:
+            self.settings[alias] = settings
+            client = self.clients.pop(alias, None)
+        if client is not None:
+            client.connection_pool.disconnect()
+
+    def get(self, alias=DEFAULT_ALIAS):
+        '''
+        Get a client, creating it the first time. The default client is
+        created with redis-py default settings if it has not been
+        configured.
+
+        Arguments:
+        :alias -- string (default: DEFAULT_ALIAS)
+
+        Raise:
+        :PimPamQueuesError(), if alias has not been configured
+
+        Returns: redis.client.Redis
+        '''
+        client = self.clients.get(alias)
+        if client is not None:
+            return client
+
+        with self.lock:
+            client = self.clients.get(alias)
+            if client is None:
+                settings = self.settings.get(alias)
+                if settings is None:
+                    if alias != DEFAULT_ALIAS:
+                        raise PimPamQueuesError('%s connection has not been '
+                                                'configured' % (alias, ))
+                    settings = {}
+                client = redis.Redis(
+                    connection_pool=ConnectionRegistry.get_pool(settings))
+                self.clients[alias] = client
+        return client
+
+    def set(self, redis_conn, alias=DEFAULT_ALIAS):
+        '''
+        Register an existing client, replacing the configured one.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :alias -- string (default: DEFAULT_ALIAS)
+        '''
+        with self.lock:
+            self.clients[alias] = redis_conn
+
+    def close(self, alias=None):
+        '''
+        Close the connection pool of a client, or of all of them. Closed
+        clients are created again the next time they are used.
+
+        Arguments:
+        :alias -- string (default: none), by default all clients are closed
+        '''
+        with self.lock:
+            if alias is None:
+                clients = list(self.clients.values())
+                self.clients = {}
+            else:
+                clients = [self.clients.pop(alias)] \
+                    if alias in self.clients else []
+        for client in clients:
+            client.connection_pool.disconnect()
+
+    @staticmethod
+    def get_pool(settings):
+        '''
+        Get a connection pool from client settings.
+
+        Arguments:
+        :settings -- dict
+
+        Returns: redis.connection.ConnectionPool
+        '''
+        pool_class = redis.ConnectionPool
+        kwargs = {}
+        if settings.get('blocking'):
+            pool_class = redis.BlockingConnectionPool
+            if settings.get('pool_timeout') is not None:
+                kwargs['timeout'] = settings['pool_timeout']
+
+        for key in ('max_connections', 'socket_timeout',
+                    'socket_connect_timeout', 'socket_keepalive',
+                    'health_check_interval', 'password'):
+            if settings.get(key) is not None:
+                kwargs[key] = settings[key]
+
+        if settings.get('num_retries'):
+            kwargs['retry'] = Retry(
+                ExponentialBackoff(cap=settings['backoff_cap'],
+                                   base=settings['backoff_base']),
+                settings['num_retries'])
+            kwargs['retry_on_timeout'] = True
+
+        if settings.get('url'):
+            return pool_class.from_url(settings['url'], **kwargs)
+
+        if settings.get('unix_socket_path'):
+            kwargs.pop('socket_connect_timeout', None)
+            kwargs.pop('socket_keepalive', None)
+            return pool_class(
+                connection_class=redis.connection.UnixDomainSocketConnection,
+                path=settings['unix_socket_path'],
+                db=settings.get('db', 0), **kwargs)
+
+        if settings:
+            kwargs.update(host=settings['host'], port=settings['port'],
+                          db=settings['db'])
+        return pool_class(**kwargs)
+
+
+connections = ConnectionRegistry()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from pimpamqueues import Tools
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_DELAYED_PROMOTE
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.exceptions import PimPamQueuesError
+from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
+
+
+NUM_PROMOTE_SIZE = 100
+PROMOTER_INTERVAL = 1
+
+
+class DelayedQueue(object):
+    '''
+    A delayed queue of a SimpleQueue or a SmartQueue. Elements are kept in
+    a sorted set scored by the time they are due, and due elements are
+    moved (promoted) to the end of the queue by a Lua script, at most
+    NUM_PROMOTE_SIZE elements per script call, so redis latency stays flat
+    however many elements are due. Promoted elements go through the
+    SmartQueue bucket, so elements which have been queued are not queued
+    again. Promoted elements are counted as pushes of a queue which tracks
+    its stats.
+
+    Promotion can be run by consumers, calling promote() before popping,
+    or by a standalone process (or thread) calling run_promoter().
+    '''
+
+    def __init__(self, queue, keep_previous=True):
+        '''
+        Create a DelayedQueue object.
+
+        Arguments:
+        :queue -- SimpleQueue or SmartQueue, the queue where due elements are
+                  pushed
+        :keep_previous -- boolean (default: true),
+                          a flag to create a fresh delayed queue or not
+
+        Raise:
+        :PimPamQueuesError(), if queue is a SmartQueue which stores
+                              fingerprints or has a dedup window or a dedup
+                              key
+        '''
+        if isinstance(queue, SmartQueue) and (queue.fingerprint_bits or
+                                              queue.dedup_window or
+                                              queue.dedup_key):
+            raise PimPamQueuesError('Elements can not be delayed for a '
+                                    'SmartQueue with fingerprints, a dedup '
+                                    'window or a dedup key')
+
+        self.queue = queue
+        self.redis = queue.redis
+        self.codec = queue.codec
+
+        self.key_queue = queue.key_queue
+        self.key_queue_delayed = self.get_key_delayed()
+
+        self.keys = [self.key_queue_delayed, self.key_queue]
+        if queue.track_stats:
+            self.keys.extend([queue.key_queue_enqueued,
+                              queue.key_queue_stats])
+        if isinstance(queue, SmartQueue):
+            self.keys.append(queue.key_queue_bucket)
+
+        self.reset_stats()
+
+        if keep_previous is False:
+            self.delete()
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<DelayedQueue: %s (%s)>' % (self.key_queue_delayed,
+                                            self.num())
+
+    def get_key_delayed(self):
+        '''
+        Get a key id of the sorted set of delayed elements. It shares the
+        queue's hash tag, if any.
+
+        Returns: string
+        '''
+        return '%s:delayed' % (self.key_queue, )
+
+    def push(self, element, at=None, delay=0):
+        '''
+        Push a element to be queued at a given time, or after a delay. If
+        the element is already delayed, its due time is updated.
+
+        Arguments:
+        :element -- string
+        :at -- number (default: none), unix timestamp when element is due
+        :delay -- number (default: 0), seconds from now when element is due,
+                  it is used if at is not given
+
+        Raise:
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: long, the number of delayed elements
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+        return self.push_some([element, ], at, delay)
+
+    def push_some(self, elements, at=None, delay=0, num_block_size=None):
+        '''
+        Push a bunch of elements to be queued at a given time, or after a
+        delay. Blocks are sent in one pipeline. Elements of a SmartQueue are
+        disambiguated when they are delayed, so they are promoted as the
+        queue would push them.
+
+        Arguments:
+        :elements -- a collection of strings, or, a dict of element and due
+                     unix timestamp
+        :at -- number (default: none), unix timestamp when elements are due
+        :delay -- number (default: 0), seconds from now when elements are
+                  due, it is used if at is not given
+
+        Returns: long, the number of delayed elements
+        '''
+        try:
+
+            if isinstance(elements, dict):
+                elements = list(elements.items())
+            else:
+                if at is None:
+                    at = time.time() + delay
+                elements = [(element, at) for element in elements]
+
+            if isinstance(self.queue, SmartQueue):
+                elements = list(zip(
+                    self.queue.disambiguate_some([e for e, due in elements]),
+                    [due for e, due in elements]))
+
+            if self.codec is not None:
+                elements = list(zip(
+                    self.codec.encode_some([e for e, due in elements]),
+                    [due for e, due in elements]))
+
+            block_slices = Tools.get_block_slices(
+                num_elements=len(elements),
+                num_block_size=num_block_size
+            )
+
+            pipe = self.redis.pipeline()
+            for s in block_slices:
+                pipe.zadd(self.key_queue_delayed, dict(elements[s[0]:s[1]]))
+            pipe.zcard(self.key_queue_delayed)
+            return pipe.execute().pop()
+
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def promote(self, num_elements=None):
+        '''
+        Move due elements to the end of the queue, NUM_PROMOTE_SIZE elements
+        per Lua script call, until no element is due or num_elements have
+        been promoted.
+
+        Arguments:
+        :num_elements -- integer (default: none), maximum number of elements
+                         to be promoted, by default all due elements
+
+        Returns: integer, the number of promoted elements
+        '''
+        now = time.time()
+
+        num_promoted = 0
+        while num_elements is None or num_promoted < num_elements:
+            num_batch = NUM_PROMOTE_SIZE
+            if num_elements is not None:
+                num_batch = min(num_batch, num_elements - num_promoted)
+
+            queued_elements, scores = lua_scripts.evalsha(
+                self.redis, SCRIPT_DELAYED_PROMOTE, self.keys,
+                [now, num_batch, 1 if self.queue.track_stats else 0])
+
+            self.__add_stats(len(queued_elements), scores, time.time())
+            num_promoted += len(scores)
+            if len(scores) < num_batch:
+                break
+        return num_promoted
+
+    def run_promoter(self, interval=PROMOTER_INTERVAL, stop_event=None):
+        '''
+        Promote due elements forever, or until stop_event is set. Between
+        promotions it sleeps until the next element is due, at most interval
+        seconds.
+
+        Arguments:
+        :interval -- number (default: PROMOTER_INTERVAL), maximum seconds
+                     between promotions
+        :stop_event -- threading.Event (default: none)
+        '''
+        while stop_event is None or not stop_event.is_set():
+            self.promote()
+
+            wait = interval
+            next_due = self.next_due()
+            if next_due is not None:
+                wait = min(max(next_due - time.time(), 0), interval)
+
+            if stop_event is None:
+                time.sleep(wait)
+            else:
+                stop_event.wait(wait)
+
+    def next_due(self):
+        '''
+        Get the due time of the next delayed element.
+
+        Returns: float, unix timestamp, or, none, if there are no elements
+        '''
+        delayed = self.redis.zrange(self.key_queue_delayed, 0, 0,
+                                    withscores=True)
+        return delayed[0][1] if delayed else None
+
+    def num(self):
+        '''
+        Get the number of delayed elements.
+
+        Returns: integer
+        '''
+        return self.redis.zcard(self.key_queue_delayed)
+
+    def num_due(self):
+        '''
+        Get the number of delayed elements which are due.
+
+        Returns: integer
+        '''
+        return self.redis.zcount(self.key_queue_delayed, '-inf', time.time())
+
+    def is_empty(self):
+        '''
+        Check if there are no delayed elements.
+
+        Returns: boolean, true if there are no delayed elements
+        '''
+        return True if self.num() == 0 else False
+
+    def elements(self, with_scores=False):
+        '''
+        Get the delayed elements, the sooner due first.
+
+        Arguments:
+        :with_scores -- boolean (default: false), a flag to get
+                        (element, due unix timestamp) tuples
+
+        Returns: list
+        '''
+        elements = self.redis.zrange(self.key_queue_delayed, 0, -1,
+                                     withscores=with_scores)
+        if self.codec is None:
+            return elements
+        if with_scores:
+            return list(zip(
+                self.codec.decode_some([element for element, s in elements]),
+                [score for e, score in elements]))
+        return self.codec.decode_some(elements)
+
+    def remove(self, element):
+        '''
+        Remove a delayed element.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, return true if element was removed, otherwise false
+        '''
+        return True if self.redis.zrem(
+            self.key_queue_delayed,
+            CodecTools.encode(self.codec, element)) else False
+
+    def delete(self):
+        '''
+        Delete the delayed elements. The queue is not deleted.
+
+        Returns: boolean, true if delayed elements have been deleted
+        '''
+        return True if self.redis.delete(self.key_queue_delayed) else False
+
+    def stats(self):
+        '''
+        Get the promotion counters. Lag is the time between the due time of
+        a element and its promotion.
+
+        Returns: dict
+        '''
+        return {
+            'num_promoted': self.num_promoted,
+            'num_queued': self.num_queued,
+            'lag_last': self.lag_last,
+            'lag_max': self.lag_max,
+            'lag_mean': (self.lag_total / self.num_promoted
+                         if self.num_promoted else None),
+        }
+
+    def reset_stats(self):
+        '''
+        Reset the promotion counters.
+        '''
+        self.num_promoted = 0
+        self.num_queued = 0
+        self.lag_last = None
+        self.lag_max = None
+        self.lag_total = 0.0
+
+    def __add_stats(self, num_queued, scores, promoted_at):
+        '''
+        Count a batch of promoted elements.
+
+        Arguments:
+        :num_queued -- integer, the number of elements pushed to the queue
+        :scores -- list, the due times of promoted elements
+        :promoted_at -- float, unix timestamp
+        '''
+        self.num_queued += num_queued
+        for score in scores:
+            lag = max(promoted_at - float(score), 0.0)
+            self.num_promoted += 1
+            self.lag_total += lag
+            self.lag_last = lag
+            if self.lag_max is None or lag > self.lag_max:
+                self.lag_max = lag
@@ -22,3 +22,8 @@ class PimPamQueuesDisambiguatorInvalidError(PimPamQueuesError):
 
     MESSAGE = 'Disambiguator has to contain a disambiguate() static method ' \
               'which returns a string'
+
+
+class PimPamQueuesFingerprintInvalidError(PimPamQueuesError):
+
+    MESSAGE = 'Fingerprint bits has to be 64 or 128'
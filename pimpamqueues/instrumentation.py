@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import functools
+import threading
+import time
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+
+OPERATION_PUSH = 'push'
+OPERATION_PUSH_SOME = 'push_some'
+OPERATION_POP = 'pop'
+OPERATION_POP_SOME = 'pop_some'
+
+COUNTER_BLOCKS = 'blocks'
+COUNTER_DUPLICATES = 'duplicates'
+COUNTER_BYTES_SENT = 'bytes_sent'
+COUNTER_ERRORS = 'errors'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS_PREFIX = 'pimpamqueues'
+
+# Queues whose operation is being observed on each thread, so calls nested
+# in it (push() calls push_some()) are not observed again.
+observed = threading.local()
+
+
+class Observer(object):
+    '''
+    An observer of queue operations. A queue created with an observer
+    reports the latency and number of elements of each push(), push_some(),
+    pop() and pop_some() call, and counts pushed blocks, duplicates which
+    are not queued again, bytes sent and errors. Queues without an observer
+    only check that they have none.
+
+    Observers are called from the thread which runs the operation.
+    '''
+
+    def observe(self, queue, operation, seconds, num_elements=None):
+        '''
+        Receive a finished operation.
+
+        Arguments:
+        :queue -- the queue
+        :operation -- string, OPERATION_PUSH, OPERATION_PUSH_SOME,
+                      OPERATION_POP or OPERATION_POP_SOME
+        :seconds -- float, operation latency
+        :num_elements -- integer (default: none), elements pushed or popped,
+                         none if it is not known (an iterable pushed on
+                         stream mode)
+        '''
+        pass
+
+    def count(self, queue, counter, value):
+        '''
+        Receive a counter increment.
+
+        Arguments:
+        :queue -- the queue
+        :counter -- string, COUNTER_BLOCKS, COUNTER_DUPLICATES,
+                    COUNTER_BYTES_SENT or COUNTER_ERRORS
+        :value -- integer
+        '''
+        pass
+
+
+class MemoryCollector(Observer):
+    '''
+    An observer which keeps every observation in memory, useful on tests
+    and short benchmarks.
+    '''
+
+    def __init__(self):
+        '''
+        Create a MemoryCollector object.
+        '''
+        self.lock = threading.Lock()
+        self.reset()
+
+    def observe(self, queue, operation, seconds, num_elements=None):
+        with self.lock:
+            self.operations.append((Instrumentation.get_queue_name(queue),
+                                    operation, seconds, num_elements))
+
+    def count(self, queue, counter, value):
+        key = (Instrumentation.get_queue_name(queue), counter)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def get_latencies(self, operation, queue_name=None):
+        '''
+        Get the latencies of an operation.
+
+        Arguments:
+        :operation -- string
+        :queue_name -- string (default: none), by default every queue
+
+        Returns: list of floats
+        '''
+        return [seconds for name, op, seconds, num_elements in self.operations
+                if op == operation and queue_name in (None, name)]
+
+    def get_num_elements(self, operation, queue_name=None):
+        '''
+        Get the number of elements of each call of an operation.
+
+        Arguments:
+        :operation -- string
+        :queue_name -- string (default: none), by default every queue
+
+        Returns: list of integers (or none)
+        '''
+        return [num_elements for name, op, seconds, num_elements
+                in self.operations
+                if op == operation and queue_name in (None, name)]
+
+    def get_count(self, counter, queue_name=None):
+        '''
+        Get the total of a counter.
+
+        Arguments:
+        :counter -- string
+        :queue_name -- string (default: none), by default every queue
+
+        Returns: integer
+        '''
+        return sum(value for (name, c), value in self.counters.items()
+                   if c == counter and queue_name in (None, name))
+
+    def reset(self):
+        '''
+        Forget every observation.
+        '''
+        self.operations = []
+        self.counters = {}
+
+
+class PrometheusCollector(Observer):
+    '''
+    An observer which aggregates observations, by queue and operation, into
+    latency histograms and counters, with bounded memory. expose() renders
+    them in the Prometheus text exposition format, to be served on a metrics
+    endpoint.
+    '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix=METRICS_PREFIX):
+        '''
+        Create a PrometheusCollector object.
+
+        Arguments:
+        :buckets -- a sorted collection of floats (default: LATENCY_BUCKETS),
+                    histogram upper bounds, in seconds
+        :prefix -- string (default: METRICS_PREFIX), metric names prefix
+        '''
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, queue, operation, seconds, num_elements=None):
+        key = (Instrumentation.get_queue_name(queue), operation)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = {
+                    'buckets': [0 for bucket in self.buckets],
+                    'sum': 0.0,
+                    'count': 0,
+                    'elements': 0,
+                }
+            histogram = self.histograms[key]
+            position = bisect.bisect_left(self.buckets, seconds)
+            if position < len(self.buckets):
+                histogram['buckets'][position] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            histogram['elements'] += num_elements or 0
+
+    def count(self, queue, counter, value):
+        key = (Instrumentation.get_queue_name(queue), counter)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def expose(self):
+        '''
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns: string
+        '''
+        name_seconds = '%s_operation_seconds' % (self.prefix, )
+        name_elements = '%s_operation_elements_total' % (self.prefix, )
+        lines = [
+            '# HELP %s Queue operation latency.' % (name_seconds, ),
+            '# TYPE %s histogram' % (name_seconds, ),
+        ]
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        for (queue_name, operation), histogram in histograms:
+            labels = 'queue="%s",operation="%s"' % (
+                PrometheusCollector.escape(queue_name), operation)
+            num_cumulative = 0
+            for bucket, num in zip(self.buckets, histogram['buckets']):
+                num_cumulative += num
+                lines.append('%s_bucket{%s,le="%s"} %s' % (
+                    name_seconds, labels, repr(float(bucket)),
+                    num_cumulative))
+            lines.append('%s_bucket{%s,le="+Inf"} %s' % (
+                name_seconds, labels, histogram['count']))
+            lines.append('%s_sum{%s} %s' % (name_seconds, labels,
+                                            repr(histogram['sum'])))
+            lines.append('%s_count{%s} %s' % (name_seconds, labels,
+                                              histogram['count']))
+
+        lines.extend([
+            '# HELP %s Elements pushed or popped.' % (name_elements, ),
+            '# TYPE %s counter' % (name_elements, ),
+        ])
+        for (queue_name, operation), histogram in histograms:
+            lines.append('%s{queue="%s",operation="%s"} %s' % (
+                name_elements, PrometheusCollector.escape(queue_name),
+                operation, histogram['elements']))
+
+        names = sorted(set(counter for (queue_name, counter), value
+                           in counters))
+        for counter in names:
+            name = '%s_%s_total' % (self.prefix, counter)
+            lines.extend([
+                '# HELP %s Queue %s.' % (name, counter.replace('_', ' ')),
+                '# TYPE %s counter' % (name, ),
+            ])
+            for (queue_name, c), value in counters:
+                if c == counter:
+                    lines.append('%s{queue="%s"} %s' % (
+                        name, PrometheusCollector.escape(queue_name), value))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def escape(value):
+        '''
+        Escape a label value.
+
+        Arguments:
+        :value -- string
+
+        Returns: string
+        '''
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+            '\n', '\\n')
+
+
+class Instrumentation(object):
+
+    @staticmethod
+    def get_queue_name(queue):
+        '''
+        Get the name which labels a queue's observations, its queue key, or
+        its bucket key for queues without a list.
+
+        Arguments:
+        :queue -- the queue
+
+        Returns: string
+        '''
+        key = getattr(queue, 'key_queue', None)
+        if key is None:
+            key = queue.key_queue_bucket
+        return key
+
+    @staticmethod
+    def get_num_bytes(elements):
+        '''
+        Get the size of a bunch of (serialized) elements, as they are sent.
+
+        Arguments:
+        :elements -- a collection of bytes, strings or numbers
+
+        Returns: integer
+        '''
+        num_bytes = 0
+        for element in elements:
+            if isinstance(element, (bytes, bytearray, memoryview)):
+                num_bytes += len(element)
+            elif isinstance(element, str):
+                num_bytes += len(element.encode('utf-8'))
+            else:
+                num_bytes += len(str(element))
+        return num_bytes
+
+    @staticmethod
+    def get_num_elements(operation, args, kwargs, result):
+        '''
+        Get the number of elements of an operation call, the pushed ones,
+        if they are a sized collection, or the popped ones.
+
+        Arguments:
+        :operation -- string
+        :args -- tuple, call positional arguments
+        :kwargs -- dict, call keyword arguments
+        :result -- what the call returns
+
+        Returns: integer, or, none, if it is not known
+        '''
+        if operation == OPERATION_PUSH:
+            return 1
+        if operation == OPERATION_PUSH_SOME:
+            elements = kwargs.get('elements', args[0] if args else None)
+            return len(elements) if hasattr(elements, '__len__') else None
+        if operation == OPERATION_POP:
+            return 0 if result is None else 1
+        return len(result)
+
+
+def instrumented(operation):
+    '''
+    Decorate a queue method, so its calls are reported to the queue's
+    observer, if it has one. Errors are counted and raised again. Calls of
+    decorated methods made by a decorated method of the same queue are part
+    of the outer operation, they are not reported.
+
+    Arguments:
+    :operation -- string
+
+    Returns: function
+    '''
+    def decorator(method):
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.observer is None:
+                return method(self, *args, **kwargs)
+
+            queues = observed.__dict__.setdefault('queues', set())
+            if id(self) in queues:
+                return method(self, *args, **kwargs)
+
+            queues.add(id(self))
+            started_at = timer()
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception:
+                self.observer.count(self, COUNTER_ERRORS, 1)
+                raise
+            finally:
+                queues.discard(id(self))
+            self.observer.observe(
+                self, operation, timer() - started_at,
+                Instrumentation.get_num_elements(operation, args, kwargs,
+                                                 result))
+            return result
+
+        return wrapper
+
+    return decorator
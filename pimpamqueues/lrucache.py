@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+NUM_CACHE_SIZE = 100000
+
+MISSING = object()
+
+
+class LRUCache(object):
+    '''
+    A bounded, thread safe, least recently used cache. Once it holds
+    max_size entries, every new entry evicts the least recently used one.
+    Keys which can not be hashed are never cached, they are counted as
+    misses.
+
+    Lookups and stores are made by bunches, so a block of elements takes the
+    lock once.
+    '''
+
+    def __init__(self, max_size=NUM_CACHE_SIZE):
+        '''
+        Create a LRUCache object.
+
+        Arguments:
+        :max_size -- integer (default: NUM_CACHE_SIZE), maximum number of
+                     entries
+
+        Raise:
+        :PimPamQueuesError(), if max_size is not positive
+        '''
+        if max_size < 1:
+            raise PimPamQueuesError('A cache needs a positive max_size')
+
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<LRUCache: %s/%s>' % (len(self), self.max_size)
+
+    def __len__(self):
+        '''
+        Get the number of cached entries.
+
+        Returns: integer
+        '''
+        return len(self.entries)
+
+    def get_some(self, keys):
+        '''
+        Get the cached values of a bunch of keys, found keys become the most
+        recently used ones.
+
+        Arguments:
+        :keys -- a collection of keys
+
+        Returns: list, values, or MISSING for keys which are not cached
+        '''
+        values = []
+        with self.lock:
+            for key in keys:
+                try:
+                    value = self.entries.pop(key, MISSING)
+                except TypeError:
+                    value = MISSING
+                if value is MISSING:
+                    self.num_misses += 1
+                else:
+                    self.entries[key] = value
+                    self.num_hits += 1
+                values.append(value)
+        return values
+
+    def set_some(self, keys, values):
+        '''
+        Cache the values of a bunch of keys, evicting the least recently used
+        entries if cache is full.
+
+        Arguments:
+        :keys -- a collection of keys
+        :values -- a collection of values
+        '''
+        with self.lock:
+            for key, value in zip(keys, values):
+                try:
+                    self.entries.pop(key, None)
+                    self.entries[key] = value
+                except TypeError:
+                    continue
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.num_evictions += 1
+
+    def stats(self):
+        '''
+        Get the cache counters.
+
+        Returns: dict
+        '''
+        num_lookups = self.num_hits + self.num_misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.num_hits,
+            'misses': self.num_misses,
+            'evictions': self.num_evictions,
+            'hit_ratio': (float(self.num_hits) / num_lookups
+                          if num_lookups else None),
+        }
+
+    def clear(self):
+        '''
+        Remove all entries, counters are kept.
+        '''
+        with self.lock:
+            self.entries.clear()
+
+
+class DisambiguatorCacheRegistry(object):
+    '''
+    A registry of disambiguation caches, one per disambiguator class, so
+    every queue with the same disambiguator shares the results of its
+    disambiguate() static method. A disambiguator has to return the same
+    value for the same raw element.
+    '''
+
+    def __init__(self):
+        '''
+        Create a DisambiguatorCacheRegistry object.
+        '''
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def get(self, disambiguator, max_size=NUM_CACHE_SIZE):
+        '''
+        Get the cache of a disambiguator, it is created the first time, with
+        max_size entries. Later max_size values do not resize it.
+
+        Arguments:
+        :disambiguator -- class
+        :max_size -- integer (default: NUM_CACHE_SIZE)
+
+        Returns: LRUCache
+        '''
+        with self.lock:
+            if disambiguator not in self.caches:
+                self.caches[disambiguator] = LRUCache(max_size)
+            return self.caches[disambiguator]
+
+    def clear(self, disambiguator=None):
+        '''
+        Remove the cache of a disambiguator, or, by default, all caches.
+
+        Arguments:
+        :disambiguator -- class (default: none)
+        '''
+        with self.lock:
+            if disambiguator is None:
+                self.caches.clear()
+            else:
+                self.caches.pop(disambiguator, None)
+
+
+disambiguator_caches = DisambiguatorCacheRegistry()
@@ -0,0 +1,736 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+import weakref
+
+from redis.exceptions import NoScriptError
+
+
+SCRIPT_BUCKET_PUSH = 'bucket_push'
+SCRIPT_SMART_PUSH = 'smart_push'
+SCRIPT_SMART_PUSH_FORCE = 'smart_push_force'
+SCRIPT_SMART_PUSH_FINGERPRINT = 'smart_push_fingerprint'
+SCRIPT_SMART_PUSH_FINGERPRINT_FORCE = 'smart_push_fingerprint_force'
+SCRIPT_SMART_CHECK_FINGERPRINTS = 'smart_check_fingerprints'
+SCRIPT_SMART_PUSH_WINDOW = 'smart_push_window'
+SCRIPT_SMART_PUSH_WINDOW_FORCE = 'smart_push_window_force'
+SCRIPT_SMART_EXPIRE_WINDOW = 'smart_expire_window'
+SCRIPT_SMART_PRIORITY_PUSH = 'smart_priority_push'
+SCRIPT_SMART_PRIORITY_PUSH_FORCE = 'smart_priority_push_force'
+SCRIPT_DELAYED_PROMOTE = 'delayed_promote'
+SCRIPT_RELIABLE_LEASE = 'reliable_lease'
+SCRIPT_RELIABLE_NACK = 'reliable_nack'
+SCRIPT_RELIABLE_REAP = 'reliable_reap'
+SCRIPT_RELIABLE_ACK = 'reliable_ack'
+SCRIPT_RELIABLE_TOUCH = 'reliable_touch'
+SCRIPT_SIMPLE_PUSH_TRACKED = 'simple_push_tracked'
+SCRIPT_SIMPLE_POP_TRACKED = 'simple_pop_tracked'
+SCRIPT_SIMPLE_TRACK_POP = 'simple_track_pop'
+SCRIPT_BUCKET_POP_TRACKED = 'bucket_pop_tracked'
+SCRIPT_SIMPLE_REMOVE_TRACKED = 'simple_remove_tracked'
+
+# Signals kept in the BucketQueue signal list, blocked pops only need one
+# signal each, so at most this number of waiters are woken up per push.
+NUM_BUCKET_SIGNALS = 100
+
+# Stats tracking, shared by scripts. Pushed blocks are recorded in a list
+# of 'milliseconds:count' runs, in the same order than the queue list, so
+# the enqueue time of the head element is the first run's time.
+LUA_TRACK_PUSH = """
+    local function track_push(push_to, key_enqueued, key_stats, num)
+      if num > 0 then
+        local now = redis.call('TIME')
+        redis.call(push_to, key_enqueued, string.format('%d:%d',
+                   tonumber(now[1]) * 1000 + math.floor(now[2] / 1000), num))
+        redis.call('HINCRBY', key_stats, 'pushed', num)
+      end
+    end
+"""
+
+LUA_TRACK_POP = """
+    local function track_pop(key_queue, key_enqueued, key_stats, last, num)
+      if num > 0 then
+        redis.call('HINCRBY', key_stats, 'popped', num)
+      end
+      if redis.call('LLEN', key_queue) == 0 then
+        redis.call('DEL', key_enqueued)
+        return
+      end
+      local index = last and -1 or 0
+      while num > 0 do
+        local run = redis.call('LINDEX', key_enqueued, index)
+        if not run then
+          return
+        end
+        local separator = string.find(run, ':')
+        local count = tonumber(string.sub(run, separator + 1))
+        if count > num then
+          redis.call('LSET', key_enqueued, index,
+                     string.sub(run, 1, separator) .. (count - num))
+          return
+        end
+        redis.call(last and 'RPOP' or 'LPOP', key_enqueued)
+        num = num - count
+      end
+    end
+"""
+
+LUA_TRACK_REMOVE = """
+    local function track_remove(key_enqueued, positions)
+      local runs = redis.call('LRANGE', key_enqueued, 0, -1)
+      local offset = 0
+      local p = 1
+      redis.call('DEL', key_enqueued)
+      for i=1, #runs do
+        local separator = string.find(runs[i], ':')
+        local count = tonumber(string.sub(runs[i], separator + 1))
+        local num = count
+        while p <= #positions and positions[p] < offset + count do
+          num = num - 1
+          p = p + 1
+        end
+        offset = offset + count
+        if num > 0 then
+          redis.call('RPUSH', key_enqueued,
+                     string.sub(runs[i], 1, separator) .. num)
+        end
+      end
+    end
+"""
+
+# ReliableConsumer leases, shared by scripts. Each lease is a 'n:element'
+# member of the processing sorted set, where n is the element's lease
+# number (1 to its count of leases, kept in a hash), so the same element
+# can be leased many times. Releasing a lease moves the last one in its
+# place, so lease numbers stay contiguous.
+LUA_RELEASE_LEASE = """
+    local function release_lease(key_processing, key_counts, element, n)
+      local num = tonumber(redis.call('HGET', key_counts, element))
+      if not num then
+        return 0
+      end
+      n = n or num
+      if redis.call('ZREM', key_processing, n .. ':' .. element) == 0 then
+        return 0
+      end
+      if n < num then
+        local last = num .. ':' .. element
+        local deadline = redis.call('ZSCORE', key_processing, last)
+        redis.call('ZREM', key_processing, last)
+        redis.call('ZADD', key_processing, deadline, n .. ':' .. element)
+      end
+      if num == 1 then
+        redis.call('HDEL', key_counts, element)
+      else
+        redis.call('HINCRBY', key_counts, element, -1)
+      end
+      return 1
+    end
+"""
+
+
+class LuaScripts(object):
+    '''
+    A registry of Lua scripts. Each script is loaded once per redis
+    connection pool and afterwards it is called by its SHA1 digest
+    (EVALSHA), so script sources are not sent over and over again. If the
+    redis server has lost a script (NOSCRIPT), it is loaded again.
+    '''
+
+    def __init__(self):
+        '''
+        Create a LuaScripts object.
+        '''
+        self.scripts = {}
+        self.loaded = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+        self.num_loads = 0
+        self.num_hits = 0
+        self.num_reloads = 0
+
+    def register(self, name, source):
+        '''
+        Register a Lua script.
+
+        Arguments:
+        :name -- string, name used to call the script
+        :source -- string, Lua source code
+
+        Returns: string, the SHA1 digest of the script
+        '''
+        sha = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        self.scripts[name] = (source, sha)
+        return sha
+
+    def get_source(self, name):
+        '''
+        Get the Lua source code of a registered script.
+
+        Arguments:
+        :name -- string
+
+        Returns: string
+        '''
+        return self.scripts[name][0]
+
+    def get_sha(self, name):
+        '''
+        Get the SHA1 digest of a registered script.
+
+        Arguments:
+        :name -- string
+
+        Returns: string
+        '''
+        return self.scripts[name][1]
+
+    def is_loaded(self, redis_conn, name):
+        '''
+        Check if a script has been loaded through a redis connection pool.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :name -- string
+
+        Returns: boolean
+        '''
+        shas = self.loaded.get(self.__get_key_loaded(redis_conn), ())
+        return self.get_sha(name) in shas
+
+    def set_loaded(self, redis_conn, name, reloaded=False):
+        '''
+        Track that a script has been loaded through a redis connection pool.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :name -- string
+        :reloaded -- boolean (default: false), true if script has been
+                     loaded again after a NOSCRIPT error
+        '''
+        with self.lock:
+            self.loaded.setdefault(self.__get_key_loaded(redis_conn),
+                                   set()).add(self.get_sha(name))
+            if reloaded:
+                self.num_reloads += 1
+            else:
+                self.num_loads += 1
+
+    def add_hits(self, num_hits=1):
+        '''
+        Track scripts which have been called by its SHA1 digest.
+
+        Arguments:
+        :num_hits -- integer (default: 1)
+        '''
+        with self.lock:
+            self.num_hits += num_hits
+
+    def load(self, redis_conn, name):
+        '''
+        Load a script into the redis server, only if it has not been loaded
+        before through the same connection pool.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :name -- string
+
+        Returns: string, the SHA1 digest of the script
+        '''
+        if not self.is_loaded(redis_conn, name):
+            redis_conn.script_load(self.get_source(name))
+            self.set_loaded(redis_conn, name)
+        return self.get_sha(name)
+
+    def evalsha(self, redis_conn, name, keys, args):
+        '''
+        Call a registered script by its SHA1 digest. Script is loaded if it
+        is needed.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :name -- string
+        :keys -- list of strings, script's KEYS
+        :args -- list of strings, script's ARGV
+
+        Returns: the script's result
+        '''
+        sha = self.load(redis_conn, name)
+        try:
+            result = redis_conn.evalsha(sha, len(keys), *(keys + args))
+        except NoScriptError:
+            redis_conn.script_load(self.get_source(name))
+            self.set_loaded(redis_conn, name, reloaded=True)
+            return redis_conn.evalsha(sha, len(keys), *(keys + args))
+
+        self.add_hits()
+        return result
+
+    def evalsha_some(self, redis_conn, name, keys, args_some):
+        '''
+        Call a registered script several times, with different ARGV, in one
+        pipeline. Each call is still atomic on its own. Calls which fail with
+        a NOSCRIPT error have not been run, so they are run again once the
+        script is loaded again.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :name -- string
+        :keys -- list of strings, script's KEYS
+        :args_some -- list of lists of strings, script's ARGV of each call
+
+        Returns: list, the script's results in the same order than args_some
+        '''
+        sha = self.load(redis_conn, name)
+
+        pipe = redis_conn.pipeline(transaction=False)
+        for args in args_some:
+            pipe.evalsha(sha, len(keys), *(keys + args))
+        results = pipe.execute(raise_on_error=False)
+
+        reloaded = False
+        for i, result in enumerate(results):
+            if isinstance(result, NoScriptError):
+                if not reloaded:
+                    redis_conn.script_load(self.get_source(name))
+                    self.set_loaded(redis_conn, name, reloaded=True)
+                    reloaded = True
+                results[i] = redis_conn.evalsha(
+                    sha, len(keys), *(keys + args_some[i]))
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                self.add_hits()
+
+        return results
+
+    def stats(self):
+        '''
+        Get how many times scripts have been loaded, called by its SHA1
+        digest and reloaded after a NOSCRIPT error.
+
+        Returns: dict
+        '''
+        return {
+            'loads': self.num_loads,
+            'hits': self.num_hits,
+            'reloads': self.num_reloads,
+        }
+
+    def reset_stats(self):
+        '''
+        Reset the loads, hits and reloads counters.
+        '''
+        with self.lock:
+            self.num_loads = 0
+            self.num_hits = 0
+            self.num_reloads = 0
+
+    def __get_key_loaded(self, redis_conn):
+        '''
+        Get the object which tracks which scripts have been loaded. Scripts
+        are tracked per connection pool, so every redis connection that
+        shares a pool shares loaded scripts.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+
+        Returns: object
+        '''
+        return getattr(redis_conn, 'connection_pool', redis_conn)
+
+
+lua_scripts = LuaScripts()
+
+lua_scripts.register(SCRIPT_BUCKET_PUSH, """
+    local elements = {}
+
+    for i=1, #ARGV do
+      if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
+        table.insert(elements, ARGV[i])
+      end
+    end
+
+    if #elements > 0 then
+      for i=1, math.min(#elements, %(num_signals)d) do
+        redis.call('RPUSH', KEYS[2], 1)
+      end
+      redis.call('LTRIM', KEYS[2], -%(num_signals)d, -1)
+      if #KEYS > 2 then
+        redis.call('HINCRBY', KEYS[3], 'pushed', #elements)
+      end
+    end
+
+    return elements
+""" % {'num_signals': NUM_BUCKET_SIGNALS})
+
+lua_scripts.register(SCRIPT_SMART_PUSH, LUA_TRACK_PUSH + """
+    local elements = {}
+    local indices = {}
+
+    for i=2, #ARGV do
+      if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
+        table.insert(elements, ARGV[i])
+        table.insert(indices, i - 1)
+      end
+    end
+
+    for i=1, #elements do
+      redis.call(ARGV[1], KEYS[2], elements[i])
+    end
+
+    if #KEYS > 2 then
+      track_push(ARGV[1], KEYS[3], KEYS[4], #indices)
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_PUSH_FORCE, LUA_TRACK_PUSH + """
+    local indices = {}
+
+    for i=2, #ARGV do
+      redis.call('SADD', KEYS[1], ARGV[i])
+      redis.call(ARGV[1], KEYS[2], ARGV[i])
+      table.insert(indices, i - 1)
+    end
+
+    if #KEYS > 2 then
+      track_push(ARGV[1], KEYS[3], KEYS[4], #indices)
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_PUSH_FINGERPRINT, LUA_TRACK_PUSH + """
+    local elements = {}
+    local indices = {}
+
+    for i=2, #ARGV, 2 do
+      if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
+        table.insert(elements, ARGV[i + 1])
+        table.insert(indices, i / 2)
+      end
+    end
+
+    for i=1, #elements do
+      redis.call(ARGV[1], KEYS[2], elements[i])
+    end
+
+    if #KEYS > 2 then
+      track_push(ARGV[1], KEYS[3], KEYS[4], #indices)
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_CHECK_FINGERPRINTS, """
+    local indices = {}
+
+    for i=1, #ARGV do
+      if redis.call('SISMEMBER', KEYS[1], ARGV[i]) == 0 then
+        table.insert(indices, i)
+      end
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_PUSH_FINGERPRINT_FORCE, LUA_TRACK_PUSH + """
+    local indices = {}
+
+    for i=2, #ARGV, 2 do
+      redis.call('SADD', KEYS[1], ARGV[i])
+      redis.call(ARGV[1], KEYS[2], ARGV[i + 1])
+      table.insert(indices, i / 2)
+    end
+
+    if #KEYS > 2 then
+      track_push(ARGV[1], KEYS[3], KEYS[4], #indices)
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_EXPIRE_WINDOW, """
+    local window_start = tonumber(ARGV[1]) - tonumber(ARGV[2])
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf',
+                               '(' .. window_start, 'LIMIT', 0,
+                               tonumber(ARGV[3]))
+
+    for i=1, #expired do
+      redis.call('ZREM', KEYS[1], expired[i])
+    end
+
+    return #expired
+""")
+
+lua_scripts.register(SCRIPT_SMART_PUSH_WINDOW, LUA_TRACK_PUSH + """
+    local window_start = tonumber(ARGV[2]) - tonumber(ARGV[3])
+    local step = tonumber(ARGV[5])
+    local elements = {}
+    local indices = {}
+
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf',
+                               '(' .. window_start, 'LIMIT', 0,
+                               tonumber(ARGV[4]))
+    for i=1, #expired do
+      redis.call('ZREM', KEYS[1], expired[i])
+    end
+
+    for i=6, #ARGV, step do
+      local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+      if not score or tonumber(score) < window_start then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[i])
+        table.insert(elements, ARGV[i + step - 1])
+        table.insert(indices, (i - 6) / step + 1)
+      end
+    end
+
+    for i=1, #elements do
+      redis.call(ARGV[1], KEYS[2], elements[i])
+    end
+
+    if #elements > 0 then
+      redis.call('PEXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3]) * 1000))
+    end
+
+    if #KEYS > 2 then
+      track_push(ARGV[1], KEYS[3], KEYS[4], #indices)
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_PUSH_WINDOW_FORCE, LUA_TRACK_PUSH + """
+    local window_start = tonumber(ARGV[2]) - tonumber(ARGV[3])
+    local step = tonumber(ARGV[5])
+    local indices = {}
+
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf',
+                               '(' .. window_start, 'LIMIT', 0,
+                               tonumber(ARGV[4]))
+    for i=1, #expired do
+      redis.call('ZREM', KEYS[1], expired[i])
+    end
+
+    for i=6, #ARGV, step do
+      redis.call('ZADD', KEYS[1], ARGV[2], ARGV[i])
+      redis.call(ARGV[1], KEYS[2], ARGV[i + step - 1])
+      table.insert(indices, (i - 6) / step + 1)
+    end
+
+    if #indices > 0 then
+      redis.call('PEXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3]) * 1000))
+    end
+
+    if #KEYS > 2 then
+      track_push(ARGV[1], KEYS[3], KEYS[4], #indices)
+    end
+
+    return indices
+""")
+
+lua_scripts.register(SCRIPT_SMART_PRIORITY_PUSH, """
+    local elements = {}
+
+    for i=1, #ARGV, 2 do
+      if redis.call('SADD', KEYS[1], ARGV[i + 1]) == 1 then
+        redis.call('ZADD', KEYS[2], ARGV[i], ARGV[i + 1])
+        table.insert(elements, ARGV[i + 1])
+      end
+    end
+
+    return elements
+""")
+
+lua_scripts.register(SCRIPT_SMART_PRIORITY_PUSH_FORCE, """
+    local elements = {}
+
+    for i=1, #ARGV, 2 do
+      redis.call('SADD', KEYS[1], ARGV[i + 1])
+      redis.call('ZADD', KEYS[2], ARGV[i], ARGV[i + 1])
+      table.insert(elements, ARGV[i + 1])
+    end
+
+    return elements
+""")
+
+lua_scripts.register(SCRIPT_DELAYED_PROMOTE, LUA_TRACK_PUSH + """
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                           'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+    local tracked = ARGV[3] == '1'
+    local key_bucket = KEYS[tracked and 5 or 3]
+    local elements = {}
+    local scores = {}
+
+    for i=1, #due, 2 do
+      redis.call('ZREM', KEYS[1], due[i])
+      table.insert(scores, due[i + 1])
+      if not key_bucket or redis.call('SADD', key_bucket, due[i]) == 1 then
+        redis.call('RPUSH', KEYS[2], due[i])
+        table.insert(elements, due[i])
+      end
+    end
+
+    if tracked then
+      track_push('RPUSH', KEYS[3], KEYS[4], #elements)
+    end
+
+    return {elements, scores}
+""")
+
+lua_scripts.register(SCRIPT_RELIABLE_LEASE, LUA_TRACK_POP + """
+    local leased = {}
+
+    for i=1, tonumber(ARGV[1]) do
+      local element = redis.call(ARGV[3], KEYS[1])
+      if not element then
+        break
+      end
+      local n = redis.call('HINCRBY', KEYS[4], element, 1)
+      redis.call('ZADD', KEYS[2], ARGV[2], n .. ':' .. element)
+      table.insert(leased, element)
+    end
+
+    if #leased > 0 then
+      redis.call('SADD', KEYS[3], ARGV[4])
+    end
+
+    if #KEYS > 4 then
+      track_pop(KEYS[1], KEYS[5], KEYS[6], ARGV[3] == 'RPOP', #leased)
+    end
+
+    return leased
+""")
+
+lua_scripts.register(SCRIPT_RELIABLE_ACK, LUA_RELEASE_LEASE + """
+    local num = 0
+
+    for i=1, #ARGV do
+      num = num + release_lease(KEYS[1], KEYS[2], ARGV[i])
+    end
+
+    return num
+""")
+
+lua_scripts.register(SCRIPT_RELIABLE_TOUCH, """
+    local n = redis.call('HGET', KEYS[2], ARGV[2])
+    if not n then
+      return 0
+    end
+    return redis.call('ZADD', KEYS[1], 'XX', 'CH', ARGV[1],
+                      n .. ':' .. ARGV[2])
+""")
+
+lua_scripts.register(SCRIPT_RELIABLE_NACK,
+                     LUA_TRACK_PUSH + LUA_RELEASE_LEASE + """
+    local elements = {}
+
+    for i=1, #ARGV do
+      if release_lease(KEYS[2], KEYS[3], ARGV[i]) == 1 then
+        table.insert(elements, ARGV[i])
+      end
+    end
+
+    for i=#elements, 1, -1 do
+      redis.call('LPUSH', KEYS[1], elements[i])
+    end
+
+    if #KEYS > 3 then
+      track_push('LPUSH', KEYS[4], KEYS[5], #elements)
+    end
+
+    return #elements
+""")
+
+lua_scripts.register(SCRIPT_RELIABLE_REAP,
+                     LUA_TRACK_PUSH + LUA_RELEASE_LEASE + """
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1],
+                               'LIMIT', 0, tonumber(ARGV[2]))
+    local leases = {}
+
+    for i=1, #expired do
+      local separator = string.find(expired[i], ':')
+      table.insert(leases, {
+        n = tonumber(string.sub(expired[i], 1, separator - 1)),
+        element = string.sub(expired[i], separator + 1)})
+    end
+
+    -- higher lease numbers first, so no expired lease is moved
+    local released = {}
+    for i=1, #leases do
+      released[i] = leases[i]
+    end
+    table.sort(released, function(a, b) return a.n > b.n end)
+    for i=1, #released do
+      release_lease(KEYS[2], KEYS[3], released[i].element, released[i].n)
+    end
+
+    for i=#leases, 1, -1 do
+      redis.call('LPUSH', KEYS[1], leases[i].element)
+    end
+
+    if #KEYS > 3 then
+      track_push('LPUSH', KEYS[4], KEYS[5], #leases)
+    end
+
+    return #leases
+""")
+
+lua_scripts.register(SCRIPT_SIMPLE_PUSH_TRACKED, LUA_TRACK_PUSH + """
+    for i=2, #ARGV do
+      redis.call(ARGV[1], KEYS[1], ARGV[i])
+    end
+
+    track_push(ARGV[1], KEYS[2], KEYS[3], #ARGV - 1)
+
+    return redis.call('LLEN', KEYS[1])
+""")
+
+lua_scripts.register(SCRIPT_SIMPLE_POP_TRACKED, LUA_TRACK_POP + """
+    local num = tonumber(ARGV[2])
+    local elements
+
+    if ARGV[1] == 'last' then
+      elements = redis.call('LRANGE', KEYS[1], -num, -1)
+      redis.call('LTRIM', KEYS[1], 0, -num - 1)
+    else
+      elements = redis.call('LRANGE', KEYS[1], 0, num - 1)
+      redis.call('LTRIM', KEYS[1], num, -1)
+    end
+
+    track_pop(KEYS[1], KEYS[2], KEYS[3], ARGV[1] == 'last', #elements)
+
+    return elements
+""")
+
+lua_scripts.register(SCRIPT_SIMPLE_TRACK_POP, LUA_TRACK_POP + """
+    track_pop(KEYS[1], KEYS[2], KEYS[3], ARGV[1] == 'last',
+              tonumber(ARGV[2]))
+
+    return 1
+""")
+
+lua_scripts.register(SCRIPT_BUCKET_POP_TRACKED, """
+    local elements = redis.call('SPOP', KEYS[1], tonumber(ARGV[1]))
+
+    if #elements > 0 then
+      redis.call('HINCRBY', KEYS[2], 'popped', #elements)
+    end
+
+    return elements
+""")
+
+lua_scripts.register(SCRIPT_SIMPLE_REMOVE_TRACKED, LUA_TRACK_REMOVE + """
+    local positions = redis.call('LPOS', KEYS[1], ARGV[1], 'COUNT', 0)
+
+    if #positions > 0 then
+      redis.call('LREM', KEYS[1], 0, ARGV[1])
+      track_remove(KEYS[2], positions)
+    end
+
+    return #positions
+""")
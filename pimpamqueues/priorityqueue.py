@@ -0,0 +1,597 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pimpamqueues import QUEUE_COLLECTION_OF_ELEMENTS
+from pimpamqueues import NUM_PIPELINE_DEPTH
+
+from pimpamqueues import Tools
+from pimpamqueues.cluster import ClusterTools
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.connections import connections
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_SMART_PRIORITY_PUSH
+from pimpamqueues.luascripts import SCRIPT_SMART_PRIORITY_PUSH_FORCE
+from pimpamqueues.exceptions import PimPamQueuesError
+from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
+from pimpamqueues.exceptions import PimPamQueuesDisambiguatorInvalidError
+
+
+class PriorityQueue(object):
+    '''
+    A lightweight queue. Priority Queue. Elements are popped by its score,
+    the lowest score first (or the highest one, popping from the last
+    position). A element is only queued once, pushing a queued element
+    updates its score.
+    '''
+
+    QUEUE_TYPE_NAME = 'priority'
+
+    def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 keep_previous=True, redis_conn=None, cluster=None,
+                 codec=None):
+        '''
+        Create a PriorityQueue object.
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :keep_previous -- boolean (default: true),
+                          a flag to create a fresh queue or not
+        :redis_conn -- redis.client.Redis (default: None), by default the
+                       shared connection of the connection registry is
+                       used. It can be a redis.cluster.RedisCluster too.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings.
+                  Equal elements have to be encoded to equal bytes.
+        '''
+        self.id_args = id_args
+        self.collection_of = collection_of
+        self.codec = codec
+
+        if redis_conn is None:
+            redis_conn = connections.get()
+        self.redis = redis_conn
+
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+
+        self.key_queue = self.get_key_queue()
+
+        if keep_previous is False:
+            self.delete()
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<%s: %s (%s)>' % (self.__class__.__name__, self.key_queue,
+                                  self.num())
+
+    def get_key_queue(self, cluster=None):
+        '''
+        Get a key id that will be used to store/retrieve data from
+        the redis server.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        if cluster is None:
+            cluster = self.cluster
+        return 'queue:%s:type:%s:of:%s' % (Tools.get_key_ids(self.id_args,
+                                                             cluster),
+                                           PriorityQueue.QUEUE_TYPE_NAME,
+                                           self.collection_of)
+
+    def migrate_keys(self, source_redis_conn=None):
+        '''
+        Move a queue stored with the key names used without the cluster flag
+        to the queue's key names. On the same (non cluster) redis server keys
+        are renamed, otherwise elements are copied block by block, from
+        source_redis_conn if it is given (source keys are kept) or from the
+        queue's redis connection (source keys are deleted).
+
+        Returns: integer, the number of migrated keys
+        '''
+        key_pairs = [(self.get_key_queue(cluster=False), self.key_queue)]
+        return ClusterTools.migrate_keys(key_pairs, self.redis,
+                                         source_redis_conn)
+
+    def push(self, element, score=0):
+        '''
+        Push a element into the queue, or update its score if it is queued.
+
+        Arguments:
+        :element -- string
+        :score -- number (default: 0)
+
+        Raise:
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: long, the number of queued elements
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+        return self.push_some([(element, score), ])
+
+    def push_some(self, elements, num_block_size=None):
+        '''
+        Push a bunch of elements into the queue, or update its scores if they
+        are queued. Blocks are sent in one pipeline.
+
+        Arguments:
+        :elements -- a dict or a collection of (element, score) tuples
+        :num_block_size -- integer (default: none)
+
+        Returns: long, the number of queued elements
+        '''
+        try:
+
+            elements = self.encode_pairs(PriorityQueue.get_pairs(elements))
+            if not elements:
+                return self.num()
+
+            block_slices = Tools.get_block_slices(
+                num_elements=len(elements),
+                num_block_size=num_block_size
+            )
+
+            pipe = self.redis.pipeline()
+            for s in block_slices:
+                pipe.zadd(self.key_queue, dict(elements[s[0]:s[1]]))
+            pipe.zcard(self.key_queue)
+            return pipe.execute().pop()
+
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def update(self, element, score):
+        '''
+        Update the score of a queued element. Elements which are not queued
+        are not pushed.
+
+        Arguments:
+        :element -- string
+        :score -- number
+
+        Returns: boolean, true if element score has changed, otherwise false
+        '''
+        element = CodecTools.encode(self.codec, element)
+        return True if self.redis.zadd(self.key_queue, {element: score},
+                                       xx=True, ch=True) else False
+
+    def pop(self, last=False, block=False, timeout=0):
+        '''
+        Pop the element with the lowest score (ZPOPMIN) from the queue, or
+        the one with the highest score (ZPOPMAX) if last is true.
+
+        If block is true and the queue is empty, it waits (BZPOPMIN/BZPOPMAX)
+        until a element is pushed or the timeout expires.
+
+        If no element is poped, it returns None
+
+        Arguments:
+        :last -- boolean (default: false)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element when
+                    block is true, 0 waits forever
+
+        Returns: string, the popped element, or, none, if no element is popped
+        '''
+        if block:
+            if last:
+                popped = self.redis.bzpopmax(self.key_queue, timeout=timeout)
+            else:
+                popped = self.redis.bzpopmin(self.key_queue, timeout=timeout)
+            return CodecTools.decode(self.codec, popped[1]) if popped else None
+
+        popped_elements = self.pop_some(1, last)
+        return popped_elements[0] if popped_elements else None
+
+    def pop_some(self, num_elements, last=False, num_block_size=None,
+                 block=False, timeout=0):
+        '''
+        Pop a bunch of elements from the queue in one atomic round trip, the
+        lowest scores first (or the highest ones if last is true).
+
+        If block is true and the queue is empty, it waits until a element is
+        pushed or the timeout expires, then pops up to num_elements.
+
+        Arguments:
+        :num_elements -- integer, maximum number of elements to be popped
+        :last -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element when
+                    block is true, 0 waits forever
+
+        Returns: list of strings, the popped elements
+        '''
+        if num_elements < 1:
+            return []
+
+        block_slices = Tools.get_block_slices(
+            num_elements=num_elements,
+            num_block_size=num_block_size
+        )
+
+        pipe = self.redis.pipeline(transaction=True)
+        for s in block_slices:
+            num_block_elements = min(s[1], num_elements) - s[0]
+            if last:
+                pipe.zpopmax(self.key_queue, num_block_elements)
+            else:
+                pipe.zpopmin(self.key_queue, num_block_elements)
+
+        popped_elements = []
+        for some_elements in pipe.execute():
+            popped_elements.extend(element for element, score in some_elements)
+
+        if popped_elements or not block:
+            return CodecTools.decode_some(self.codec, popped_elements)
+
+        element = self.pop(last=last, block=True, timeout=timeout)
+        if element is None:
+            return []
+        return [element, ] + self.pop_some(num_elements - 1, last,
+                                           num_block_size)
+
+    def num(self):
+        '''
+        Get the number of elements that are queued.
+
+        Returns: integer, the number of elements that are queued
+        '''
+        return self.redis.zcard(self.key_queue)
+
+    def is_empty(self):
+        '''
+        Check if the queue is empty.
+
+        Returns: boolean, true if queue is empty, otherwise false
+        '''
+        return True if self.num() == 0 else False
+
+    def is_not_empty(self):
+        '''
+        Check if the queue is not empty.
+
+        Returns: boolean, true if queue is not empty, otherwise false
+        '''
+        return not self.is_empty()
+
+    def is_element(self, element):
+        '''
+        Checks if a element is queued.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean
+        '''
+        return self.score(element) is not None
+
+    def score(self, element):
+        '''
+        Get the score of a queued element.
+
+        Arguments:
+        :element -- string
+
+        Returns: float, or, none, if element is not queued
+        '''
+        return self.redis.zscore(self.key_queue,
+                                 CodecTools.encode(self.codec, element))
+
+    def elements(self, queue_from=0, queue_to=-1, with_scores=False):
+        '''
+        Get some (or even all) queued elements, by the order that they are
+        popped. By default it returns all queued elements.
+
+        Note
+        ====
+        Elements are not popped.
+
+        Arguments:
+        :queue_from -- integer (default: 0)
+        :queue_to -- integer (default: -1)
+        :with_scores -- boolean (default: false), a flag to get
+                        (element, score) tuples
+
+        Returns: list
+        '''
+        elements = self.redis.zrange(self.key_queue, queue_from, queue_to,
+                                     withscores=with_scores)
+        if self.codec is None:
+            return elements
+        if with_scores:
+            return list(zip(
+                self.codec.decode_some([element for element, s in elements]),
+                [score for e, score in elements]))
+        return self.codec.decode_some(elements)
+
+    def remove(self, element):
+        '''
+        Remove a element from the queue.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, return true if element was removed, otherwise false
+        '''
+        return True if self.redis.zrem(
+            self.key_queue, CodecTools.encode(self.codec, element)) else False
+
+    def delete(self):
+        '''
+        Delete the queue with all its elements.
+
+        Returns: boolean, true if queue has been deleted, otherwise false
+        '''
+        return True if self.redis.delete(self.key_queue) else False
+
+    def encode_pairs(self, pairs):
+        '''
+        Serialize the elements of a list of (element, score) tuples.
+
+        Arguments:
+        :pairs -- list of tuples
+
+        Returns: list of tuples
+        '''
+        if self.codec is None:
+            return pairs
+        return list(zip(
+            self.codec.encode_some([element for element, score in pairs]),
+            [score for element, score in pairs]))
+
+    @staticmethod
+    def get_pairs(elements):
+        '''
+        Get a list of (element, score) tuples.
+
+        Arguments:
+        :elements -- a dict or a collection of (element, score) tuples
+
+        Returns: list of tuples
+        '''
+        if isinstance(elements, dict):
+            return list(elements.items())
+        return list(elements)
+
+
+class SmartPriorityQueue(PriorityQueue):
+    '''
+    A lightweight queue. Smart Priority Queue. It only adds a unique element
+    once for the queue's time living, queued elements are stored aside in a
+    bucket. Pushing a element which has been queued does not alter the queue
+    (unless it is forced), use update() to change the score of a queued
+    element.
+    '''
+
+    def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 keep_previous=True, redis_conn=None, disambiguator=None,
+                 cluster=None, codec=None):
+        '''
+        Create a SmartPriorityQueue object.
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :keep_previous -- boolean (default: true),
+                          a flag to create a fresh queue or not
+        :redis_conn -- redis.client.Redis (default: None), by default the
+                       shared connection of the connection registry is
+                       used. It can be a redis.cluster.RedisCluster too.
+        :disambiguator -- class (default: none), a class with a disambiguate
+                          static method which receives a string as an argument
+                          and return a string. It is used to discriminate
+                          those elements that do not need to be pushed again.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings.
+                  Equal elements have to be encoded to equal bytes.
+
+        Raise:
+        :PimPamQueuesDisambiguatorInvalidError(), if disambiguator argument
+                                                  is invalid
+        '''
+        if disambiguator and not disambiguator.__dict__.get('disambiguate'):
+            raise PimPamQueuesDisambiguatorInvalidError()
+
+        self.disambiguator = disambiguator
+        self.codec = codec
+
+        self.id_args = id_args
+        self.collection_of = collection_of
+
+        if redis_conn is None:
+            redis_conn = connections.get()
+        self.redis = redis_conn
+
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+
+        self.key_queue = self.get_key_queue()
+        self.key_queue_bucket = self.get_key_bucket()
+
+        self.keys = [self.key_queue, self.key_queue_bucket, ]
+
+        if keep_previous is False:
+            self.delete()
+
+    def get_key_bucket(self, cluster=None):
+        '''
+        Get a key id of the set of elements that have been queued.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        return '%s:bucket' % (self.get_key_queue(cluster), )
+
+    def migrate_keys(self, source_redis_conn=None):
+        '''
+        Move a queue stored with the key names used without the cluster flag
+        to the queue's key names. On the same (non cluster) redis server keys
+        are renamed, otherwise elements are copied block by block, from
+        source_redis_conn if it is given (source keys are kept) or from the
+        queue's redis connection (source keys are deleted).
+
+        Returns: integer, the number of migrated keys
+        '''
+        key_pairs = [
+            (self.get_key_queue(cluster=False), self.key_queue),
+            (self.get_key_bucket(cluster=False), self.key_queue_bucket),
+        ]
+        return ClusterTools.migrate_keys(key_pairs, self.redis,
+                                         source_redis_conn)
+
+    def push(self, element, score=0, force=False):
+        '''
+        Push a element into the queue.
+
+        Arguments:
+        :element -- string
+        :score -- number (default: 0)
+        :force -- boolean (default: False), a flag to queue the element even
+                  if it has been queued, or update its score if it is queued
+
+        Raise:
+        :PimPamQueuesError(), if element can not be pushed
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: string, if element was queued returns the queued element,
+                 otherwise, empty string
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+
+        try:
+            if self.push_some([(element, score), ], force):
+                return element
+            return ''
+        except Exception:
+            raise PimPamQueuesError("%s was not pushed" % (element))
+
+    def push_some(self, elements, force=False, num_block_size=None,
+                  num_pipeline_depth=None):
+        '''
+        Push a bunch of elements into the queue. Blocks are pipelined,
+        num_pipeline_depth blocks per round trip, and each block is pushed
+        atomically.
+
+        Arguments:
+        :elements -- a dict or a collection of (element, score) tuples
+        :force -- boolean (default: False)
+        :num_block_size -- integer (default: none)
+        :num_pipeline_depth -- integer (default: none), how many blocks are
+                               sent per round trip
+
+        Raise:
+        :PimPamQueuesError(), if element can not be pushed
+
+        Returns: list of strings, a list with queued elements
+        '''
+        try:
+
+            elements = self.disambiguate_pairs(
+                PriorityQueue.get_pairs(elements))
+            if not elements:
+                return []
+
+            block_slices = Tools.get_block_slices(
+                num_elements=len(elements),
+                num_block_size=num_block_size
+            )
+
+            queued_elements = []
+            for some_slices in Tools.get_blocks(
+                    block_slices, num_pipeline_depth or NUM_PIPELINE_DEPTH):
+                args_some = []
+                for s in some_slices:
+                    script, keys, args = self.get_push_script(
+                        elements[s[0]:s[1]], force)
+                    args_some.append(args)
+                for some_elements in lua_scripts.evalsha_some(
+                        self.redis, script, keys, args_some):
+                    queued_elements.extend(
+                        CodecTools.decode_some(self.codec, some_elements))
+            return queued_elements
+
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def get_push_script(self, elements, force=False):
+        '''
+        Get the Lua script call which pushes a block of elements, so it can
+        be pipelined along other commands (QueueGroup). Elements have to be
+        disambiguated. The script replies the queued (serialized) elements.
+
+        Arguments:
+        :elements -- a list of (element, score) tuples
+        :force -- boolean (default: False)
+
+        Returns: tuple, script name, keys and args
+        '''
+        script = SCRIPT_SMART_PRIORITY_PUSH
+        if force:
+            script = SCRIPT_SMART_PRIORITY_PUSH_FORCE
+
+        args = []
+        for element, score in self.encode_pairs(elements):
+            args.extend([score, element])
+        return script, [self.key_queue_bucket, self.key_queue], args
+
+    def disambiguate(self, element):
+        '''
+        Treats a element.
+
+        Arguments:
+        :element -- string
+
+        Returns: string
+        '''
+        if self.disambiguator:
+            return self.disambiguator.disambiguate(element)
+        return element
+
+    def disambiguate_pairs(self, pairs):
+        '''
+        Treats the elements of a list of (element, score) tuples at once.
+
+        Arguments:
+        :pairs -- a list of (element, score) tuples
+
+        Returns: list of (element, score) tuples
+        '''
+        if not self.disambiguator or not pairs:
+            return pairs
+        elements, scores = zip(*pairs)
+        return list(zip(Tools.disambiguate_some(self.disambiguator,
+                                                list(elements)), scores))
+
+    def delete(self):
+        '''
+        Delete the queue with all its elements.
+
+        Returns: boolean, true if queue has been deleted, otherwise false
+        '''
+        return True if self.redis.delete(*self.keys) else False
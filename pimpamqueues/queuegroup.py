@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from redis.exceptions import NoScriptError
+
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_PUSH_TRACKED
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_POP_TRACKED
+from pimpamqueues.luascripts import SCRIPT_BUCKET_POP_TRACKED
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.priorityqueue import PriorityQueue
+from pimpamqueues.priorityqueue import SmartPriorityQueue
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+COMMAND_EVALSHA = 'evalsha'
+
+
+class QueueGroup(object):
+    '''
+    A group of queues (SimpleQueue, BucketQueue, SmartQueue, PriorityQueue
+    or SmartPriorityQueue) whose operations are run across all of them in
+    one pipeline per redis server, so checking or feeding thousands of
+    queues takes one round trip instead of one per queue.
+
+    Results are returned per queue, in the same order than queues, and they
+    are the same that each queue's method returns.
+    '''
+
+    def __init__(self, queues):
+        '''
+        Create a QueueGroup object.
+
+        Arguments:
+        :queues -- a collection of queues
+
+        Raise:
+        :PimPamQueuesError(), if a queue type is not supported
+        '''
+        self.queues = list(queues)
+        for queue in self.queues:
+            if not isinstance(queue, (SimpleQueue, BucketQueue,
+                                      PriorityQueue)):
+                raise PimPamQueuesError('%s can not be grouped' % (queue, ))
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<QueueGroup: %s queues>' % (len(self.queues), )
+
+    def __len__(self):
+        '''
+        Get the number of grouped queues.
+
+        Returns: integer
+        '''
+        return len(self.queues)
+
+    def num(self):
+        '''
+        Get the number of elements that are queued in each queue.
+
+        Returns: list of integers
+        '''
+        return QueueGroup.execute([self.__get_num_call(queue)
+                                   for queue in self.queues])
+
+    def is_empty(self):
+        '''
+        Check which queues are empty.
+
+        Returns: list of booleans, true if queue is empty, otherwise false
+        '''
+        return [num == 0 for num in self.num()]
+
+    def is_not_empty(self):
+        '''
+        Check which queues are not empty.
+
+        Returns: list of booleans, true if queue is not empty, otherwise false
+        '''
+        return [num != 0 for num in self.num()]
+
+    def is_element(self, element):
+        '''
+        Check in which queues a element is. SimpleQueues can not be checked.
+
+        Arguments:
+        :element -- string
+
+        Raise:
+        :PimPamQueuesError(), if there is a SimpleQueue in the group
+
+        Returns: list of booleans
+        '''
+        return QueueGroup.execute([
+            self.__get_is_element_call(queue, element)
+            for queue in self.queues
+        ])
+
+    def push_some(self, elements_some, to_first=False, force=False):
+        '''
+        Push a bunch of elements into each queue. The elements of each queue
+        are pushed atomically as one block, Lua backed queues with one
+        script call per queue in the same pipeline.
+
+        SmartQueue dedup filters are fed but not checked, and two_phase is
+        not used, so the group push keeps its one round trip (push scripts
+        discard duplicates anyway).
+
+        Arguments:
+        :elements_some -- a list of collections of elements, one per queue,
+                          (element, score) tuples or dicts for priority
+                          queues
+        :to_first -- boolean (default: false), SimpleQueue and SmartQueue
+        :force -- boolean (default: False), SmartQueue and
+                  SmartPriorityQueue
+
+        Raise:
+        :PimPamQueuesError(), if elements can not be pushed
+
+        Returns: list, what each queue's push_some() returns
+        '''
+        if len(elements_some) != len(self.queues):
+            raise PimPamQueuesError('%s collections of elements for %s '
+                                    'queues' % (len(elements_some),
+                                                len(self.queues)))
+        try:
+            return QueueGroup.execute([
+                self.__get_push_some_call(queue, elements, to_first, force)
+                for queue, elements in zip(self.queues, elements_some)
+            ])
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def pop_some(self, num_elements, last=False):
+        '''
+        Pop a bunch of elements from each queue, each queue atomically.
+
+        Arguments:
+        :num_elements -- integer, maximum number of elements to be popped
+                         from each queue
+        :last -- boolean (default: false), SimpleQueue, SmartQueue and
+                 priority queues
+
+        Returns: list of lists of strings, the popped elements of each queue
+        '''
+        if num_elements < 1:
+            return [[] for queue in self.queues]
+        return QueueGroup.execute([
+            self.__get_pop_some_call(queue, num_elements, last)
+            for queue in self.queues
+        ])
+
+    def __get_num_call(self, queue):
+        '''
+        Get the commands which count the elements of a queue.
+
+        Arguments:
+        :queue -- a queue
+
+        Returns: tuple, queue, commands and a function which parses its
+                 results
+        '''
+        if isinstance(queue, PriorityQueue):
+            command = ('zcard', queue.key_queue)
+        elif isinstance(queue, SimpleQueue):
+            command = ('llen', queue.key_queue)
+        else:
+            command = ('scard', queue.key_queue_bucket)
+        return queue, [command, ], lambda results: results[0]
+
+    def __get_is_element_call(self, queue, element):
+        '''
+        Get the commands which check if a element is in a queue.
+
+        Arguments:
+        :queue -- a queue
+        :element -- string
+
+        Returns: tuple, queue, commands and a function which parses its
+                 results
+        '''
+        if isinstance(queue, PriorityQueue):
+            return (queue, [('zscore', queue.key_queue,
+                             CodecTools.encode(queue.codec, element)), ],
+                    lambda results: results[0] is not None)
+
+        if isinstance(queue, SmartQueue) and queue.dedup_window:
+            window_from = time.time() - queue.dedup_window
+            return (queue, [('zscore', queue.key_queue_bucket,
+                             queue.get_bucket_element(
+                                 queue.get_dedup_value(element))), ],
+                    lambda results: (results[0] is not None and
+                                     results[0] >= window_from))
+
+        if isinstance(queue, BucketQueue):
+            return (queue, [('sismember', queue.key_queue_bucket,
+                             queue.get_bucket_element(
+                                 queue.get_dedup_value(element))), ],
+                    lambda results: bool(results[0]))
+
+        raise PimPamQueuesError('%s has no element check' % (queue, ))
+
+    def __get_push_some_call(self, queue, elements, to_first=False,
+                             force=False):
+        '''
+        Get the commands which push a bunch of elements into a queue.
+
+        Arguments:
+        :queue -- a queue
+        :elements -- a collection of elements
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+
+        Returns: tuple, queue, commands and a function which parses its
+                 results
+        '''
+        if isinstance(queue, SmartPriorityQueue):
+            elements = queue.disambiguate_pairs(
+                PriorityQueue.get_pairs(elements))
+            if not elements:
+                return queue, [], lambda results: []
+            command = (COMMAND_EVALSHA, ) + queue.get_push_script(elements,
+                                                                  force)
+            return (queue, [command, ],
+                    lambda results: CodecTools.decode_some(queue.codec,
+                                                           results[0]))
+
+        if isinstance(queue, PriorityQueue):
+            commands = [('zcard', queue.key_queue), ]
+            elements = queue.encode_pairs(PriorityQueue.get_pairs(elements))
+            if elements:
+                commands.insert(0, ('zadd', queue.key_queue, dict(elements)))
+            return queue, commands, lambda results: results[-1]
+
+        if isinstance(queue, SmartQueue):
+            elements = queue.disambiguate_some(list(elements))
+            if to_first:
+                elements.reverse()
+            if not elements:
+                return queue, [], lambda results: []
+            command = (COMMAND_EVALSHA, ) + queue.get_push_script(
+                elements, to_first, force)
+
+            def parse(results):
+                if queue.dedup_filter is not None:
+                    queue.dedup_filter.add_some(
+                        [queue.get_dedup_value(e) for e in elements])
+                return [elements[i - 1] for i in results[0]]
+            return queue, [command, ], parse
+
+        if isinstance(queue, SimpleQueue):
+            elements = CodecTools.encode_some(queue.codec, list(elements))
+            if not elements:
+                return queue, [('llen', queue.key_queue), ], \
+                    lambda results: results[0]
+            push_to = 'lpush' if to_first else 'rpush'
+            if to_first:
+                elements.reverse()
+            if queue.track_stats:
+                command = (COMMAND_EVALSHA, SCRIPT_SIMPLE_PUSH_TRACKED,
+                           [queue.key_queue, queue.key_queue_enqueued,
+                            queue.key_queue_stats], [push_to, ] + elements)
+            else:
+                command = (push_to, queue.key_queue) + tuple(elements)
+            return queue, [command, ], lambda results: results[0]
+
+        elements = list(elements)
+        if not elements:
+            return queue, [], lambda results: []
+        command = (COMMAND_EVALSHA, ) + queue.get_push_script(elements)
+
+        def parse(results):
+            if queue.dedup_filter is not None:
+                queue.dedup_filter.add_some(command[3])
+            return CodecTools.decode_some(queue.codec, results[0])
+        return queue, [command, ], parse
+
+    def __get_pop_some_call(self, queue, num_elements, last=False):
+        '''
+        Get the command which pops a bunch of elements from a queue.
+
+        Arguments:
+        :queue -- a queue
+        :num_elements -- integer
+        :last -- boolean (default: false)
+
+        Returns: tuple, queue, commands and a function which parses its
+                 results
+        '''
+        if isinstance(queue, PriorityQueue):
+            command = ('zpopmax' if last else 'zpopmin', queue.key_queue,
+                       num_elements)
+            return (queue, [command, ],
+                    lambda results: CodecTools.decode_some(
+                        queue.codec, [element for element, score
+                                      in results[0]]))
+
+        if isinstance(queue, SimpleQueue) and queue.track_stats:
+            command = (COMMAND_EVALSHA, SCRIPT_SIMPLE_POP_TRACKED,
+                       [queue.key_queue, queue.key_queue_enqueued,
+                        queue.key_queue_stats],
+                       ['last' if last else 'first', num_elements])
+            return (queue, [command, ],
+                    lambda results: CodecTools.decode_some(
+                        queue.codec, results[0][::-1] if last
+                        else results[0]))
+
+        if isinstance(queue, SimpleQueue):
+            command = ('rpop' if last else 'lpop', queue.key_queue,
+                       num_elements)
+        elif queue.track_stats:
+            command = (COMMAND_EVALSHA, SCRIPT_BUCKET_POP_TRACKED,
+                       [queue.key_queue_bucket, queue.key_queue_bucket_stats],
+                       [num_elements, ])
+        else:
+            command = ('spop', queue.key_queue_bucket, num_elements)
+        return (queue, [command, ],
+                lambda results: CodecTools.decode_some(
+                    queue.codec, list(results[0] or [])))
+
+    @staticmethod
+    def execute(calls):
+        '''
+        Run the commands of each queue, with one pipeline per redis server.
+        Scripts are called by its SHA1 digest, calls which fail with a
+        NOSCRIPT error are run again once the script is loaded again.
+
+        Arguments:
+        :calls -- a list of tuples, queue, commands and a function which
+                  parses its results. A command is a tuple, a
+                  redis.client.Pipeline method name and its arguments, or,
+                  COMMAND_EVALSHA, a script name, keys and args.
+
+        Returns: list, the parsed results of each queue
+        '''
+        pipes = {}
+        for queue, commands, parse in calls:
+            if id(queue.redis) not in pipes:
+                pipes[id(queue.redis)] = (
+                    queue.redis, queue.redis.pipeline(transaction=False), [])
+            redis_conn, pipe, pipe_commands = pipes[id(queue.redis)]
+            for command in commands:
+                if command[0] == COMMAND_EVALSHA:
+                    name, keys, args = command[1:]
+                    pipe.evalsha(lua_scripts.load(redis_conn, name),
+                                 len(keys), *(keys + args))
+                else:
+                    getattr(pipe, command[0])(*command[1:])
+                pipe_commands.append(command)
+
+        results = dict(
+            (key, iter(QueueGroup.get_results(redis_conn, pipe,
+                                              pipe_commands)))
+            for key, (redis_conn, pipe, pipe_commands) in pipes.items())
+
+        return [parse([next(results[id(queue.redis)]) for c in commands])
+                for queue, commands, parse in calls]
+
+    @staticmethod
+    def get_results(redis_conn, pipe, commands):
+        '''
+        Execute a pipeline, running again the script calls which have failed
+        with a NOSCRIPT error.
+
+        Arguments:
+        :redis_conn -- redis.client.Redis
+        :pipe -- redis.client.Pipeline
+        :commands -- list of tuples, pipelined commands
+
+        Returns: list, the results of each command
+        '''
+        if not commands:
+            return []
+
+        results = pipe.execute(raise_on_error=False)
+        for i, (command, result) in enumerate(zip(commands, results)):
+            if isinstance(result, NoScriptError):
+                results[i] = lua_scripts.evalsha(redis_conn, *command[1:])
+            elif isinstance(result, Exception):
+                raise result
+            elif command[0] == COMMAND_EVALSHA:
+                lua_scripts.add_hits()
+        return results
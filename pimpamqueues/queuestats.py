@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+KEY_STATS_PUSHED = 'pushed'
+KEY_STATS_POPPED = 'popped'
+
+
+class QueueStats(object):
+    '''
+    Build the stats of queues which track them (track_stats). Counters are
+    read from a hash which push and pop paths update atomically, in the
+    same script or transaction that changes the queue, so reading them is
+    O(1) whatever the queue size is. Rates are computed against the
+    previous stats() call of the same queue object.
+    '''
+
+    @staticmethod
+    def get_stats(queue, num, counters, now):
+        '''
+        Build a queue's stats, and keep its counters sample for the rates of
+        its next stats() call.
+
+        Arguments:
+        :queue -- the queue
+        :num -- integer, number of queued elements
+        :counters -- list, pushed and popped counters (or none)
+        :now -- float, the redis server time
+
+        Returns: dict
+        '''
+        stats = {'num': num}
+        if not queue.track_stats:
+            return stats
+
+        num_pushed, num_popped = [int(c or 0) for c in counters]
+        stats.update({
+            'num_pushed': num_pushed,
+            'num_popped': num_popped,
+            'push_rate': None,
+            'pop_rate': None,
+        })
+
+        sample = getattr(queue, 'stats_sample', None)
+        if sample is not None and now > sample[0]:
+            seconds = now - sample[0]
+            stats['push_rate'] = (num_pushed - sample[1]) / seconds
+            stats['pop_rate'] = (num_popped - sample[2]) / seconds
+        queue.stats_sample = (now, num_pushed, num_popped)
+        return stats
+
+    @staticmethod
+    def get_time(redis_time):
+        '''
+        Get the redis server time in seconds.
+
+        Arguments:
+        :redis_time -- tuple, seconds and microseconds (TIME reply)
+
+        Returns: float
+        '''
+        return redis_time[0] + redis_time[1] / 1000000.0
+
+    @staticmethod
+    def get_age(enqueued_run, now):
+        '''
+        Get how long ago the head element of a list queue was pushed.
+
+        Arguments:
+        :enqueued_run -- bytes or none, 'milliseconds:count'
+        :now -- float, the redis server time
+
+        Returns: float, seconds, or, none, if queue is empty or its head was
+                 not pushed by a tracked push
+        '''
+        if not enqueued_run:
+            return None
+        if not isinstance(enqueued_run, str):
+            enqueued_run = enqueued_run.decode('utf-8')
+        enqueued_at = int(enqueued_run.split(':')[0]) / 1000.0
+        return max(now - enqueued_at, 0.0)
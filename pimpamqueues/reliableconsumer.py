@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from pimpamqueues import NUM_BLOCK_SIZE
+
+from pimpamqueues import Tools
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_RELIABLE_LEASE
+from pimpamqueues.luascripts import SCRIPT_RELIABLE_NACK
+from pimpamqueues.luascripts import SCRIPT_RELIABLE_REAP
+from pimpamqueues.luascripts import SCRIPT_RELIABLE_ACK
+from pimpamqueues.luascripts import SCRIPT_RELIABLE_TOUCH
+
+
+VISIBILITY_TIMEOUT = 300
+
+
+class ReliableConsumer(object):
+    '''
+    A reliable consumer of a SimpleQueue or a SmartQueue. Popped elements are
+    not removed for good, they are atomically moved to the consumer's
+    processing sorted set with a deadline (lease). Leased elements have to
+    be acknowledged once processed, otherwise, when its deadline expires,
+    the reaper pushes them back to the queue.
+
+    Leases are kept by lease number and element, so a element which is
+    queued many times is leased as many times, and each ack or nack releases
+    one of its leases.
+
+    With a queue which tracks its stats, leases are counted as pops, and
+    elements pushed back (nack or reaper) as pushes.
+    '''
+
+    def __init__(self, queue, consumer_id,
+                 visibility_timeout=VISIBILITY_TIMEOUT):
+        '''
+        Create a ReliableConsumer object.
+
+        Arguments:
+        :queue -- SimpleQueue or SmartQueue
+        :consumer_id -- string, a unique name of the consumer
+        :visibility_timeout -- integer (default: VISIBILITY_TIMEOUT),
+                               seconds a leased element is kept before it is
+                               pushed back to the queue
+        '''
+        self.queue = queue
+        self.consumer_id = consumer_id
+        self.visibility_timeout = visibility_timeout
+
+        self.redis = queue.redis
+        self.codec = queue.codec
+
+        self.key_queue = queue.key_queue
+        self.key_queue_consumers = self.get_key_consumers()
+        self.key_queue_processing = self.get_key_processing(consumer_id)
+        self.key_queue_leases = self.get_key_leases(consumer_id)
+
+        self.keys_stats = []
+        if queue.track_stats:
+            self.keys_stats = [queue.key_queue_enqueued, queue.key_queue_stats]
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<ReliableConsumer: %s (%s)>' % (self.key_queue_processing,
+                                                self.num_leased())
+
+    def get_key_consumers(self):
+        '''
+        Get a key id of the set of consumers which have leased elements.
+
+        Returns: string
+        '''
+        return '%s:consumers' % (self.key_queue, )
+
+    def get_key_processing(self, consumer_id):
+        '''
+        Get a key id of the sorted set of a consumer's leased elements.
+
+        Arguments:
+        :consumer_id -- string
+
+        Returns: string
+        '''
+        return '%s:processing:%s' % (self.key_queue, consumer_id)
+
+    def get_key_leases(self, consumer_id):
+        '''
+        Get a key id of the hash of a consumer's number of leases by element.
+
+        Arguments:
+        :consumer_id -- string
+
+        Returns: string
+        '''
+        return '%s:leases' % (self.get_key_processing(consumer_id), )
+
+    def pop(self, last=False):
+        '''
+        Pop and lease a element from the queue.
+
+        If no element is poped, it returns None
+
+        Arguments:
+        :last -- boolean (default: false)
+
+        Returns: string, the leased element, or, none, if no element is popped
+        '''
+        leased_elements = self.pop_some(1, last)
+        return leased_elements[0] if leased_elements else None
+
+    def pop_some(self, num_elements, last=False, num_block_size=None):
+        '''
+        Pop and lease a bunch of elements from the queue, in one round trip.
+        Each block is leased atomically.
+
+        Arguments:
+        :num_elements -- integer, maximum number of elements to be popped
+        :last -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Returns: list of strings, the leased elements
+        '''
+        if num_elements < 1:
+            return []
+
+        block_slices = Tools.get_block_slices(
+            num_elements=num_elements,
+            num_block_size=num_block_size
+        )
+
+        deadline = time.time() + self.visibility_timeout
+        pop_from = 'RPOP' if last else 'LPOP'
+
+        keys = [self.key_queue, self.key_queue_processing,
+                self.key_queue_consumers, self.key_queue_leases] + \
+            self.keys_stats
+        args_some = [[min(s[1], num_elements) - s[0], deadline, pop_from,
+                      self.consumer_id] for s in block_slices]
+
+        leased_elements = []
+        for some_elements in lua_scripts.evalsha_some(
+                self.redis, SCRIPT_RELIABLE_LEASE, keys, args_some):
+            leased_elements.extend(some_elements)
+        return CodecTools.decode_some(self.codec, leased_elements)
+
+    def ack(self, element):
+        '''
+        Acknowledge a processed element, so its lease is released.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, true if element was leased, otherwise false
+        '''
+        return self.ack_some([element, ]) == 1
+
+    def ack_some(self, elements):
+        '''
+        Acknowledge a bunch of processed elements, one lease each.
+
+        Arguments:
+        :elements -- a collection of strings
+
+        Returns: integer, the number of released leases
+        '''
+        elements = CodecTools.encode_some(self.codec, list(elements))
+        if not elements:
+            return 0
+        return lua_scripts.evalsha(
+            self.redis, SCRIPT_RELIABLE_ACK,
+            [self.key_queue_processing, self.key_queue_leases], elements)
+
+    def nack(self, element):
+        '''
+        Release the lease of a element that could not be processed, pushing
+        it back to the first position of the queue.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, true if element was leased, otherwise false
+        '''
+        return self.nack_some([element, ]) == 1
+
+    def nack_some(self, elements):
+        '''
+        Release the leases of a bunch of elements that could not be
+        processed, pushing them back to the first positions of the queue.
+
+        Arguments:
+        :elements -- a collection of strings
+
+        Returns: integer, the number of elements pushed back to the queue
+        '''
+        elements = CodecTools.encode_some(self.codec, list(elements))
+        if not elements:
+            return 0
+        keys = [self.key_queue, self.key_queue_processing,
+                self.key_queue_leases] + self.keys_stats
+        return lua_scripts.evalsha(self.redis, SCRIPT_RELIABLE_NACK, keys,
+                                   elements)
+
+    def touch(self, element):
+        '''
+        Extend the (last) lease of a element for another visibility timeout.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean, true if element was leased, otherwise false
+        '''
+        deadline = time.time() + self.visibility_timeout
+        element = CodecTools.encode(self.codec, element)
+        return bool(lua_scripts.evalsha(
+            self.redis, SCRIPT_RELIABLE_TOUCH,
+            [self.key_queue_processing, self.key_queue_leases],
+            [deadline, element]))
+
+    def num_leased(self):
+        '''
+        Get the number of elements leased by the consumer.
+
+        Returns: integer
+        '''
+        return self.redis.zcard(self.key_queue_processing)
+
+    def leased_elements(self):
+        '''
+        Get the elements leased by the consumer, the sooner to expire first.
+
+        Returns: list
+        '''
+        return CodecTools.decode_some(self.codec, [
+            member.split(b':' if isinstance(member, bytes) else ':', 1)[1]
+            for member in self.redis.zrange(self.key_queue_processing, 0, -1)
+        ])
+
+    def reap(self, num_elements=None):
+        '''
+        Push expired leases of every consumer of the queue back to the first
+        positions of the queue. At most num_elements per consumer are pushed
+        back on each call, so each call has a bounded cost.
+
+        Arguments:
+        :num_elements -- integer (default: none), by default NUM_BLOCK_SIZE
+
+        Returns: integer, the number of elements pushed back to the queue
+        '''
+        if num_elements is None:
+            num_elements = NUM_BLOCK_SIZE
+
+        now = time.time()
+
+        num_reaped = 0
+        for consumer_id in self.redis.smembers(self.key_queue_consumers):
+            if not isinstance(consumer_id, str):
+                consumer_id = consumer_id.decode('utf-8')
+            keys = [self.key_queue, self.get_key_processing(consumer_id),
+                    self.get_key_leases(consumer_id)] + self.keys_stats
+            num_reaped += lua_scripts.evalsha(self.redis,
+                                              SCRIPT_RELIABLE_REAP, keys,
+                                              [now, num_elements])
+        return num_reaped
+
+    def delete(self):
+        '''
+        Delete the consumer's leases, leased elements are not pushed back.
+
+        Returns: boolean, true if consumer had leases, otherwise false
+        '''
+        pipe = self.redis.pipeline()
+        pipe.delete(self.key_queue_processing, self.key_queue_leases)
+        pipe.srem(self.key_queue_consumers, self.consumer_id)
+        return True if pipe.execute()[0] else False
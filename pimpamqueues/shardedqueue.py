@@ -0,0 +1,608 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+import random
+import zlib
+
+from pimpamqueues import QUEUE_COLLECTION_OF_ELEMENTS
+
+from pimpamqueues import Tools
+
+from pimpamqueues.connections import connections
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.queuegroup import QueueGroup
+from pimpamqueues.queuegroup import COMMAND_EVALSHA
+from pimpamqueues.exceptions import PimPamQueuesError
+from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
+from pimpamqueues.exceptions import PimPamQueuesDisambiguatorInvalidError
+
+
+ROUTING_HASH = 'hash'
+ROUTING_ROUND_ROBIN = 'round_robin'
+
+
+class ShardedSimpleQueue(object):
+    '''
+    A lightweight queue. Sharded Simple Queue. One logical queue spread over
+    N shard queues, optionally stored on different redis servers. Producers
+    are routed to a shard by hash or round robin, consumers pop from its
+    shard first and steal from the other shards when it is empty.
+
+    Pushes are sent in one pipeline per redis server, the blocks of every
+    shard stored on it. A blocking pop only waits on the shards stored on
+    the shard affinity redis server, elements pushed into shards on other
+    servers meanwhile are not waited for, they are stolen by the next pop.
+
+    With a codec, every shard queue serializes its elements with it, and
+    elements are routed by the hash of its serialized value.
+    '''
+
+    QUEUE_CLASS = SimpleQueue
+
+    def __init__(self, id_args, num_shards,
+                 collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 keep_previous=True, redis_conns=None, routing=ROUTING_HASH,
+                 shard_affinity=None, cluster=None, codec=None):
+        '''
+        Create a ShardedSimpleQueue object.
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :num_shards -- integer, number of shard queues
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :keep_previous -- boolean (default: true),
+                          a flag to create a fresh queue or not
+        :redis_conns -- list of redis.client.Redis (default: None), shard i
+                        is stored on redis_conns[i % len(redis_conns)]. By
+                        default the shared connection of the connection
+                        registry is used.
+        :routing -- string (default: ROUTING_HASH), ROUTING_HASH or
+                    ROUTING_ROUND_ROBIN
+        :shard_affinity -- integer (default: none), the shard that is popped
+                           first, by default a random one
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, each shard has its own hash tag. By default,
+                    it is true for shards on a redis cluster client.
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings
+        '''
+        if routing not in (ROUTING_HASH, ROUTING_ROUND_ROBIN):
+            raise PimPamQueuesError('%s is not a valid routing' % (routing, ))
+
+        self.id_args = id_args
+        self.num_shards = num_shards
+        self.collection_of = collection_of
+        self.routing = routing
+        self.cluster = cluster
+        self.codec = codec
+
+        if redis_conns is None:
+            redis_conns = [connections.get(), ]
+        self.redis_conns = redis_conns
+
+        self.shards = [self.get_shard(i, cluster) for i in range(num_shards)]
+
+        if shard_affinity is None:
+            shard_affinity = random.randrange(num_shards)
+        self.shard_affinity = shard_affinity % num_shards
+
+        self.round_robin = itertools.cycle(range(num_shards))
+
+        if keep_previous is False:
+            self.delete()
+
+    def __str__(self):
+        '''
+        Return a string representation of the class.
+
+        Returns: string
+        '''
+        return '<%s: %s x %s (%s)>' % (self.__class__.__name__,
+                                       '.'.join(self.id_args),
+                                       self.num_shards, self.num())
+
+    def get_shard(self, shard_index, cluster=None):
+        '''
+        Get a shard queue.
+
+        Arguments:
+        :shard_index -- integer
+        :cluster -- boolean (default: none), by default it depends on the
+                    shard's redis connection
+
+        Returns: SimpleQueue
+        '''
+        return self.QUEUE_CLASS(
+            id_args=self.id_args + ['shard%s' % (shard_index, )],
+            collection_of=self.collection_of,
+            redis_conn=self.redis_conns[shard_index % len(self.redis_conns)],
+            cluster=cluster,
+            **self.get_shard_options()
+        )
+
+    def get_shard_options(self):
+        '''
+        Get the options which are given to every shard queue.
+
+        Returns: dict
+        '''
+        return {'codec': self.codec}
+
+    def get_shard_index(self, element):
+        '''
+        Get the shard index where a element is pushed.
+
+        Arguments:
+        :element -- object
+
+        Returns: integer
+        '''
+        if self.routing == ROUTING_ROUND_ROBIN:
+            return next(self.round_robin)
+        value = self.get_routing_value(element)
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            value = value.encode('utf-8')
+        return (zlib.crc32(value) & 0xffffffff) % self.num_shards
+
+    def get_routing_value(self, element):
+        '''
+        Get the value which is hashed to route a element, the (serialized)
+        element.
+
+        Arguments:
+        :element -- object
+
+        Returns: string
+        '''
+        return CodecTools.encode(self.codec, element)
+
+    def get_shards_by_affinity(self):
+        '''
+        Get the shards in the order they are popped, the shard affinity first.
+
+        Returns: list of SimpleQueue
+        '''
+        i = self.shard_affinity
+        return self.shards[i:] + self.shards[:i]
+
+    def push(self, element, to_first=False):
+        '''
+        Push a element into its shard queue.
+
+        Arguments:
+        :element -- string
+        :to_first -- boolean (default: False)
+
+        Raise:
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: long, the number of queued elements
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+        return self.push_some([element, ], to_first)
+
+    def push_some(self, elements, to_first=False, num_block_size=None):
+        '''
+        Push a bunch of elements into their shard queues, in one pipeline per
+        redis server. The number of queued elements is taken from the push
+        replies, shards without new elements are counted in the same
+        pipeline.
+
+        Arguments:
+        :elements -- a collection of strings
+        :to_first -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Raise:
+        :PimPamQueuesError(), if elements can not be pushed
+
+        Returns: long, the number of queued elements
+        '''
+        try:
+            return sum(QueueGroup.execute([
+                self.__get_push_some_call(shard, some_elements, to_first,
+                                          num_block_size)
+                for shard, some_elements in zip(
+                    self.shards, self.get_shard_elements(elements))
+            ]))
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def pop(self, last=False, block=False, timeout=0):
+        '''
+        Pop a element, from the shard affinity queue or, if it is empty,
+        stealing it from another shard queue.
+
+        If block is true and all shards are empty, it waits until a element
+        is pushed into a shard stored on the shard affinity redis server (on
+        redis cluster, into the shard affinity queue) or the timeout expires.
+        Elements pushed into shards on other redis servers do not wake it
+        up, they are stolen by the next pop.
+
+        Arguments:
+        :last -- boolean (default: false)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0)
+
+        Returns: string, the popped element, or, none, if no element is popped
+        '''
+        for shard in self.get_shards_by_affinity():
+            element = shard.pop(last=last)
+            if element is not None:
+                return element
+
+        if not block:
+            return None
+
+        redis_conn = self.shards[self.shard_affinity].redis
+        shards = [shard for shard in self.get_shards_by_affinity()
+                  if shard.redis is redis_conn]
+        if shards[0].cluster:
+            shards = shards[:1]
+        popped = SimpleQueue.pop_from(shards, last, timeout)
+        return popped[1] if popped else None
+
+    def pop_some(self, num_elements, last=False, num_block_size=None):
+        '''
+        Pop a bunch of elements, from the shard affinity queue first and
+        stealing the remaining ones from the other shard queues.
+
+        Arguments:
+        :num_elements -- integer, maximum number of elements to be popped
+        :last -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Returns: list of strings, the popped elements
+        '''
+        popped_elements = []
+        for shard in self.get_shards_by_affinity():
+            num_remaining = num_elements - len(popped_elements)
+            if num_remaining < 1:
+                break
+            popped_elements.extend(shard.pop_some(num_remaining, last,
+                                                  num_block_size))
+        return popped_elements
+
+    def num(self):
+        '''
+        Get the number of elements that are queued in all shards, with one
+        pipeline per redis server.
+
+        Returns: integer, the number of elements that are queued
+        '''
+        return sum(self.num_shard_elements())
+
+    def num_shard_elements(self):
+        '''
+        Get the number of elements that are queued in each shard, with one
+        pipeline per redis server.
+
+        Returns: list of integers
+        '''
+        pipes = {}
+        for shard in self.shards:
+            if id(shard.redis) not in pipes:
+                pipes[id(shard.redis)] = shard.redis.pipeline(
+                    transaction=False)
+            pipes[id(shard.redis)].llen(shard.key_queue)
+
+        results = dict((key, iter(pipe.execute()))
+                       for key, pipe in pipes.items())
+        return [next(results[id(shard.redis)]) for shard in self.shards]
+
+    def is_empty(self):
+        '''
+        Check if all shards are empty.
+
+        Returns: boolean, true if queue is empty, otherwise false
+        '''
+        return self.num() == 0
+
+    def is_not_empty(self):
+        '''
+        Check if any shard is not empty.
+
+        Returns: boolean, true if queue is not empty, otherwise false
+        '''
+        return not self.is_empty()
+
+    def elements(self):
+        '''
+        Get all queued elements, shard by shard.
+
+        Returns: list
+        '''
+        elements = []
+        for shard in self.shards:
+            elements.extend(shard.elements())
+        return elements
+
+    def delete(self):
+        '''
+        Delete all shard queues.
+
+        Returns: boolean, true if any shard has been deleted, otherwise false
+        '''
+        return any([shard.delete() for shard in self.shards])
+
+    def route(self, elements):
+        '''
+        Group elements by the shard where they are pushed, keeping its order.
+
+        Arguments:
+        :elements -- a collection of strings
+
+        Returns: list of tuples, (shard queue, list of elements), only
+                 shards with elements
+        '''
+        return [(shard, some_elements) for shard, some_elements in zip(
+            self.shards, self.get_shard_elements(elements)) if some_elements]
+
+    def get_shard_elements(self, elements):
+        '''
+        Group elements by the shard where they are pushed, keeping its order.
+
+        Arguments:
+        :elements -- a collection of strings
+
+        Returns: list of lists of strings, the elements of each shard
+        '''
+        shard_elements = [[] for shard in self.shards]
+        for element in elements:
+            shard_elements[self.get_shard_index(element)].append(element)
+        return shard_elements
+
+    def __get_push_some_call(self, shard, elements, to_first=False,
+                             num_block_size=None):
+        '''
+        Get the commands which push a bunch of elements into a shard queue,
+        block by block, for QueueGroup.execute(). A shard without elements
+        is only counted.
+
+        Arguments:
+        :shard -- SimpleQueue
+        :elements -- a list of strings
+        :to_first -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Returns: tuple, shard queue, commands and a function which parses
+                 its results, the number of elements queued in the shard
+        '''
+        elements = CodecTools.encode_some(self.codec, elements)
+        if not elements:
+            return (shard, [('llen', shard.key_queue), ],
+                    lambda results: results[0])
+
+        if to_first:
+            elements.reverse()
+        push_to = 'lpush' if to_first else 'rpush'
+        commands = [(push_to, shard.key_queue) + tuple(elements[s[0]:s[1]])
+                    for s in Tools.get_block_slices(len(elements),
+                                                    num_block_size)]
+        return shard, commands, lambda results: results[-1]
+
+
+class ShardedSmartQueue(ShardedSimpleQueue):
+    '''
+    A lightweight queue. Sharded Smart Queue. Elements are always routed by
+    the hash of its disambiguated value, so a element can only be in one
+    shard bucket and uniqueness holds across shards. With a dedup_key
+    function, elements are routed by its dedup key instead.
+
+    Shard queues share the disambiguator (its cache and executor too), and
+    elements are disambiguated once, before they are routed. Pushes are sent
+    in one pipeline per redis server, as QueueGroup does, so shard dedup
+    filters, queued caches and two_phase pushes are not used.
+    '''
+
+    QUEUE_CLASS = SmartQueue
+
+    def __init__(self, id_args, num_shards,
+                 collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
+                 keep_previous=True, redis_conns=None, disambiguator=None,
+                 shard_affinity=None, cluster=None, codec=None,
+                 dedup_key=None, executor=None, cache_size=None):
+        '''
+        Create a ShardedSmartQueue object.
+
+        Arguments:
+        :id_args -- list, list's values will be used to name the queue
+        :num_shards -- integer, number of shard queues
+        :collection_of -- string (default: QUEUE_COLLECTION_OF_ELEMENTS),
+                          a type descriptor of queued elements
+        :keep_previous -- boolean (default: true),
+                          a flag to create a fresh queue or not
+        :redis_conns -- list of redis.client.Redis (default: None), shard i
+                        is stored on redis_conns[i % len(redis_conns)]
+        :disambiguator -- class (default: none), a class with a disambiguate
+                          static method which receives a string as an argument
+                          and return a string.
+        :shard_affinity -- integer (default: none), the shard that is popped
+                           first, by default a random one
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, each shard has its own hash tag. By default,
+                    it is true for shards on a redis cluster client.
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings
+        :dedup_key -- callable (default: none), a function which receives a
+                      (disambiguated) element and returns the string which
+                      makes it unique, by default the (serialized) element
+        :executor -- concurrent.futures.Executor (default: none), a thread or
+                     process pool which disambiguates elements, as
+                     SmartQueue
+        :cache_size -- integer (default: none), maximum number of
+                       disambiguated elements cached, as SmartQueue
+
+        Raise:
+        :PimPamQueuesDisambiguatorInvalidError(), if disambiguator argument
+                                                  is invalid
+        :PimPamQueuesError(), if dedup_key is not callable
+        '''
+        if disambiguator and not disambiguator.__dict__.get('disambiguate'):
+            raise PimPamQueuesDisambiguatorInvalidError()
+
+        self.disambiguator = disambiguator
+        self.dedup_key = dedup_key
+        self.executor = executor
+        self.cache_size = cache_size
+
+        super(ShardedSmartQueue, self).__init__(
+            id_args=id_args,
+            num_shards=num_shards,
+            collection_of=collection_of,
+            keep_previous=keep_previous,
+            redis_conns=redis_conns,
+            routing=ROUTING_HASH,
+            shard_affinity=shard_affinity,
+            cluster=cluster,
+            codec=codec
+        )
+
+    def get_shard_options(self):
+        '''
+        Get the options which are given to every shard queue.
+
+        Returns: dict
+        '''
+        options = super(ShardedSmartQueue, self).get_shard_options()
+        options.update({
+            'disambiguator': self.disambiguator,
+            'dedup_key': self.dedup_key,
+            'executor': self.executor,
+            'cache_size': self.cache_size,
+        })
+        return options
+
+    def get_routing_value(self, element):
+        '''
+        Get the value which is hashed to route a (disambiguated) element, the
+        value which makes it unique on its shard bucket.
+
+        Arguments:
+        :element -- object
+
+        Returns: string
+        '''
+        return self.shards[0].get_dedup_value(element)
+
+    def push(self, element, to_first=False, force=False):
+        '''
+        Push a element into its shard queue.
+
+        Arguments:
+        :element -- string
+        :to_first -- boolean (default: False)
+        :force -- boolean (default: False)
+
+        Raise:
+        :PimPamQueuesElementWithoutValueError, if element has not a value
+
+        Returns: string, if element was queued returns the queued element,
+                 otherwise, empty string
+        '''
+        if element in ('', None):
+            raise PimPamQueuesElementWithoutValueError()
+        return element if self.push_some([element, ], to_first, force) else ''
+
+    def push_some(self, elements, to_first=False, force=False,
+                  num_block_size=None):
+        '''
+        Push a bunch of elements into their shard queues, in one pipeline per
+        redis server.
+
+        Arguments:
+        :elements -- a collection of strings
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+        :num_block_size -- integer (default: none)
+
+        Raise:
+        :PimPamQueuesError(), if elements can not be pushed
+
+        Returns: list of strings, a list with queued elements, grouped by
+                 shard
+        '''
+        try:
+            elements = self.disambiguate_some(list(elements))
+
+            queued_elements = []
+            for some_elements in QueueGroup.execute([
+                    self.__get_push_some_call(shard, some_elements, to_first,
+                                              force, num_block_size)
+                    for shard, some_elements in self.route(elements)]):
+                queued_elements.extend(some_elements)
+            return queued_elements
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
+
+    def disambiguate(self, element):
+        '''
+        Treats a element, with the shards' disambiguator cache.
+
+        Arguments:
+        :element -- string
+
+        Returns: string
+        '''
+        return self.shards[0].disambiguate(element)
+
+    def disambiguate_some(self, elements):
+        '''
+        Treats a list of elements, with the shards' disambiguator cache and
+        executor.
+
+        Arguments:
+        :elements -- elements
+
+        Returns: list of strings
+        '''
+        return self.shards[0].disambiguate_some(elements)
+
+    def is_element(self, element):
+        '''
+        Checks if a element has been queued, on its shard bucket.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean
+        '''
+        element = self.disambiguate(element)
+        shard = self.shards[self.get_shard_index(element)]
+        return bool(shard.is_element(element))
+
+    def __get_push_some_call(self, shard, elements, to_first=False,
+                             force=False, num_block_size=None):
+        '''
+        Get the push script calls which push a bunch of disambiguated
+        elements into a shard queue, block by block, for
+        QueueGroup.execute().
+
+        Arguments:
+        :shard -- SmartQueue
+        :elements -- a list of strings
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+        :num_block_size -- integer (default: none)
+
+        Returns: tuple, shard queue, commands and a function which parses
+                 its results, the queued elements
+        '''
+        if to_first:
+            elements.reverse()
+        blocks = [elements[s[0]:s[1]]
+                  for s in Tools.get_block_slices(len(elements),
+                                                  num_block_size)]
+        commands = [(COMMAND_EVALSHA, ) + shard.get_push_script(
+            some_elements, to_first, force) for some_elements in blocks]
+
+        def parse(results):
+            return [some_elements[i - 1]
+                    for some_elements, indices in zip(blocks, results)
+                    for i in indices]
+        return shard, commands, parse
@@ -1,11 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import redis
-
 from pimpamqueues import QUEUE_COLLECTION_OF_ELEMENTS
+from pimpamqueues import NUM_BLOCK_SIZE
 
 from pimpamqueues import Tools
+from pimpamqueues.cluster import ClusterTools
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.connections import connections
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_PUSH_TRACKED
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_POP_TRACKED
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_TRACK_POP
+from pimpamqueues.luascripts import SCRIPT_SIMPLE_REMOVE_TRACKED
+from pimpamqueues.queuestats import QueueStats
+from pimpamqueues.queuestats import KEY_STATS_PUSHED
+from pimpamqueues.queuestats import KEY_STATS_POPPED
+from pimpamqueues.instrumentation import instrumented
+from pimpamqueues.instrumentation import Instrumentation
+from pimpamqueues.instrumentation import OPERATION_PUSH
+from pimpamqueues.instrumentation import OPERATION_PUSH_SOME
+from pimpamqueues.instrumentation import OPERATION_POP
+from pimpamqueues.instrumentation import OPERATION_POP_SOME
+from pimpamqueues.instrumentation import COUNTER_BLOCKS
+from pimpamqueues.instrumentation import COUNTER_BYTES_SENT
 from pimpamqueues.exceptions import PimPamQueuesError
 from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
 
@@ -18,7 +36,8 @@ class SimpleQueue(object):
     QUEUE_TYPE_NAME = 'simple'
 
     def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
-                 keep_previous=True, redis_conn=None):
+                 keep_previous=True, redis_conn=None, cluster=None,
+                 codec=None, observer=None, track_stats=False):
         '''
         Create a SimpleQueue object.
 
@@ -28,18 +47,37 @@ class SimpleQueue(object):
                           a type descriptor of queued elements
         :keep_previous -- boolean (default: true),
                           a flag to create a fresh queue or not
-        :redis_conn -- redis.client.Redis (default: None), a redis
-                       connection will be created using the default
-                       redis.client.Redis connection params.
+        :redis_conn -- redis.client.Redis (default: None), by default the
+                       shared connection of the connection registry is
+                       used. It can be a redis.cluster.RedisCluster too.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings
+        :observer -- pimpamqueues.instrumentation.Observer (default: none),
+                     an observer of queue operations
+        :track_stats -- boolean (default: false), a flag to keep pushed and
+                        popped counters and enqueue times, for stats()
         '''
         self.id_args = id_args
         self.collection_of = collection_of
+        self.codec = codec
+        self.observer = observer
+        self.track_stats = track_stats
 
         if redis_conn is None:
-            redis_conn = redis.Redis()
+            redis_conn = connections.get()
         self.redis = redis_conn
 
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+
         self.key_queue = self.get_key_queue()
+        self.key_queue_stats = self.get_key_stats()
+        self.key_queue_enqueued = self.get_key_enqueued()
 
         if keep_previous is False:
             self.delete()
@@ -52,17 +90,66 @@ class SimpleQueue(object):
         '''
         return '<SimpleQueue: %s (%s)>' % (self.key_queue, self.num())
 
-    def get_key_queue(self):
+    def get_key_queue(self, cluster=None):
         '''
         Get a key id that will be used to store/retrieve data from
         the redis server.
 
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
         Returns: string
         '''
-        return 'queue:%s:type:%s:of:%s' % ('.'.join(self.id_args),
+        if cluster is None:
+            cluster = self.cluster
+        return 'queue:%s:type:%s:of:%s' % (Tools.get_key_ids(self.id_args,
+                                                             cluster),
                                            SimpleQueue.QUEUE_TYPE_NAME,
                                            self.collection_of)
 
+    def get_key_stats(self, cluster=None):
+        '''
+        Get a key id of the hash which keeps the queue's pushed and popped
+        counters.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        return '%s:stats' % (self.get_key_queue(cluster), )
+
+    def get_key_enqueued(self, cluster=None):
+        '''
+        Get a key id of the list which keeps when queued elements were
+        pushed, as 'milliseconds:count' runs in the same order than the
+        queue.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        return '%s:enqueued' % (self.get_key_queue(cluster), )
+
+    def migrate_keys(self, source_redis_conn=None):
+        '''
+        Move a queue stored with the key names used without the cluster flag
+        to the queue's key names. On the same (non cluster) redis server keys
+        are renamed, otherwise elements are copied block by block, from
+        source_redis_conn if it is given (source keys are kept) or from the
+        queue's redis connection (source keys are deleted).
+
+        Returns: integer, the number of migrated keys
+        '''
+        key_pairs = [(self.get_key_queue(cluster=False), self.key_queue)]
+        return ClusterTools.migrate_keys(key_pairs, self.redis,
+                                         source_redis_conn)
+
+    @instrumented(OPERATION_PUSH)
     def push(self, element, to_first=False):
         '''
         Push a element into the queue. Element can be pushed to the first or
@@ -81,21 +168,34 @@ class SimpleQueue(object):
             raise PimPamQueuesElementWithoutValueError()
         return self.push_some([element, ], to_first)
 
-    def push_some(self, elements, to_first=False, num_block_size=None):
+    @instrumented(OPERATION_PUSH_SOME)
+    def push_some(self, elements, to_first=False, num_block_size=None,
+                  stream=False):
         '''
         Push a bunch of elements into the queue. Elements can be pushed to the
         first or last position (by default are pushed to the last position).
 
+        On stream mode, elements are pulled from any iterable (even an
+        unbounded one) num_block_size at a time and each block is sent as
+        soon as it is filled, so memory is bounded by the block size. Pushed
+        to the first position, each block keeps its order but later blocks
+        end up ahead of earlier ones.
+
         Arguments:
         :elements -- a collection of strings
         :to_first -- boolean (default: false)
         :num_block_size -- integer (default: none)
+        :stream -- boolean (default: false)
 
         Returns: long, the number of queued elements
         '''
         try:
 
-            elements = list(elements)
+            if stream:
+                return self.__push_some_stream(elements, to_first,
+                                               num_block_size)
+
+            elements = CodecTools.encode_some(self.codec, list(elements))
 
             if to_first:
                 elements.reverse()
@@ -105,6 +205,19 @@ class SimpleQueue(object):
                 num_block_size=num_block_size
             )
 
+            if self.observer is not None:
+                self.observer.count(self, COUNTER_BLOCKS, len(block_slices))
+                self.observer.count(self, COUNTER_BYTES_SENT,
+                                    Instrumentation.get_num_bytes(elements))
+
+            if self.track_stats:
+                return lua_scripts.evalsha_some(
+                    self.redis, SCRIPT_SIMPLE_PUSH_TRACKED,
+                    [self.key_queue, self.key_queue_enqueued,
+                     self.key_queue_stats],
+                    [['lpush' if to_first else 'rpush'] + elements[s[0]:s[1]]
+                     for s in block_slices]).pop()
+
             pipe = self.redis.pipeline()
             for s in block_slices:
                 some_elements = elements[s[0]:s[1]]
@@ -115,23 +228,121 @@ class SimpleQueue(object):
             return pipe.execute().pop()
 
         except Exception as e:
-            raise PimPamQueuesError(e.message)
+            raise PimPamQueuesError(str(e))
 
-    def pop(self, last=False):
+    @instrumented(OPERATION_POP)
+    def pop(self, last=False, block=False, timeout=0):
         '''
         Pop a element from the queue. Element can be popped from the begining
         or the ending of the queue (by default pops from the begining).
 
+        If block is true and the queue is empty, it waits (BLPOP/BRPOP) until
+        a element is pushed or the timeout expires.
+
         If no element is poped, it returns None
 
         Arguments:
         :last -- boolean (default: false)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element when
+                    block is true, 0 waits forever
 
         Returns: string, the popped element, or, none, if no element is popped
         '''
+        if block:
+            popped = SimpleQueue.pop_from([self, ], last, timeout)
+            return popped[1] if popped else None
+        if self.track_stats:
+            popped_elements = self.__pop_some_tracked(1, last)
+            return CodecTools.decode(
+                self.codec, popped_elements[0] if popped_elements else None)
+        if last:
+            return CodecTools.decode(self.codec,
+                                     self.redis.rpop(self.key_queue))
+        return CodecTools.decode(self.codec, self.redis.lpop(self.key_queue))
+
+    @instrumented(OPERATION_POP_SOME)
+    def pop_some(self, num_elements, last=False, num_block_size=None,
+                 block=False, timeout=0):
+        '''
+        Pop a bunch of elements from the queue in one atomic round trip.
+        Elements can be popped from the begining or the ending of the queue
+        (by default pops from the begining).
+
+        Elements are returned in the same order that successive pop() calls
+        would return them.
+
+        If block is true and the queue is empty, it waits until a element is
+        pushed or the timeout expires, then pops up to num_elements.
+
+        Arguments:
+        :num_elements -- integer, maximum number of elements to be popped
+        :last -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+        :block -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element when
+                    block is true, 0 waits forever
+
+        Returns: list of strings, the popped elements
+        '''
+        if num_elements < 1:
+            return []
+
+        if self.track_stats:
+            popped_elements = self.__pop_some_tracked(num_elements, last)
+        else:
+            popped_elements = self.__pop_some(num_elements, last,
+                                              num_block_size)
+
+        if popped_elements or not block:
+            return CodecTools.decode_some(self.codec, popped_elements)
+
+        element = self.pop(last=last, block=True, timeout=timeout)
+        if element is None:
+            return []
+        return [element, ] + self.pop_some(num_elements - 1, last,
+                                           num_block_size)
+
+    @staticmethod
+    def pop_from(queues, last=False, timeout=0):
+        '''
+        Pop a element from the first non empty queue of a bunch of queues,
+        waiting (BLPOP/BRPOP) until a element is pushed to any of them or the
+        timeout expires. Queues are checked in the given order and they have
+        to share the same redis server.
+
+        Arguments:
+        :queues -- list of SimpleQueue or SmartQueue objects
+        :last -- boolean (default: false)
+        :timeout -- integer (default: 0), seconds to wait for a element,
+                    0 waits forever
+
+        Returns: tuple, the queue and the popped element, or, none, if no
+                 element is popped
+        '''
+        queues_by_key = dict((queue.key_queue, queue) for queue in queues)
+        keys = [queue.key_queue for queue in queues]
+
+        redis_conn = queues[0].redis
         if last:
-            return self.redis.rpop(self.key_queue)
-        return self.redis.lpop(self.key_queue)
+            popped = redis_conn.brpop(keys, timeout=timeout)
+        else:
+            popped = redis_conn.blpop(keys, timeout=timeout)
+
+        if popped is None:
+            return None
+
+        key = popped[0]
+        if not isinstance(key, str):
+            key = key.decode('utf-8')
+        queue = queues_by_key[key]
+        if queue.track_stats:
+            lua_scripts.evalsha(
+                redis_conn, SCRIPT_SIMPLE_TRACK_POP,
+                [queue.key_queue, queue.key_queue_enqueued,
+                 queue.key_queue_stats],
+                ['last' if last else 'first', 1])
+        return queue, CodecTools.decode(queue.codec, popped[1])
 
     def num(self):
         '''
@@ -160,7 +371,8 @@ class SimpleQueue(object):
     def elements(self, queue_from=0, queue_to=-1):
         '''
         Get some (or even all) queued elements, by the order that they are
-        queued. By default it returns all queued elements.
+        queued. By default it returns all queued elements, big queues are
+        better read with iter_elements().
 
         Note
         ====
@@ -172,7 +384,38 @@ class SimpleQueue(object):
 
         Returns: list
         '''
-        return self.redis.lrange(self.key_queue, queue_from, queue_to)
+        return CodecTools.decode_some(
+            self.codec,
+            self.redis.lrange(self.key_queue, queue_from, queue_to))
+
+    def iter_elements(self, batch=NUM_BLOCK_SIZE, prefetch=False):
+        '''
+        Iterate queued elements, by the order that they are queued, reading
+        batch elements per round trip (paged LRANGE), so big queues are read
+        without blocking the redis server nor holding them in memory.
+
+        Pages are read by position, so elements popped or pushed to the
+        first position while iterating shift the next pages, and some
+        elements may be skipped or repeated.
+
+        Note
+        ====
+        Elements are not popped.
+
+        Arguments:
+        :batch -- integer (default: NUM_BLOCK_SIZE), elements per page
+        :prefetch -- boolean (default: false), a flag to read the next page
+                     while the current one is consumed
+
+        Returns: generator
+        '''
+        def get_page(position):
+            page = self.redis.lrange(self.key_queue, position,
+                                     position + batch - 1)
+            next_position = position + batch if len(page) == batch else None
+            return next_position, CodecTools.decode_some(self.codec, page)
+
+        return Tools.iter_pages(get_page, 0, prefetch)
 
     def first_elements(self, num_elements=10):
         '''
@@ -193,14 +436,50 @@ class SimpleQueue(object):
 
     def remove(self, element):
         '''
-        Remove a element from the queue.
+        Remove a element (every occurrence of it) from the queue. With
+        track_stats, enqueue times of removed elements are removed too, and
+        they are not counted as popped.
 
         Arguments:
         :element -- string
 
         Returns: boolean, return true if element was removed, otherwise false
         '''
-        return True if self.redis.lrem(self.key_queue, element) else False
+        element = CodecTools.encode(self.codec, element)
+        if self.track_stats:
+            return True if lua_scripts.evalsha(
+                self.redis, SCRIPT_SIMPLE_REMOVE_TRACKED,
+                [self.key_queue, self.key_queue_enqueued],
+                [element, ]) else False
+        return True if self.redis.lrem(self.key_queue, 0, element) else False
+
+    def stats(self):
+        '''
+        Get the queue stats in one round trip, without reading its elements.
+        With track_stats, they include the pushed and popped counters, its
+        rates since the previous stats() call (none on the first call) and
+        the age of the head element.
+
+        QueueGroup pushes and pops, DelayedQueue promotions and
+        ReliableConsumer leases (pops) and pushed back elements (pushes) are
+        tracked too.
+
+        Returns: dict, num, and, with track_stats, num_pushed, num_popped,
+                 push_rate and pop_rate (elements per second), and head_age
+                 (seconds, or none if queue is empty)
+        '''
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.llen(self.key_queue)
+        pipe.hmget(self.key_queue_stats, KEY_STATS_PUSHED, KEY_STATS_POPPED)
+        pipe.lindex(self.key_queue_enqueued, 0)
+        pipe.time()
+        num, counters, enqueued_run, redis_time = pipe.execute()
+
+        now = QueueStats.get_time(redis_time)
+        stats = QueueStats.get_stats(self, num, counters, now)
+        if self.track_stats:
+            stats['head_age'] = QueueStats.get_age(enqueued_run, now)
+        return stats
 
     def delete(self):
         '''
@@ -208,4 +487,98 @@ class SimpleQueue(object):
 
         Returns: boolean, true if queue has been deleted, otherwise false
         '''
-        return True if self.redis.delete(self.key_queue) else False
+        return True if self.redis.delete(self.key_queue,
+                                         self.key_queue_stats,
+                                         self.key_queue_enqueued) else False
+
+    def __pop_some(self, num_elements, last=False, num_block_size=None):
+        '''
+        Pop a bunch of elements from the queue in one transaction.
+
+        Arguments:
+        :num_elements -- integer
+        :last -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Returns: list of strings, the popped (serialized) elements
+        '''
+        block_slices = Tools.get_block_slices(
+            num_elements=num_elements,
+            num_block_size=num_block_size
+        )
+
+        pipe = self.redis.pipeline(transaction=True)
+        for s in block_slices:
+            num_block_elements = min(s[1], num_elements) - s[0]
+            if last:
+                pipe.lrange(self.key_queue, -num_block_elements, -1)
+                pipe.ltrim(self.key_queue, 0, -num_block_elements - 1)
+            else:
+                pipe.lrange(self.key_queue, 0, num_block_elements - 1)
+                pipe.ltrim(self.key_queue, num_block_elements, -1)
+
+        popped_elements = []
+        for some_elements in pipe.execute()[::2]:
+            if last:
+                some_elements.reverse()
+            popped_elements.extend(some_elements)
+        return popped_elements
+
+    def __pop_some_tracked(self, num_elements, last=False):
+        '''
+        Pop a bunch of elements from the queue, updating its stats, with one
+        script call.
+
+        Arguments:
+        :num_elements -- integer
+        :last -- boolean (default: false)
+
+        Returns: list of strings, the popped (serialized) elements
+        '''
+        popped_elements = lua_scripts.evalsha(
+            self.redis, SCRIPT_SIMPLE_POP_TRACKED,
+            [self.key_queue, self.key_queue_enqueued, self.key_queue_stats],
+            ['last' if last else 'first', num_elements])
+        if last:
+            popped_elements.reverse()
+        return popped_elements
+
+    def __push_some_stream(self, elements, to_first=False,
+                           num_block_size=None):
+        '''
+        Push a iterable of elements into the queue, block by block.
+
+        Arguments:
+        :elements -- an iterable of strings
+        :to_first -- boolean (default: false)
+        :num_block_size -- integer (default: none)
+
+        Returns: long, the number of queued elements
+        '''
+        num_queued_elements = None
+        for some_elements in Tools.get_blocks(elements, num_block_size):
+            some_elements = CodecTools.encode_some(self.codec, some_elements)
+            if self.observer is not None:
+                self.observer.count(self, COUNTER_BLOCKS, 1)
+                self.observer.count(
+                    self, COUNTER_BYTES_SENT,
+                    Instrumentation.get_num_bytes(some_elements))
+            if self.track_stats:
+                if to_first:
+                    some_elements.reverse()
+                num_queued_elements = lua_scripts.evalsha(
+                    self.redis, SCRIPT_SIMPLE_PUSH_TRACKED,
+                    [self.key_queue, self.key_queue_enqueued,
+                     self.key_queue_stats],
+                    ['lpush' if to_first else 'rpush'] + some_elements)
+            elif to_first:
+                some_elements.reverse()
+                num_queued_elements = self.redis.lpush(self.key_queue,
+                                                       *some_elements)
+            else:
+                num_queued_elements = self.redis.rpush(self.key_queue,
+                                                       *some_elements)
+
+        if num_queued_elements is None:
+            return self.num()
+        return num_queued_elements
@@ -1,17 +1,56 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import redis
+import hashlib
+import time
 
 from pimpamqueues import QUEUE_COLLECTION_OF_ELEMENTS
+from pimpamqueues import NUM_BLOCK_SIZE
+from pimpamqueues import NUM_PIPELINE_DEPTH
+from pimpamqueues import NUM_DISAMBIGUATE_CHUNK_SIZE
 
 from pimpamqueues import Tools
+from pimpamqueues.cluster import ClusterTools
+from pimpamqueues.codecs import CodecTools
+from pimpamqueues.connections import connections
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.instrumentation import instrumented
+from pimpamqueues.instrumentation import Instrumentation
+from pimpamqueues.instrumentation import OPERATION_PUSH
+from pimpamqueues.instrumentation import OPERATION_PUSH_SOME
+from pimpamqueues.instrumentation import COUNTER_BLOCKS
+from pimpamqueues.instrumentation import COUNTER_BYTES_SENT
+from pimpamqueues.instrumentation import COUNTER_DUPLICATES
+from pimpamqueues.lrucache import LRUCache
+from pimpamqueues.lrucache import MISSING
+from pimpamqueues.lrucache import disambiguator_caches
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH_FORCE
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH_FINGERPRINT
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH_FINGERPRINT_FORCE
+from pimpamqueues.luascripts import SCRIPT_SMART_CHECK_FINGERPRINTS
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH_WINDOW
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH_WINDOW_FORCE
+from pimpamqueues.luascripts import SCRIPT_SMART_EXPIRE_WINDOW
+from pimpamqueues.queuestats import QueueStats
+from pimpamqueues.queuestats import KEY_STATS_PUSHED
+from pimpamqueues.queuestats import KEY_STATS_POPPED
 from pimpamqueues.simplequeue import SimpleQueue
 from pimpamqueues.bucketqueue import BucketQueue
 
 from pimpamqueues.exceptions import PimPamQueuesError
 from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
 from pimpamqueues.exceptions import PimPamQueuesDisambiguatorInvalidError
+from pimpamqueues.exceptions import PimPamQueuesFingerprintInvalidError
+
+
+FINGERPRINT_BITS = (64, 128)
+
+NUM_WINDOW_EXPIRE_SIZE = 100
+
+REPLY_ELEMENTS = 'elements'
+REPLY_COUNT = 'count'
+REPLY_INDICES = 'indices'
 
 
 class SmartQueue(SimpleQueue, BucketQueue):
@@ -19,12 +58,50 @@ class SmartQueue(SimpleQueue, BucketQueue):
     A lightweight queue. Smart Queue. It only adds a unique element once
     for the queue's time living. If a element wants to be added more than once,
     queue will not be altered.
+
+    With fingerprint_bits, the bucket stores a fixed width digest of each
+    element (the first 64 or 128 bits of its MD5) instead of the element
+    itself, while the queue keeps the real elements. Bucket memory no longer
+    grows with element length, at the cost of collisions: a new element
+    whose fingerprint is already in the bucket is taken as a duplicate and
+    it is not pushed. For n elements, the probability of any collision is
+    about n^2 / 2^(bits + 1), around 3e-4 for 100 million elements with 64
+    bits and negligible with 128 bits.
+
+    With dedup_window, elements are unique over a sliding time window
+    instead of for the queue's time living. The bucket is a sorted set of
+    elements scored by the time they were last queued, a element is queued
+    again once it has not been queued for dedup_window seconds. Every push
+    removes up to NUM_WINDOW_EXPIRE_SIZE expired elements from the bucket,
+    so expiry never blocks the server, and the whole bucket expires if
+    nothing is queued for a window.
+
+    With a codec, elements are serialized before they are pushed, and a
+    dedup_key function can give the value which makes a element unique,
+    so uniqueness does not depend on how elements are serialized. The
+    bucket stores dedup keys (or its fingerprints) instead of elements.
+
+    A disambiguator can treat a whole block at once with a disambiguate_some
+    static method. With an executor (a thread pool, or a process pool for
+    CPU bound disambiguators), blocks are disambiguated in chunks of
+    NUM_DISAMBIGUATE_CHUNK_SIZE elements in parallel, and the next pipeline
+    of blocks is disambiguated while the current one is being pushed.
+
+    With a cache_size, disambiguated elements are cached by raw element, in
+    a LRU cache shared by every queue with the same disambiguator, so only
+    cache misses reach the disambiguator (and the executor). With a
+    queued_cache_size, the dedup values known to be in the bucket are kept
+    in a local LRU cache, and they are discarded without asking redis.
     '''
 
     QUEUE_TYPE_NAME = 'smart'
 
     def __init__(self, id_args, collection_of=QUEUE_COLLECTION_OF_ELEMENTS,
-                 keep_previous=True, redis_conn=None, disambiguator=None):
+                 keep_previous=True, redis_conn=None, disambiguator=None,
+                 cluster=None, dedup_filter=None, fingerprint_bits=None,
+                 dedup_window=None, two_phase=False, codec=None,
+                 dedup_key=None, executor=None, cache_size=None,
+                 queued_cache_size=None, observer=None, track_stats=False):
         '''
         Create a SmartQueue object.
 
@@ -34,17 +111,66 @@ class SmartQueue(SimpleQueue, BucketQueue):
                           a type descriptor of queued elements
         :keep_previous -- boolean (default: true),
                           a flag to create a fresh queue or not
-        :redis_conn -- redis.client.Redis (default: None), a redis
-                       connection will be created using the default
-                       redis.client.Redis connection params.
+        :redis_conn -- redis.client.Redis (default: None), by default the
+                       shared connection of the connection registry is
+                       used. It can be a redis.cluster.RedisCluster too.
         :disambiguator -- class (default: none), a class with a disambiguate
                           static method which receives a string as an argument
                           and return a string. It is used to discriminate
                           those elements that do not need to be pushed again.
+        :cluster -- boolean (default: none), a flag to name keys with a
+                    hash tag, so all queue keys are stored in the same redis
+                    cluster hash slot. By default, it is true if redis_conn
+                    is a redis cluster client.
+        :dedup_filter -- pimpamqueues.bloomfilter.BloomFilter (default: none),
+                         a local filter of pushed elements, which counts
+                         lookups and the false positives that the push
+                         scripts queue
+        :fingerprint_bits -- integer (default: none), 64 or 128, a flag to
+                             store element fingerprints in the bucket instead
+                             of elements
+        :dedup_window -- number (default: none), seconds a queued element is
+                         not queued again, by default elements are queued
+                         only once. It can not be used with a dedup_filter.
+        :two_phase -- boolean (default: false), a flag to check element
+                      fingerprints against the bucket first, and send only
+                      new elements to the push scripts. It needs
+                      fingerprint_bits and it can not be used with a
+                      dedup_window.
+        :codec -- pimpamqueues.codecs.Codec (default: none), a codec which
+                  serializes elements, by default elements are strings
+        :dedup_key -- callable (default: none), a function which receives a
+                      (disambiguated) element and returns the string which
+                      makes it unique, by default the (serialized) element
+        :executor -- concurrent.futures.Executor (default: none), a thread or
+                     process pool which disambiguates elements, by default
+                     elements are disambiguated on the calling thread. A
+                     process pool needs a disambiguator which can be pickled
+                     (a module level class).
+        :cache_size -- integer (default: none), maximum number of
+                       disambiguated elements cached, by raw element, for
+                       every queue with the same disambiguator. The first
+                       queue of a disambiguator sets the cache size.
+        :queued_cache_size -- integer (default: none), maximum number of
+                              dedup values known to be queued which are
+                              cached locally. It can not be used with a
+                              dedup_window, and elements removed from the
+                              bucket by other processes are not forgotten.
+        :observer -- pimpamqueues.instrumentation.Observer (default: none),
+                     an observer of queue operations
+        :track_stats -- boolean (default: false), a flag to keep pushed and
+                        popped counters and enqueue times, for stats()
 
         Raise:
         :PimPamQueuesDisambiguatorInvalidError(), if disambiguator argument
                                                   is invalid
+        :PimPamQueuesFingerprintInvalidError(), if fingerprint_bits argument
+                                                is invalid
+        :PimPamQueuesError(), if dedup_window and dedup_filter are given, or
+                              two_phase is given without fingerprint_bits or
+                              with a dedup_window, or dedup_key is not
+                              callable, or queued_cache_size is given with
+                              a dedup_window
         '''
         self.id_args = id_args
         self.collection_of = collection_of
@@ -52,16 +178,64 @@ class SmartQueue(SimpleQueue, BucketQueue):
         if disambiguator and not disambiguator.__dict__.get('disambiguate'):
             raise PimPamQueuesDisambiguatorInvalidError()
 
+        if fingerprint_bits not in (None, ) + FINGERPRINT_BITS:
+            raise PimPamQueuesFingerprintInvalidError()
+
+        if dedup_window and dedup_filter is not None:
+            raise PimPamQueuesError('A dedup_filter can not forget elements, '
+                                    'it can not be used with a dedup_window')
+
+        if two_phase and (not fingerprint_bits or dedup_window):
+            raise PimPamQueuesError('A two_phase push needs fingerprint_bits '
+                                    'and no dedup_window')
+
+        if dedup_key is not None and not callable(dedup_key):
+            raise PimPamQueuesError('A dedup_key has to be callable')
+
+        if queued_cache_size and dedup_window:
+            raise PimPamQueuesError('A queued_cache_size can not forget '
+                                    'elements, it can not be used with a '
+                                    'dedup_window')
+
         self.disambiguator = disambiguator
+        self.dedup_filter = dedup_filter
+        self.fingerprint_bits = fingerprint_bits
+        self.dedup_window = dedup_window
+        self.two_phase = two_phase
+        self.codec = codec
+        self.dedup_key = dedup_key
+        self.executor = executor
+        self.observer = observer
+        self.track_stats = track_stats
+
+        self.disambiguator_cache = None
+        if cache_size and disambiguator:
+            self.disambiguator_cache = disambiguator_caches.get(disambiguator,
+                                                                cache_size)
+        self.queued_cache = None
+        if queued_cache_size:
+            self.queued_cache = LRUCache(queued_cache_size)
 
         if redis_conn is None:
-            redis_conn = redis.Redis()
+            redis_conn = connections.get()
         self.redis = redis_conn
 
+        if cluster is None:
+            cluster = ClusterTools.is_cluster(redis_conn)
+        self.cluster = cluster
+
         self.key_queue = self.get_key_queue()
         self.key_queue_bucket = self.get_key_bucket()
 
-        self.keys = [self.key_queue, self.key_queue_bucket, ]
+        self.key_queue_bucket_fingerprints = \
+            self.get_key_bucket_fingerprints()
+
+        self.key_queue_stats = self.get_key_stats()
+        self.key_queue_enqueued = self.get_key_enqueued()
+
+        self.keys = [self.key_queue, self.key_queue_bucket,
+                     self.key_queue_stats, self.key_queue_enqueued,
+                     self.key_queue_bucket_fingerprints, ]
 
         if keep_previous is False:
             self.delete()
@@ -74,6 +248,26 @@ class SmartQueue(SimpleQueue, BucketQueue):
         '''
         return '<SmartQueue: %s (%s)>' % (self.key_queue, self.num())
 
+    def migrate_keys(self, source_redis_conn=None):
+        '''
+        Move a queue stored with the key names used without the cluster flag
+        to the queue's key names. On the same (non cluster) redis server keys
+        are renamed, otherwise elements are copied block by block, from
+        source_redis_conn if it is given (source keys are kept) or from the
+        queue's redis connection (source keys are deleted).
+
+        Returns: integer, the number of migrated keys
+        '''
+        key_pairs = [
+            (self.get_key_queue(cluster=False), self.key_queue),
+            (self.get_key_bucket(cluster=False), self.key_queue_bucket),
+            (self.get_key_bucket_fingerprints(cluster=False),
+             self.key_queue_bucket_fingerprints),
+        ]
+        return ClusterTools.migrate_keys(key_pairs, self.redis,
+                                         source_redis_conn)
+
+    @instrumented(OPERATION_PUSH)
     def push(self, element, to_first=False, force=False):
         '''
         Push a element into the queue. Element can be pushed to the first or
@@ -101,47 +295,126 @@ class SmartQueue(SimpleQueue, BucketQueue):
         except Exception:
             raise PimPamQueuesError("%s was not pushed" % (element))
 
+    @instrumented(OPERATION_PUSH_SOME)
     def push_some(self, elements, to_first=False, force=False,
-                  num_block_size=None):
+                  num_block_size=None, stream=False, num_pipeline_depth=None,
+                  reply=REPLY_ELEMENTS):
         '''
         Push a bunch of elements into the queue. Elements can be pushed to the
         first or last position (by default are pushed to the last position).
+        Blocks are pipelined, num_pipeline_depth blocks per round trip, and
+        each block is pushed atomically.
+
+        On stream mode, elements are pulled from any iterable (even an
+        unbounded one) num_block_size at a time and each block is sent as
+        soon as it is filled, so memory is bounded by the block size (times
+        num_pipeline_depth, which is 1 by default on stream mode). Pushed to
+        the first position, each block keeps its order but later blocks end
+        up ahead of earlier ones.
+
+        Push scripts only reply the indices of queued elements, the reply is
+        built from them.
 
         Arguments:
         :elements -- a collection of strings
         :to_first -- boolean (default: false)
         :force -- boolean (default: False)
         :num_block_size -- integer (default: none)
+        :stream -- boolean (default: false)
+        :num_pipeline_depth -- integer (default: none), how many blocks are
+                               sent per round trip
+        :reply -- string (default: REPLY_ELEMENTS), REPLY_ELEMENTS,
+                  REPLY_COUNT or REPLY_INDICES
 
         Raise:
         :PimPamQueuesError(), if element can not be pushed
 
-        Returns: list of strings, a list with queued elements
+        Returns: list of strings, a list with queued elements, or, integer,
+                 the number of queued elements (REPLY_COUNT), or, list of
+                 integers, the indices of queued elements in elements
+                 (REPLY_INDICES)
         '''
         try:
 
-            elements = self.disambiguate_some(list(elements))
+            if stream:
+                return self.__get_reply(self.__iter_push_some(
+                    elements, to_first, force, num_block_size,
+                    num_pipeline_depth or 1), reply)
 
+            elements = list(elements)
+
+            positions = list(range(len(elements)))
             if to_first:
-                elements.reverse()
+                positions.reverse()
 
             block_slices = Tools.get_block_slices(
                 num_elements=len(elements),
                 num_block_size=num_block_size
             )
+            groups_positions = [
+                [positions[s[0]:s[1]] for s in some_slices]
+                for some_slices in Tools.get_blocks(
+                    block_slices, num_pipeline_depth or NUM_PIPELINE_DEPTH)
+            ]
+            groups = self.__iter_disambiguate_some(
+                [[elements[p] for p in some_positions]
+                 for some_positions in blocks_positions]
+                for blocks_positions in groups_positions
+            )
+
+            queued = []
+            for blocks_positions, some_blocks in zip(groups_positions, groups):
+                encoded_blocks = []
+                key_blocks = []
+                for some_elements in some_blocks:
+                    encoded_elements, dedup_keys = self.__encode_some(
+                        some_elements)
+                    encoded_blocks.append(encoded_elements)
+                    key_blocks.append(dedup_keys)
 
-            queued_elements = []
-            for s in block_slices:
-                some_elements = self.__push_some(
-                    elements=elements[s[0]:s[1]],
+                blocks_queued_indices = self.__push_some_blocks(
+                    blocks=encoded_blocks,
                     to_first=to_first,
-                    force=force
+                    force=force,
+                    key_blocks=key_blocks if self.dedup_key else None
                 )
-                queued_elements.extend(some_elements)
-            return queued_elements
+                for some_positions, some_elements, queued_indices in zip(
+                        blocks_positions, some_blocks, blocks_queued_indices):
+                    queued.extend((some_positions[i], some_elements[i])
+                                  for i in queued_indices)
+            return self.__get_reply(queued, reply)
 
         except Exception as e:
-            raise PimPamQueuesError(e.message)
+            raise PimPamQueuesError(str(e))
+
+    def iter_push_some(self, elements, to_first=False, force=False,
+                       num_block_size=None, num_pipeline_depth=1):
+        '''
+        Push a iterable of elements into the queue on stream mode, lazily.
+        Blocks are sent once the previous blocks' queued elements have been
+        consumed, with an executor the next blocks are disambiguated
+        meanwhile.
+
+        Arguments:
+        :elements -- an iterable of strings
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+        :num_block_size -- integer (default: none)
+        :num_pipeline_depth -- integer (default: 1), how many blocks are
+                               sent per round trip
+
+        Raise:
+        :PimPamQueuesError(), if element can not be pushed
+
+        Returns: generator of strings, queued elements
+        '''
+        try:
+            for position, element in self.__iter_push_some(
+                    elements, to_first, force, num_block_size,
+                    num_pipeline_depth):
+                yield element
+        except Exception as e:
+            raise PimPamQueuesError(str(e))
 
     def disambiguate(self, element):
         '''
@@ -152,6 +425,8 @@ class SmartQueue(SimpleQueue, BucketQueue):
 
         Returns: string
         '''
+        if self.disambiguator_cache is not None:
+            return self.disambiguate_some([element, ])[0]
         if self.__has_to_disambiguate():
             return self.disambiguator.disambiguate(element)
         return element
@@ -165,9 +440,243 @@ class SmartQueue(SimpleQueue, BucketQueue):
 
         Returns: list of strings
         '''
-        if self.__has_to_disambiguate():
-            return [self.disambiguate(element) for element in elements]
-        return elements
+        if not self.__has_to_disambiguate():
+            return elements
+        if self.executor is None and self.disambiguator_cache is None:
+            return Tools.disambiguate_some(self.disambiguator, elements)
+        return self.__get_disambiguated(
+            self.__submit_disambiguate_some(elements))
+
+    def is_element(self, element):
+        '''
+        Checks if a element is in the bucket, or, with a dedup_window, if it
+        has been queued within the window.
+
+        Arguments:
+        :element -- string
+
+        Returns: boolean
+        '''
+        if not self.dedup_window:
+            return super(SmartQueue, self).is_element(element)
+        score = self.redis.zscore(
+            self.key_queue_bucket,
+            self.get_bucket_element(self.get_dedup_value(element)))
+        return score is not None and score >= time.time() - self.dedup_window
+
+    def iter_bucket(self, batch=NUM_BLOCK_SIZE, prefetch=False):
+        '''
+        Iterate the bucket members with SSCAN (ZSCAN with a dedup_window),
+        about batch members per round trip. Members are what makes elements
+        unique, the (serialized) elements, its dedup keys or its
+        fingerprints, and they are returned as they are stored. With a
+        dedup_window, expired members which have not been removed yet are
+        returned too.
+
+        Members in the bucket during the whole iteration are returned at
+        least once, but a member may be returned more than once.
+
+        Arguments:
+        :batch -- integer (default: NUM_BLOCK_SIZE), SSCAN/ZSCAN count hint
+        :prefetch -- boolean (default: false), a flag to read the next page
+                     while the current one is consumed
+
+        Returns: generator of bytes
+        '''
+        def get_page(cursor):
+            if self.dedup_window:
+                cursor, page = self.redis.zscan(self.key_queue_bucket,
+                                                cursor, count=batch)
+                page = [member for member, score in page]
+            else:
+                cursor, page = self.redis.sscan(self.key_queue_bucket,
+                                                cursor, count=batch)
+            return (cursor or None), page
+
+        return Tools.iter_pages(get_page, 0, prefetch)
+
+    def expire_bucket(self, num_elements=None):
+        '''
+        Remove a batch of elements queued before the dedup_window from the
+        bucket. Pushes already remove expired elements, it is only needed to
+        shrink the bucket of a queue which is not being pushed.
+
+        Arguments:
+        :num_elements -- integer (default: none), by default
+                         NUM_WINDOW_EXPIRE_SIZE
+
+        Returns: integer, the number of removed elements
+        '''
+        if not self.dedup_window:
+            return 0
+        if num_elements is None:
+            num_elements = NUM_WINDOW_EXPIRE_SIZE
+        return lua_scripts.evalsha(self.redis, SCRIPT_SMART_EXPIRE_WINDOW,
+                                   [self.key_queue_bucket, ],
+                                   [time.time(), self.dedup_window,
+                                    num_elements])
+
+    def fingerprint(self, element):
+        '''
+        Get the fingerprint of a element, the first fingerprint_bits of its
+        MD5 digest. Values which are not strings (a dedup key may be a
+        number) are fingerprinted by its string representation.
+
+        Arguments:
+        :element -- string
+
+        Returns: bytes
+        '''
+        if not isinstance(element, (bytes, bytearray, memoryview)):
+            element = ('%s' % (element, )).encode('utf-8')
+        return hashlib.md5(element).digest()[:self.fingerprint_bits // 8]
+
+    def get_dedup_value(self, element):
+        '''
+        Get the value which makes a element unique, its dedup key if queue
+        has a dedup_key function, otherwise the (serialized) element.
+
+        Arguments:
+        :element -- object
+
+        Returns: string
+        '''
+        if self.dedup_key is not None:
+            return self.dedup_key(element)
+        return CodecTools.encode(self.codec, element)
+
+    def get_bucket_element(self, element):
+        '''
+        Get the value which represents a element (or its dedup key) in the
+        bucket, its fingerprint if the queue stores fingerprints.
+
+        Arguments:
+        :element -- string
+
+        Returns: string
+        '''
+        if self.fingerprint_bits:
+            return self.fingerprint(element)
+        return element
+
+    def get_key_bucket_fingerprints(self, cluster=None):
+        '''
+        Get a key id of the flag which marks a bucket converted into a
+        bucket of fingerprints, it keeps the fingerprint_bits.
+
+        Arguments:
+        :cluster -- boolean (default: none), by default the queue's cluster
+                    flag is used
+
+        Returns: string
+        '''
+        return '%s:fingerprints' % (self.get_key_bucket(cluster), )
+
+    def convert_bucket(self, num_block_size=None):
+        '''
+        Convert a bucket which stores elements into a bucket which stores
+        its fingerprints. Elements are read block by block (SSCAN) and its
+        fingerprints are added to a temporary key, which replaces the bucket
+        at the end. Pushes should be paused while the bucket is converted.
+
+        A converted bucket (even an empty one) is marked, so it is never
+        converted again: its fingerprints would be fingerprinted again.
+
+        Arguments:
+        :num_block_size -- integer (default: none)
+
+        Raise:
+        :PimPamQueuesFingerprintInvalidError(), if queue does not store
+                                                fingerprints
+        :PimPamQueuesError(), if the bucket has already been converted
+
+        Returns: integer, the number of converted elements
+        '''
+        if not self.fingerprint_bits:
+            raise PimPamQueuesFingerprintInvalidError()
+
+        if not self.redis.set(self.key_queue_bucket_fingerprints,
+                              self.fingerprint_bits, nx=True):
+            raise PimPamQueuesError('%s has already been converted' %
+                                    (self.key_queue_bucket, ))
+
+        if num_block_size is None:
+            num_block_size = NUM_BLOCK_SIZE
+
+        key_queue_bucket_converted = '%s:converted' % (self.key_queue_bucket, )
+
+        try:
+            self.redis.delete(key_queue_bucket_converted)
+
+            num_elements = 0
+            cursor = 0
+            while True:
+                cursor, elements = self.redis.sscan(self.key_queue_bucket,
+                                                    cursor,
+                                                    count=num_block_size)
+                if elements:
+                    self.redis.sadd(key_queue_bucket_converted,
+                                    *[self.fingerprint(e) for e in elements])
+                    num_elements += len(elements)
+                if int(cursor) == 0:
+                    break
+
+            if num_elements:
+                self.redis.rename(key_queue_bucket_converted,
+                                  self.key_queue_bucket)
+            return num_elements
+
+        except Exception:
+            self.redis.delete(self.key_queue_bucket_fingerprints)
+            raise
+
+    def get_push_script(self, elements, to_first=False, force=False):
+        '''
+        Get the Lua script call which pushes a block of elements, so it can
+        be pipelined along other commands (QueueGroup). Elements have to be
+        disambiguated, and they are pushed one by one, so pushed to the
+        first position they end up in reverse order. The script replies the
+        1-based indices of queued elements.
+
+        Arguments:
+        :elements -- a list of strings
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+
+        Returns: tuple, script name, keys and args
+        '''
+        push_to = 'lpush' if to_first is True else 'rpush'
+        encoded_elements, dedup_keys = self.__encode_some(elements)
+        return (self.__lua_push(force), self.__get_push_keys(),
+                self.__get_push_args(push_to, encoded_elements,
+                                     self.__get_members(encoded_elements,
+                                                        dedup_keys)))
+
+    def stats(self):
+        '''
+        Get the queue stats in one round trip, without reading its elements,
+        the SimpleQueue ones and the size of the bucket, the number of
+        elements which would not be queued again.
+
+        Returns: dict, SimpleQueue.stats() and num_bucket
+        '''
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.llen(self.key_queue)
+        if self.dedup_window:
+            pipe.zcard(self.key_queue_bucket)
+        else:
+            pipe.scard(self.key_queue_bucket)
+        pipe.hmget(self.key_queue_stats, KEY_STATS_PUSHED, KEY_STATS_POPPED)
+        pipe.lindex(self.key_queue_enqueued, 0)
+        pipe.time()
+        num, num_bucket, counters, enqueued_run, redis_time = pipe.execute()
+
+        now = QueueStats.get_time(redis_time)
+        stats = QueueStats.get_stats(self, num, counters, now)
+        stats['num_bucket'] = num_bucket
+        if self.track_stats:
+            stats['head_age'] = QueueStats.get_age(enqueued_run, now)
+        return stats
 
     def delete(self):
         '''
@@ -175,11 +684,26 @@ class SmartQueue(SimpleQueue, BucketQueue):
 
         Returns: boolean, true if queue has been deleted, otherwise false
         '''
+        if self.dedup_filter is not None:
+            self.dedup_filter.clear()
+        if self.queued_cache is not None:
+            self.queued_cache.clear()
         pipe = self.redis.pipeline()
         for key in self.keys:
             pipe.delete(key)
         return True if len(pipe.execute()) is len(self.keys) else False
 
+    def __get_push_keys(self):
+        '''
+        Get the keys of the Lua scripts which push elements into the queue.
+
+        Returns: list of strings
+        '''
+        keys = [self.key_queue_bucket, self.key_queue]
+        if self.track_stats:
+            keys.extend([self.key_queue_enqueued, self.key_queue_stats])
+        return keys
+
     def __has_to_disambiguate(self):
         '''
         Check if disambiguation code has to be triggered.
@@ -188,53 +712,357 @@ class SmartQueue(SimpleQueue, BucketQueue):
         '''
         return True if self.disambiguator else False
 
-    def __push_some(self, elements, to_first=False, force=False):
+    def __iter_push_some(self, elements, to_first=False, force=False,
+                         num_block_size=None, num_pipeline_depth=1):
         '''
-        Push some elements into the queue. Elements can be pushed to the
-        first or last position (by default are pushed to the last position).
+        Push a iterable of elements into the queue, block by block.
 
         Arguments:
-        :elements -- a collection of strings
+        :elements -- an iterable of strings
         :to_first -- boolean (default: false)
         :force -- boolean (default: False)
+        :num_block_size -- integer (default: none)
+        :num_pipeline_depth -- integer (default: 1)
+
+        Returns: generator of tuples, position in elements and queued element
+        '''
+        num_elements = 0
+        blocks = Tools.get_blocks(elements, num_block_size)
+        for some_blocks in self.__iter_disambiguate_some(
+                Tools.get_blocks(blocks, num_pipeline_depth)):
+            blocks_positions = []
+            encoded_blocks = []
+            key_blocks = []
+            for some_elements in some_blocks:
+                some_positions = list(range(num_elements,
+                                            num_elements + len(some_elements)))
+                num_elements += len(some_elements)
+                if to_first:
+                    some_elements.reverse()
+                    some_positions.reverse()
+                blocks_positions.append(some_positions)
+                encoded_elements, dedup_keys = self.__encode_some(
+                    some_elements)
+                encoded_blocks.append(encoded_elements)
+                key_blocks.append(dedup_keys)
+
+            blocks_queued_indices = self.__push_some_blocks(
+                blocks=encoded_blocks,
+                to_first=to_first,
+                force=force,
+                key_blocks=key_blocks if self.dedup_key else None
+            )
+            for some_elements, some_positions, queued_indices in zip(
+                    some_blocks, blocks_positions, blocks_queued_indices):
+                for i in queued_indices:
+                    yield some_positions[i], some_elements[i]
+
+    def __iter_disambiguate_some(self, groups):
+        '''
+        Disambiguate groups of blocks of elements, one group at a time. With
+        an executor, the next group is submitted before the current one is
+        returned, so it is disambiguated while the current one is pushed.
+
+        Arguments:
+        :groups -- an iterable of lists of lists of strings
+
+        Returns: generator of lists of lists of strings
+        '''
+        if self.executor is None:
+            for some_blocks in groups:
+                yield [self.disambiguate_some(some_elements)
+                       for some_elements in some_blocks]
+            return
+
+        pending = None
+        for some_blocks in groups:
+            submitted = [self.__submit_disambiguate_some(some_elements)
+                         for some_elements in some_blocks]
+            if pending is not None:
+                yield [self.__get_disambiguated(futures)
+                       for futures in pending]
+            pending = submitted
+        if pending is not None:
+            yield [self.__get_disambiguated(submitted)
+                   for submitted in pending]
 
-        Returns: list of strings, a list with queued elements
+    def __submit_disambiguate_some(self, elements):
         '''
+        Start disambiguating a list of elements. Cached elements are looked
+        up, and the rest is disambiguated, on the executor in chunks of
+        NUM_DISAMBIGUATE_CHUNK_SIZE elements if queue has one.
+
+        Arguments:
+        :elements -- a list of strings
+
+        Returns: tuple, cached values (or none), elements to be
+                 disambiguated and its chunks, lists or
+                 concurrent.futures.Future
+        '''
+        values = None
+        missing = elements
+        if self.disambiguator_cache is not None:
+            values = self.disambiguator_cache.get_some(elements)
+            missing = [element for element, value in zip(elements, values)
+                       if value is MISSING]
+
+        if not missing:
+            chunks = []
+        elif self.executor is None:
+            chunks = [Tools.disambiguate_some(self.disambiguator, missing)]
+        else:
+            chunks = [self.executor.submit(
+                          Tools.disambiguate_some, self.disambiguator,
+                          missing[i:i + NUM_DISAMBIGUATE_CHUNK_SIZE])
+                      for i in range(0, len(missing),
+                                     NUM_DISAMBIGUATE_CHUNK_SIZE)]
+        return values, missing, chunks
+
+    def __get_disambiguated(self, submitted):
+        '''
+        Wait for the disambiguated chunks of a list of elements, and merge
+        them with its cached values.
+
+        Arguments:
+        :submitted -- tuple, what __submit_disambiguate_some() returns
+
+        Returns: list of strings
+        '''
+        values, missing, chunks = submitted
+        disambiguated = []
+        for chunk in chunks:
+            disambiguated.extend(chunk if self.executor is None
+                                 else chunk.result())
+        if values is None:
+            return disambiguated
+
+        self.disambiguator_cache.set_some(missing, disambiguated)
+        disambiguated = iter(disambiguated)
+        return [next(disambiguated) if value is MISSING else value
+                for value in values]
+
+    def __get_reply(self, queued, reply=REPLY_ELEMENTS):
+        '''
+        Get the reply of a push.
+
+        Arguments:
+        :queued -- an iterable of tuples, position in pushed elements and
+                   queued element
+        :reply -- string (default: REPLY_ELEMENTS)
+
+        Returns: list of strings, integer or list of integers
+        '''
+        if reply == REPLY_COUNT:
+            return sum(1 for position, element in queued)
+        if reply == REPLY_INDICES:
+            return [position for position, element in queued]
+        return [element for position, element in queued]
+
+    def __push_some_blocks(self, blocks, to_first=False, force=False,
+                           key_blocks=None):
+        '''
+        Push some blocks of elements into the queue in one pipeline. Push
+        scripts reply the indices of queued elements, so elements are not
+        sent back.
+
+        Arguments:
+        :blocks -- a list of lists of strings, serialized elements
+        :to_first -- boolean (default: false)
+        :force -- boolean (default: False)
+        :key_blocks -- a list of lists of strings (default: none), dedup
+                       keys of each block, if queue has a dedup_key function
+
+        Returns: list of lists of integers, indices of queued elements of
+                 each block
+        '''
+        indices = [list(range(len(some_elements))) for some_elements in blocks]
+        num_elements = sum(len(some_elements) for some_elements in blocks)
+
+        if key_blocks is None:
+            key_blocks = [None for some_elements in blocks]
+        value_blocks = [b if k is None else k
+                        for b, k in zip(blocks, key_blocks)]
+        member_blocks = [self.__get_members(b, k)
+                         for b, k in zip(blocks, key_blocks)]
+
+        duplicates = set()
+        if not force:
+            if self.queued_cache is not None:
+                indices = [[i for i, value in enumerate(
+                                self.queued_cache.get_some(v))
+                            if value is MISSING]
+                           for v in value_blocks]
+            checked_indices = indices
+            duplicates = self.get_duplicates(
+                [[v[i] for i in some_indices]
+                 for v, some_indices in zip(value_blocks, indices)])
+            if self.two_phase and any(indices):
+                indices = self.__get_new_indices(member_blocks, indices)
+            if not any(indices):
+                self.__cache_queued(value_blocks, checked_indices)
+                if self.observer is not None:
+                    self.observer.count(self, COUNTER_DUPLICATES,
+                                        num_elements)
+                return [[] for some_elements in blocks]
+        else:
+            checked_indices = indices
+
         push_to = 'lpush' if to_first is True else 'rpush'
 
-        keys = [self.key_queue_bucket, self.key_queue, push_to]
-        return self.redis.eval(self.__lua_push(force), len(keys),
-                               *(keys + elements))
+        args_some = []
+        for i, some_indices in enumerate(indices):
+            args_some.append(self.__get_push_args(
+                push_to, [blocks[i][j] for j in some_indices],
+                [member_blocks[i][j] for j in some_indices]
+                if member_blocks[i] is not None else None))
+
+        keys = self.__get_push_keys()
+        if len(blocks) == 1:
+            blocks_queued_indices = [lua_scripts.evalsha(
+                self.redis, self.__lua_push(force), keys, args_some[0]), ]
+        else:
+            blocks_queued_indices = lua_scripts.evalsha_some(
+                self.redis, self.__lua_push(force), keys, args_some)
+
+        if self.dedup_filter is not None:
+            self.dedup_filter.add_false_positives(sum(
+                1 for v, some_indices, queued_indices
+                in zip(value_blocks, indices, blocks_queued_indices)
+                for j in queued_indices if v[some_indices[j - 1]]
+                in duplicates))
+            for some_values in value_blocks:
+                self.dedup_filter.add_some(some_values)
+
+        self.__cache_queued(value_blocks, checked_indices)
+
+        if self.observer is not None:
+            self.observer.count(self, COUNTER_BLOCKS, len(args_some))
+            self.observer.count(self, COUNTER_BYTES_SENT, sum(
+                Instrumentation.get_num_bytes(args) for args in args_some))
+            self.observer.count(self, COUNTER_DUPLICATES, num_elements - sum(
+                len(queued_indices) for queued_indices
+                in blocks_queued_indices))
+
+        return [[some_indices[j - 1] for j in queued_indices]
+                for some_indices, queued_indices
+                in zip(indices, blocks_queued_indices)]
+
+    def __cache_queued(self, value_blocks, indices):
+        '''
+        Add the values of elements which redis has queued or reported as
+        already in the bucket to the queued cache, if there is one.
+
+        Arguments:
+        :value_blocks -- a list of lists of strings, dedup values
+        :indices -- a list of lists of integers, indices of the elements
+                    checked by redis of each block
+        '''
+        if self.queued_cache is None:
+            return
+        for v, some_indices in zip(value_blocks, indices):
+            self.queued_cache.set_some([v[i] for i in some_indices],
+                                       [True for i in some_indices])
+
+    def __get_new_indices(self, fingerprints, indices):
+        '''
+        Check, in one pipeline, which element fingerprints are not in the
+        bucket, so only new elements are sent to the push scripts.
+
+        Arguments:
+        :fingerprints -- a list of lists of bytes, fingerprints of each block
+        :indices -- a list of lists of integers, indices of the elements to
+                    be checked of each block
+
+        Returns: list of lists of integers, indices of new elements of each
+                 block
+        '''
+        args_some = [[some_fingerprints[j] for j in some_indices]
+                     for some_fingerprints, some_indices
+                     in zip(fingerprints, indices)]
+        blocks_new_indices = lua_scripts.evalsha_some(
+            self.redis, SCRIPT_SMART_CHECK_FINGERPRINTS,
+            [self.key_queue_bucket, ], args_some)
+        return [[some_indices[j - 1] for j in new_indices]
+                for some_indices, new_indices
+                in zip(indices, blocks_new_indices)]
 
     def __lua_push(self, force=False):
+        '''
+        Get the name of the Lua script which pushes elements into the queue.
+
+        Arguments:
+        :force -- boolean (default: False)
+
+        Returns: string
+        '''
+        if self.dedup_window:
+            if force:
+                return SCRIPT_SMART_PUSH_WINDOW_FORCE
+            return SCRIPT_SMART_PUSH_WINDOW
+        if self.fingerprint_bits or self.dedup_key:
+            if force:
+                return SCRIPT_SMART_PUSH_FINGERPRINT_FORCE
+            return SCRIPT_SMART_PUSH_FINGERPRINT
         if force:
-            return """
-                local elements = {}
+            return SCRIPT_SMART_PUSH_FORCE
+        return SCRIPT_SMART_PUSH
 
-                for i=1, #ARGV do
-                  redis.call('SADD', KEYS[1], ARGV[i])
-                  table.insert(elements, ARGV[i])
-                end
+    def __get_push_args(self, push_to, elements, members=None):
+        '''
+        Get the arguments of the Lua script which pushes elements into the
+        queue, the push command followed by the elements, or, if the bucket
+        does not store elements (fingerprints or dedup keys), by pairs of
+        bucket member and element. With a dedup_window, the push command is
+        followed by the current time, the window, the expiry batch size and
+        the step between elements.
 
-                for i=1, #elements do
-                  redis.call(KEYS[3], KEYS[2], elements[i])
-                end
+        Arguments:
+        :push_to -- string, 'lpush' or 'rpush'
+        :elements -- a collection of strings, serialized elements
+        :members -- a list of strings (default: none), bucket members of
+                    elements, if the bucket does not store elements
 
-                return elements
-            """
+        Returns: list
+        '''
+        args = [push_to, ]
+        if self.dedup_window:
+            args.extend([time.time(), self.dedup_window,
+                         NUM_WINDOW_EXPIRE_SIZE,
+                         1 if members is None else 2])
+        if members is not None:
+            for member, element in zip(members, elements):
+                args.extend([member, element])
+            return args
+        return args + list(elements)
 
-        return """
-            local elements = {}
+    def __encode_some(self, elements):
+        '''
+        Serialize a bunch of (disambiguated) elements, and get its dedup
+        keys if queue has a dedup_key function.
 
-            for i=1, #ARGV do
-              if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
-                table.insert(elements, ARGV[i])
-              end
-            end
+        Arguments:
+        :elements -- a list of objects
 
-            for i=1, #elements do
-              redis.call(KEYS[3], KEYS[2], elements[i])
-            end
+        Returns: tuple, list of serialized elements and list of dedup keys
+                 (or none)
+        '''
+        dedup_keys = None
+        if self.dedup_key is not None:
+            dedup_keys = [self.dedup_key(element) for element in elements]
+        return CodecTools.encode_some(self.codec, elements), dedup_keys
 
-            return elements
-        """
+    def __get_members(self, elements, dedup_keys=None):
+        '''
+        Get the bucket members of a bunch of elements, its fingerprints or
+        its dedup keys, if the bucket does not store elements.
+
+        Arguments:
+        :elements -- a list of strings, serialized elements
+        :dedup_keys -- a list of strings (default: none)
+
+        Returns: list of strings, or, none, if the bucket stores elements
+        '''
+        if self.fingerprint_bits:
+            values = elements if dedup_keys is None else dedup_keys
+            return [self.fingerprint(value) for value in values]
+        return dedup_keys
@@ -53,6 +53,9 @@ setup(
     ],
     extras_require={
         'redis': ['redis', ],
+        'asyncio': ['redis>=4.2.0', ],
+        'msgpack': ['msgpack', ],
+        'lz4': ['lz4', ],
         'testing': ['pytest', ],
     },
     tests_require=[
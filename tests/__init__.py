@@ -16,3 +16,14 @@ redis_conn = redis.Redis(
     password=REDIS_PASSWORD,
     db=REDIS_DATABASE,
 )
+
+try:
+    import redis.asyncio
+    async_redis_conn = redis.asyncio.Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        password=REDIS_PASSWORD,
+        db=REDIS_DATABASE,
+    )
+except ImportError:
+    async_redis_conn = None
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import sys
+import weakref
+
+import pytest
+
+from tests import redis_conn
+from tests import async_redis_conn
+from pimpamqueues.codecs import JsonCodec
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.exceptions import PimPamQueuesError
+
+if sys.version_info < (3, 7):
+    pytest.skip('asyncio queues need Python 3.7+', allow_module_level=True)
+
+asyncio = pytest.importorskip('asyncio')
+asyncqueues = pytest.importorskip('pimpamqueues.asyncqueues')
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+
+ELEMENT_DICT_EGG = {'id': 1, 'name': 'egg'}
+ELEMENT_DICT_BACON = {'id': 2, 'name': 'bacon'}
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+    ELEMENT_42,
+    ELEMENT_SPAM,
+]
+
+loop = asyncio.new_event_loop()
+
+
+def run(coroutine):
+    return loop.run_until_complete(coroutine)
+
+
+class TestAsyncBatcher(object):
+
+    def test_get(self):
+        batcher = asyncqueues.AsyncBatcher.get(async_redis_conn)
+        assert asyncqueues.AsyncBatcher.get(async_redis_conn) is batcher
+
+    def test_collected(self):
+        conn = async_redis_conn.__class__()
+        batcher = weakref.ref(asyncqueues.AsyncBatcher.get(conn))
+        del conn
+        gc.collect()
+        assert batcher() is None
+
+    def test_tasks_released(self):
+        queue = asyncqueues.AsyncSimpleQueue(id_args=['test', 'testing'],
+                                             redis_conn=async_redis_conn)
+        assert run(queue.num()) == 0
+        run(asyncio.sleep(0))
+        assert queue.batcher.tasks == set()
+
+
+class TestAsyncSimpleQueue(object):
+
+    def setup(self):
+        self.queue = asyncqueues.AsyncSimpleQueue(
+            id_args=['test', 'testing'],
+            redis_conn=async_redis_conn
+        )
+
+    def test_empty(self):
+        assert run(self.queue.num()) == 0
+        assert run(self.queue.is_empty()) is True
+
+    def test_push_some(self):
+        assert run(self.queue.push_some(some_elements)) == len(some_elements)
+        assert run(self.queue.elements()) == some_elements
+
+    def test_pop(self):
+        run(self.queue.push_some(some_elements, num_block_size=2))
+        assert run(self.queue.pop()) == ELEMENT_EGG
+        assert run(self.queue.pop(last=True)) == ELEMENT_SPAM
+
+    def test_concurrent_callers(self):
+        tasks = [loop.create_task(self.queue.push(element))
+                 for element in some_elements]
+        run(asyncio.gather(*tasks))
+        assert run(self.queue.num()) == len(some_elements)
+
+    def test_same_queue_as_sync(self):
+        run(self.queue.push(ELEMENT_EGG))
+        queue = SimpleQueue(id_args=['test', 'testing'],
+                            redis_conn=redis_conn)
+        assert queue.pop() == ELEMENT_EGG
+
+    def test_track_stats(self):
+        queue = asyncqueues.AsyncSimpleQueue(id_args=['test', 'testing'],
+                                             redis_conn=async_redis_conn,
+                                             track_stats=True)
+        run(queue.push_some(some_elements, num_block_size=2))
+        assert run(queue.pop(last=True)) == ELEMENT_SPAM
+        queue_sync = SimpleQueue(id_args=['test', 'testing'],
+                                 redis_conn=redis_conn, track_stats=True)
+        stats = queue_sync.stats()
+        assert stats['num_pushed'] == 5
+        assert stats['num_popped'] == 1
+        assert stats['head_age'] >= 0
+        assert queue_sync.pop_some(4) == some_elements[0:4]
+        assert redis_conn.exists(queue_sync.key_queue_enqueued) == 0
+
+    def test_codec(self):
+        queue = asyncqueues.AsyncSimpleQueue(id_args=['test', 'testing'],
+                                             redis_conn=async_redis_conn,
+                                             codec=JsonCodec())
+        run(queue.push_some([ELEMENT_DICT_EGG, ELEMENT_DICT_BACON]))
+        assert run(queue.elements()) == [ELEMENT_DICT_EGG, ELEMENT_DICT_BACON]
+        assert run(queue.pop(last=True)) == ELEMENT_DICT_BACON
+        queue_sync = SimpleQueue(id_args=['test', 'testing'],
+                                 redis_conn=redis_conn, codec=JsonCodec())
+        assert queue_sync.pop() == ELEMENT_DICT_EGG
+        assert run(queue.pop()) is None
+
+    def test_delete(self):
+        queue = asyncqueues.AsyncSimpleQueue(id_args=['test', 'testing'],
+                                             redis_conn=async_redis_conn,
+                                             track_stats=True)
+        run(queue.push(ELEMENT_EGG))
+        run(queue.delete())
+        assert redis_conn.exists(queue.key_queue_stats,
+                                 queue.key_queue_enqueued) == 0
+
+    def teardown(self):
+        run(self.queue.delete())
+
+
+class TestAsyncBucketQueue(object):
+
+    def setup(self):
+        self.queue = asyncqueues.AsyncBucketQueue(
+            id_args=['test', 'testing'],
+            redis_conn=async_redis_conn
+        )
+
+    def test_push_some(self):
+        queued_elements = run(self.queue.push_some(some_elements))
+        assert len(queued_elements) == len(set(some_elements))
+        assert run(self.queue.push(ELEMENT_EGG)) == ''
+
+    def test_is_element(self):
+        run(self.queue.push(ELEMENT_EGG))
+        assert run(self.queue.is_element(ELEMENT_EGG)) is True
+        assert run(self.queue.is_element(ELEMENT_BACON)) is False
+
+    def test_pop(self):
+        run(self.queue.push(ELEMENT_EGG))
+        assert run(self.queue.pop()) == ELEMENT_EGG
+        assert run(self.queue.pop()) is None
+
+    def test_track_stats(self):
+        queue = asyncqueues.AsyncBucketQueue(id_args=['test', 'testing'],
+                                             redis_conn=async_redis_conn,
+                                             track_stats=True)
+        run(queue.push_some(some_elements))
+        assert run(queue.pop()) is not None
+        stats = BucketQueue(id_args=['test', 'testing'],
+                            redis_conn=redis_conn, track_stats=True).stats()
+        assert stats['num_pushed'] == 4
+        assert stats['num_popped'] == 1
+        run(queue.delete())
+        assert redis_conn.exists(queue.key_queue_bucket_stats) == 0
+
+    def test_codec(self):
+        queue = asyncqueues.AsyncBucketQueue(id_args=['test', 'testing'],
+                                             redis_conn=async_redis_conn,
+                                             codec=JsonCodec())
+        assert run(queue.push(ELEMENT_DICT_EGG)) == ELEMENT_DICT_EGG
+        assert run(queue.push(ELEMENT_DICT_EGG)) == ''
+        assert run(queue.is_element(ELEMENT_DICT_EGG)) is True
+        assert run(queue.elements()) == [ELEMENT_DICT_EGG, ]
+        assert run(queue.pop()) == ELEMENT_DICT_EGG
+
+    def teardown(self):
+        run(self.queue.delete())
+
+
+class TestAsyncSmartQueue(object):
+
+    def setup(self):
+        self.queue = asyncqueues.AsyncSmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=async_redis_conn
+        )
+
+    def test_push_some(self):
+        queued_elements = run(self.queue.push_some(some_elements))
+        assert queued_elements == some_elements[0:4]
+        assert run(self.queue.push(ELEMENT_SPAM)) == ''
+        assert run(self.queue.push(ELEMENT_SPAM, force=True)) == ELEMENT_SPAM
+
+    def test_same_queue_as_sync(self):
+        queue = SmartQueue(id_args=['test', 'testing'],
+                           redis_conn=redis_conn)
+        queue.push(ELEMENT_EGG)
+        assert run(self.queue.push(ELEMENT_EGG)) == ''
+        assert run(self.queue.pop()) == ELEMENT_EGG
+
+    def test_track_stats(self):
+        queue = asyncqueues.AsyncSmartQueue(id_args=['test', 'testing'],
+                                            redis_conn=async_redis_conn,
+                                            track_stats=True)
+        run(queue.push_some(some_elements))
+        assert run(queue.pop()) == ELEMENT_EGG
+        stats = SmartQueue(id_args=['test', 'testing'],
+                           redis_conn=redis_conn, track_stats=True).stats()
+        assert stats['num_pushed'] == 4
+        assert stats['num_popped'] == 1
+        run(queue.delete())
+        assert redis_conn.exists(queue.key_queue_stats,
+                                 queue.key_queue_enqueued) == 0
+
+    def test_codec(self):
+        queue = asyncqueues.AsyncSmartQueue(id_args=['test', 'testing'],
+                                            redis_conn=async_redis_conn,
+                                            codec=JsonCodec())
+        assert run(queue.push_some([ELEMENT_DICT_EGG, ELEMENT_DICT_EGG])) \
+            == [ELEMENT_DICT_EGG, ]
+        assert run(queue.is_element(ELEMENT_DICT_EGG)) is True
+        queue_sync = SmartQueue(id_args=['test', 'testing'],
+                                redis_conn=redis_conn, codec=JsonCodec())
+        assert queue_sync.push(ELEMENT_DICT_EGG) == ''
+        assert run(queue.pop()) == ELEMENT_DICT_EGG
+
+    def test_unsupported_modes(self):
+        with pytest.raises(PimPamQueuesError):
+            asyncqueues.AsyncSmartQueue(id_args=['test', 'testing'],
+                                        redis_conn=async_redis_conn,
+                                        fingerprint_bits=64)
+        with pytest.raises(PimPamQueuesError):
+            asyncqueues.AsyncSmartQueue(id_args=['test', 'testing'],
+                                        redis_conn=async_redis_conn,
+                                        dedup_key=len)
+
+    def teardown(self):
+        run(self.queue.delete())
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.bloomfilter import BloomFilter
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+ELEMENT_UNEXISTENT_ELEMENT = b'utopia'
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+    ELEMENT_42,
+]
+
+
+class TestBloomFilter(object):
+
+    def setup(self):
+        self.bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+
+    def test_size(self):
+        assert self.bloom_filter.num_bits == 9586
+        assert self.bloom_filter.num_hashes == 7
+        assert len(self.bloom_filter.bits) == 1199
+
+    def test_add(self):
+        assert self.bloom_filter.add(ELEMENT_EGG) is True
+        assert self.bloom_filter.add(ELEMENT_EGG) is False
+        assert self.bloom_filter.add_some(some_elements) == 3
+        assert self.bloom_filter.num_elements == 4
+
+    def test_is_element(self):
+        self.bloom_filter.add_some(some_elements)
+        assert self.bloom_filter.is_element(ELEMENT_SPAM) is True
+        assert ELEMENT_UNEXISTENT_ELEMENT not in self.bloom_filter
+        assert u'spam' in self.bloom_filter
+
+    def test_clear(self):
+        self.bloom_filter.add_some(some_elements)
+        self.bloom_filter.clear()
+        assert ELEMENT_EGG not in self.bloom_filter
+        assert self.bloom_filter.get_error_rate() == 0.0
+
+    def test_error_rate(self):
+        elements = ['element%s' % i for i in range(1000)]
+        self.bloom_filter.add_some(elements)
+        assert 0.005 < self.bloom_filter.get_error_rate() < 0.015
+        num_false_positives = sum(
+            1 for i in range(10000) if 'other%s' % i in self.bloom_filter)
+        assert num_false_positives < 200
+
+    def test_stats(self):
+        self.bloom_filter.add_some(some_elements)
+        ELEMENT_EGG in self.bloom_filter
+        ELEMENT_UNEXISTENT_ELEMENT in self.bloom_filter
+        self.bloom_filter.add_false_positives(1)
+        stats = self.bloom_filter.stats()
+        assert stats['num_hits'] == 1
+        assert stats['num_misses'] == 1
+        assert stats['false_positive_rate'] == 0.5
+        self.bloom_filter.reset_stats()
+        assert self.bloom_filter.stats()['num_hits'] == 0
+
+
+class TestDedupFilter(object):
+
+    def setup(self):
+        self.queue = SmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn,
+            dedup_filter=BloomFilter(capacity=1000)
+        )
+        self.queue_bucket = BucketQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn,
+            dedup_filter=BloomFilter(capacity=1000)
+        )
+
+    def test_smartqueue_push_some(self):
+        assert self.queue.push_some(some_elements) == some_elements
+        assert self.queue.push_some(some_elements) == []
+        assert self.queue.push(ELEMENT_EGG) == ''
+        assert self.queue.dedup_filter.stats()['num_hits'] == 5
+        assert self.queue.dedup_filter.stats()['num_false_positives'] == 0
+        assert self.queue.num() == 4
+
+    def test_smartqueue_push_force(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.push(ELEMENT_EGG, force=True) == ELEMENT_EGG
+        assert self.queue.num() == 5
+
+    def test_smartqueue_bucket_is_authoritative(self):
+        self.queue.dedup_filter.add(ELEMENT_UNEXISTENT_ELEMENT)
+        assert self.queue.push(ELEMENT_UNEXISTENT_ELEMENT) == \
+            ELEMENT_UNEXISTENT_ELEMENT
+        assert self.queue.dedup_filter.stats()['num_false_positives'] == 1
+
+    def test_smartqueue_false_positive_order(self):
+        self.queue.push(ELEMENT_SPAM)
+        self.queue.dedup_filter.add_some([ELEMENT_EGG, ELEMENT_BACON])
+        assert self.queue.push_some([ELEMENT_EGG, ELEMENT_SPAM,
+                                     ELEMENT_BACON, ELEMENT_42]) == \
+            [ELEMENT_EGG, ELEMENT_BACON, ELEMENT_42]
+        assert self.queue.elements() == [ELEMENT_SPAM, ELEMENT_EGG,
+                                         ELEMENT_BACON, ELEMENT_42]
+        assert self.queue.dedup_filter.stats()['num_false_positives'] == 2
+
+    def test_smartqueue_dedup_key(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'key'],
+                           redis_conn=redis_conn, keep_previous=False,
+                           dedup_filter=BloomFilter(capacity=1000),
+                           dedup_key=lambda element: element[:1])
+        assert queue.push_some([ELEMENT_EGG, ELEMENT_BACON]) == \
+            [ELEMENT_EGG, ELEMENT_BACON]
+        assert queue.push_some([b'eggs', b'beans']) == []
+        assert queue.dedup_filter.stats()['num_false_positives'] == 0
+        assert queue.elements() == [ELEMENT_EGG, ELEMENT_BACON]
+        queue.delete()
+
+    def test_smartqueue_delete(self):
+        self.queue.push_some(some_elements)
+        self.queue.delete()
+        assert self.queue.push_some(some_elements) == some_elements
+
+    def test_bucketqueue_push_some(self):
+        assert len(self.queue_bucket.push_some(some_elements)) == 4
+        assert self.queue_bucket.push_some(some_elements) == []
+        assert self.queue_bucket.num() == 4
+
+    def test_bucketqueue_popped_element(self):
+        self.queue_bucket.push_some(some_elements)
+        element = self.queue_bucket.pop()
+        assert self.queue_bucket.push(element) == element
+        assert self.queue_bucket.dedup_filter.stats()[
+            'num_false_positives'] == 1
+        assert self.queue_bucket.num() == 4
+
+    def teardown(self):
+        self.queue.delete()
+        self.queue_bucket.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -5,6 +5,8 @@ import pytest
 
 from tests import redis_conn
 from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.luascripts import NUM_BUCKET_SIGNALS
+from pimpamqueues.exceptions import PimPamQueuesError
 
 
 ELEMENT_EGG = b'egg'
@@ -46,6 +48,25 @@ class TestBucketQueue(object):
         queued_elements = self.queue.push_some(some_elements)
         assert len(queued_elements) == len(set(some_elements))
 
+    def test_push_some_error(self):
+        with pytest.raises(PimPamQueuesError):
+            self.queue.push_some(None)
+        with pytest.raises(PimPamQueuesError):
+            list(self.queue.iter_push_some(None))
+
+    def test_push_some_pipelined(self):
+        queued_elements = self.queue.push_some(some_elements,
+                                               num_block_size=2,
+                                               num_pipeline_depth=2)
+        assert queued_elements == [ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM,
+                                   ELEMENT_42]
+
+    def test_push_some_stream(self):
+        elements = (element for element in some_elements)
+        queued_elements = self.queue.push_some(elements, num_block_size=2,
+                                               stream=True)
+        assert len(queued_elements) == len(set(some_elements))
+
     def test_pop(self):
         self.queue.push_some(some_elements)
         assert self.queue.pop() is not None
@@ -53,6 +74,34 @@ class TestBucketQueue(object):
     def test_pop_empty_queue(self):
         assert self.queue.pop() is None
 
+    def test_pop_some(self):
+        self.queue.push_some(some_elements)
+        popped_elements = self.queue.pop_some(3, num_block_size=2)
+        assert len(popped_elements) == 3
+        assert set(popped_elements).issubset(set(some_elements))
+        assert self.queue.num() == len(set(some_elements)) - 3
+
+    def test_pop_some_empty_queue(self):
+        assert self.queue.pop_some(3) == []
+
+    def test_pop_block(self):
+        self.queue.push(ELEMENT_EGG)
+        assert self.queue.pop(block=True, timeout=1) == ELEMENT_EGG
+
+    def test_pop_block_timeout(self):
+        assert self.queue.pop(block=True, timeout=1) is None
+
+    def test_pop_some_block(self):
+        self.queue.push_some(some_elements)
+        popped_elements = self.queue.pop_some(2, block=True, timeout=1)
+        assert len(popped_elements) == 2
+
+    def test_push_some_signals(self):
+        elements = ['e%s' % i for i in range(NUM_BUCKET_SIGNALS * 3)]
+        self.queue.push_some(elements)
+        assert redis_conn.llen(self.queue.key_queue_bucket_signal) == \
+            NUM_BUCKET_SIGNALS
+
     def test_is_element(self):
         self.queue.push_some(some_elements)
         assert self.queue.is_element(some_elements[0]) is True
@@ -91,6 +140,15 @@ class TestBucketQueue(object):
         assert self.queue.delete() is True
         assert self.queue.num() == 0
 
+    def test_iter_elements(self):
+        self.queue.push_some(some_elements)
+        assert set(self.queue.iter_elements(batch=2)) == set(some_elements)
+        assert set(self.queue.iter_elements(batch=1, prefetch=True)) == \
+            set(some_elements)
+        assert self.queue.num() == len(set(some_elements))
+        assert list(BucketQueue(id_args=['test', 'testing', 'empty'],
+                                redis_conn=redis_conn).iter_elements()) == []
+
     def teardown(self):
         self.queue.delete()
 
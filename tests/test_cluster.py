@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.cluster import ClusterTools
+from pimpamqueues.cluster import RedisCluster
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+    ELEMENT_42,
+    ELEMENT_SPAM,
+]
+
+
+class TestCluster(object):
+
+    def setup(self):
+        self.queue = SmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn,
+            cluster=True
+        )
+        self.queue_legacy = SmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn
+        )
+
+    def test_is_cluster(self):
+        assert ClusterTools.is_cluster(redis_conn) is False
+
+    @pytest.mark.skipif(RedisCluster is None,
+                        reason='redis-py has no cluster client')
+    def test_cluster_default(self):
+        cluster_conn = RedisCluster.__new__(RedisCluster)
+        assert ClusterTools.is_cluster(cluster_conn) is True
+        queue = SmartQueue(id_args=['test', 'testing'],
+                           redis_conn=cluster_conn)
+        assert queue.cluster is True
+        assert queue.key_queue_bucket.startswith('queue:{test.testing}:')
+        assert self.queue_legacy.cluster is False
+
+    def test_keys_hash_tag(self):
+        assert self.queue.key_queue.startswith('queue:{test.testing}:')
+        assert self.queue.key_queue_bucket.startswith('queue:{test.testing}:')
+        assert self.queue_legacy.key_queue.startswith('queue:test.testing:')
+
+    def test_bucket_keys_hash_tag(self):
+        queue = BucketQueue(id_args=['test', 'testing'],
+                            redis_conn=redis_conn, cluster=True)
+        assert queue.key_queue_bucket_signal.startswith(
+            'queue:{test.testing}:')
+
+    def test_push_some(self):
+        queued_elements = self.queue.push_some(some_elements, to_first=True)
+        assert len(queued_elements) == len(set(some_elements))
+        assert self.queue.push(ELEMENT_SPAM) == ''
+        assert self.queue_legacy.num() == 0
+
+    def test_migrate_keys(self):
+        self.queue_legacy.push_some(some_elements)
+        assert self.queue.migrate_keys() == 2
+        assert self.queue.elements() == some_elements[0:4]
+        assert self.queue.push(ELEMENT_SPAM) == ''
+        assert self.queue_legacy.num() == 0
+
+    def test_migrate_keys_merge(self):
+        self.queue.push_some(some_elements[0:2])
+        self.queue_legacy.push_some(some_elements[1:4])
+        assert self.queue.migrate_keys() == 2
+        assert self.queue.elements() == some_elements[0:2] + \
+            some_elements[1:4]
+        assert self.queue.is_element(ELEMENT_42)
+        assert self.queue_legacy.num() == 0
+
+    def test_migrate_keys_copy(self):
+        queue_legacy = SimpleQueue(id_args=['test', 'testing'],
+                                   redis_conn=redis_conn)
+        queue_legacy.push_some(some_elements)
+        queue = SimpleQueue(id_args=['test', 'testing'],
+                            redis_conn=redis_conn, cluster=True)
+
+        assert queue.migrate_keys(source_redis_conn=redis_conn) == 1
+        assert queue.elements() == some_elements
+        assert queue_legacy.elements() == some_elements
+
+        queue.delete()
+        queue_legacy.delete()
+
+    def test_migrate_keys_window(self):
+        queue_legacy = SmartQueue(id_args=['test', 'testing'],
+                                  redis_conn=redis_conn, dedup_window=60)
+        queue_legacy.push_some(some_elements)
+        queue = SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                           cluster=True, dedup_window=60)
+
+        assert queue.migrate_keys(source_redis_conn=redis_conn) == 2
+        assert queue.is_element(ELEMENT_EGG) is True
+        assert queue.push(ELEMENT_EGG) == ''
+
+        queue.delete()
+        queue_legacy.delete()
+
+    def teardown(self):
+        self.queue.delete()
+        self.queue_legacy.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
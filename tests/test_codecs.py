@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.bloomfilter import BloomFilter
+from pimpamqueues.codecs import msgpack
+from pimpamqueues.codecs import lz4_frame
+from pimpamqueues.codecs import BytesCodec
+from pimpamqueues.codecs import CompressedCodec
+from pimpamqueues.codecs import COMPRESS_LZ4
+from pimpamqueues.codecs import COMPRESSED_HEADER
+from pimpamqueues.codecs import JsonCodec
+from pimpamqueues.codecs import MsgpackCodec
+from pimpamqueues.codecs import PickleCodec
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.priorityqueue import PriorityQueue
+from pimpamqueues.priorityqueue import SmartPriorityQueue
+from pimpamqueues.delayedqueue import DelayedQueue
+from pimpamqueues.reliableconsumer import ReliableConsumer
+from pimpamqueues.queuegroup import QueueGroup
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+ELEMENT_EGG = {'id': 1, 'name': 'egg'}
+ELEMENT_BACON = {'id': 2, 'name': 'bacon'}
+ELEMENT_SPAM = {'id': 3, 'name': 'spam'}
+ELEMENT_SPAM_RENAMED = {'id': 3, 'name': 'SPAM'}
+
+ELEMENT_DOCUMENT = b'egg bacon spam ' * 1000
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+]
+
+
+def get_id(element):
+    return str(element['id'])
+
+
+class TestCodecs(object):
+
+    def test_json(self):
+        codec = JsonCodec()
+        assert codec.encode({'b': 1, 'a': [1, 2]}) == b'{"a":[1,2],"b":1}'
+        assert codec.decode_some(codec.encode_some(some_elements)) == \
+            some_elements
+
+    def test_pickle(self):
+        codec = PickleCodec()
+        elements = [(1, 'egg'), {'bacon': 2.5}, None]
+        assert codec.decode_some(codec.encode_some(elements)) == elements
+
+    def test_bytes(self):
+        codec = BytesCodec()
+        data = memoryview(b'spam')
+        assert codec.encode(data) is data
+        assert codec.encode(bytearray(b'spam')) == b'spam'
+        assert codec.encode(memoryview(bytearray(b'spam'))) == b'spam'
+        hash(codec.encode(bytearray(b'spam')))
+        assert codec.encode(b'egg') == b'egg'
+        assert codec.encode(u'bacon') == b'bacon'
+
+    @pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+    def test_msgpack(self):
+        codec = MsgpackCodec()
+        assert codec.decode_some(codec.encode_some(some_elements)) == \
+            some_elements
+
+
+class TestCompressedCodec(object):
+
+    def test_compress(self):
+        codec = CompressedCodec(threshold=100)
+        encoded = codec.encode_some([ELEMENT_DOCUMENT, b'egg'])
+        assert encoded[0][:1] == COMPRESSED_HEADER
+        assert len(encoded[0]) < len(ELEMENT_DOCUMENT) / 10
+        assert encoded[1] == b'egg'
+        assert codec.decode_some(encoded) == [ELEMENT_DOCUMENT, b'egg']
+
+        stats = codec.stats()
+        assert stats['num_compressed'] == 1
+        assert stats['num_decompressed'] == 1
+        assert stats['num_bytes_in'] == len(ELEMENT_DOCUMENT)
+        assert stats['ratio'] > 10
+        assert stats['compress_seconds'] >= 0
+
+        codec.reset_stats()
+        assert codec.stats()['num_compressed'] == 0
+
+    def test_header_escaped(self):
+        codec = CompressedCodec()
+        element = COMPRESSED_HEADER + b'egg'
+        assert codec.decode(codec.encode(element)) == element
+
+    def test_dictionary(self):
+        dictionary = b'egg bacon spam '
+        codec = CompressedCodec(threshold=10, dictionary=dictionary)
+        element = b'spam egg bacon egg'
+        encoded = codec.encode(element)
+        assert len(encoded) < len(CompressedCodec(threshold=10).encode(
+            element))
+        assert codec.decode(encoded) == element
+        with pytest.raises(PimPamQueuesError):
+            CompressedCodec().decode(encoded)
+
+    def test_wrapped_codec(self):
+        codec = CompressedCodec(JsonCodec(), threshold=10)
+        assert codec.decode_some(codec.encode_some(some_elements)) == \
+            some_elements
+
+    @pytest.mark.skipif(lz4_frame is None, reason='lz4 is not installed')
+    def test_lz4(self):
+        codec = CompressedCodec(algorithm=COMPRESS_LZ4)
+        assert codec.decode(codec.encode(ELEMENT_DOCUMENT)) == \
+            ELEMENT_DOCUMENT
+        assert CompressedCodec().decode(codec.encode(ELEMENT_DOCUMENT)) == \
+            ELEMENT_DOCUMENT
+
+    def test_invalid(self):
+        with pytest.raises(PimPamQueuesError):
+            CompressedCodec(algorithm='utopia')
+
+    def test_mixed_queue(self):
+        queue = SimpleQueue(id_args=['test', 'codec', 'compressed'],
+                            redis_conn=redis_conn, keep_previous=False)
+        queue.push_some([b'egg', ELEMENT_DOCUMENT])
+
+        queue = SimpleQueue(id_args=['test', 'codec', 'compressed'],
+                            redis_conn=redis_conn, codec=CompressedCodec())
+        queue.push_some([ELEMENT_DOCUMENT, b'spam'])
+        assert len(redis_conn.lindex(queue.key_queue, 2)) < \
+            len(ELEMENT_DOCUMENT)
+        assert queue.elements() == [b'egg', ELEMENT_DOCUMENT,
+                                    ELEMENT_DOCUMENT, b'spam']
+        assert queue.pop_some(4) == [b'egg', ELEMENT_DOCUMENT,
+                                     ELEMENT_DOCUMENT, b'spam']
+        queue.delete()
+
+
+class TestQueueCodecs(object):
+
+    def setup(self):
+        self.simple_queue = SimpleQueue(
+            id_args=['test', 'codec', 'simple'],
+            redis_conn=redis_conn,
+            codec=JsonCodec()
+        )
+        self.bucket_queue = BucketQueue(
+            id_args=['test', 'codec', 'bucket'],
+            redis_conn=redis_conn,
+            codec=JsonCodec()
+        )
+        self.smart_queue = SmartQueue(
+            id_args=['test', 'codec', 'smart'],
+            redis_conn=redis_conn,
+            codec=JsonCodec(),
+            dedup_key=get_id
+        )
+        self.priority_queue = PriorityQueue(
+            id_args=['test', 'codec', 'priority'],
+            redis_conn=redis_conn,
+            codec=PickleCodec()
+        )
+        self.smart_priority_queue = SmartPriorityQueue(
+            id_args=['test', 'codec', 'smartpriority'],
+            redis_conn=redis_conn,
+            codec=PickleCodec()
+        )
+        self.queues = [self.simple_queue, self.bucket_queue,
+                       self.smart_queue, self.priority_queue,
+                       self.smart_priority_queue]
+
+    def test_simple_queue(self):
+        assert self.simple_queue.push_some(some_elements) == 3
+        assert self.simple_queue.elements() == some_elements
+        assert self.simple_queue.pop() == ELEMENT_EGG
+        assert self.simple_queue.pop_some(5) == [ELEMENT_BACON, ELEMENT_SPAM]
+        assert self.simple_queue.pop() is None
+
+    def test_simple_queue_stream(self):
+        assert self.simple_queue.push_some(iter(some_elements),
+                                           num_block_size=2, stream=True) == 3
+        assert self.simple_queue.pop(last=True, block=True) == ELEMENT_SPAM
+
+    def test_bucket_queue(self):
+        assert self.bucket_queue.push_some(some_elements + [ELEMENT_EGG, ]) \
+            == some_elements
+        assert self.bucket_queue.is_element(ELEMENT_BACON)
+        assert not self.bucket_queue.is_element(ELEMENT_SPAM_RENAMED)
+        assert sorted(self.bucket_queue.elements(), key=get_id) == \
+            some_elements
+        assert sorted(self.bucket_queue.pop_some(5), key=get_id) == \
+            some_elements
+
+    def test_bytes_dedup_filter(self):
+        queues = [
+            BucketQueue(id_args=['test', 'codec', 'bytes'],
+                        redis_conn=redis_conn, codec=BytesCodec(),
+                        dedup_filter=BloomFilter(capacity=1000)),
+            SmartQueue(id_args=['test', 'codec', 'bytes'],
+                       redis_conn=redis_conn, codec=BytesCodec(),
+                       dedup_filter=BloomFilter(capacity=1000)),
+        ]
+        for queue in queues:
+            assert queue.push_some([bytearray(b'egg'), ]) == [b'egg', ]
+            assert queue.push_some([bytearray(b'egg'), ]) == []
+            assert queue.num() == 1
+            queue.delete()
+
+    def test_smart_queue_dedup_key(self):
+        assert self.smart_queue.push_some(some_elements) == some_elements
+        assert self.smart_queue.push(ELEMENT_SPAM_RENAMED) == ''
+        assert self.smart_queue.is_element(ELEMENT_SPAM_RENAMED)
+        assert redis_conn.sismember(self.smart_queue.key_queue_bucket, b'3')
+        assert self.smart_queue.elements() == some_elements
+        assert self.smart_queue.pop() == ELEMENT_EGG
+
+    def test_smart_queue_dedup_key_stream(self):
+        assert list(self.smart_queue.iter_push_some(
+            iter(some_elements + [ELEMENT_SPAM_RENAMED, ]),
+            num_block_size=2)) == some_elements
+        assert self.smart_queue.num() == 3
+
+    def test_smart_queue_dedup_key_fingerprint(self):
+        queue = SmartQueue(
+            id_args=['test', 'codec', 'smart', 'fingerprint'],
+            redis_conn=redis_conn,
+            codec=JsonCodec(),
+            dedup_key=get_id,
+            fingerprint_bits=64,
+            two_phase=True
+        )
+        assert queue.push_some(some_elements) == some_elements
+        assert queue.push_some([ELEMENT_SPAM_RENAMED, ]) == []
+        assert redis_conn.sismember(queue.key_queue_bucket,
+                                    queue.fingerprint('3'))
+        queue.delete()
+
+    def test_smart_queue_dedup_key_window(self):
+        queue = SmartQueue(
+            id_args=['test', 'codec', 'smart', 'window'],
+            redis_conn=redis_conn,
+            codec=JsonCodec(),
+            dedup_key=get_id,
+            dedup_window=60
+        )
+        assert queue.push_some(some_elements) == some_elements
+        assert queue.push(ELEMENT_SPAM_RENAMED) == ''
+        assert queue.is_element(ELEMENT_SPAM_RENAMED)
+        queue.delete()
+
+    def test_smart_queue_dedup_key_invalid(self):
+        with pytest.raises(PimPamQueuesError):
+            SmartQueue(id_args=['test', 'codec'], redis_conn=redis_conn,
+                       dedup_key='id')
+
+    def test_priority_queue(self):
+        self.priority_queue.push_some([(('egg', 1), 2), (('bacon', 2), 1)])
+        assert self.priority_queue.elements(with_scores=True) == \
+            [(('bacon', 2), 1.0), (('egg', 1), 2.0)]
+        assert self.priority_queue.score(('egg', 1)) == 2
+        assert self.priority_queue.update(('egg', 1), 0) is True
+        assert self.priority_queue.pop() == ('egg', 1)
+        assert self.priority_queue.remove(('bacon', 2)) is True
+
+    def test_smart_priority_queue(self):
+        assert self.smart_priority_queue.push_some([(('egg', 1), 2), ]) == \
+            [('egg', 1), ]
+        assert self.smart_priority_queue.push(('egg', 1)) == ''
+        assert self.smart_priority_queue.pop_some(2) == [('egg', 1), ]
+
+    def test_queue_group(self):
+        group = QueueGroup(self.queues)
+        assert group.push_some([
+            some_elements,
+            some_elements,
+            some_elements + [ELEMENT_SPAM_RENAMED, ],
+            [(('egg', 1), 2), ],
+            [(('egg', 1), 2), ],
+        ]) == [3, some_elements, some_elements, 1, [('egg', 1), ]]
+        popped = group.pop_some(1)
+        assert popped[1][0] in some_elements
+        assert popped[:1] + popped[2:] == [[ELEMENT_EGG, ], [ELEMENT_EGG, ],
+                                           [('egg', 1), ], [('egg', 1), ]]
+
+    def test_queue_group_is_element(self):
+        group = QueueGroup(self.queues[1:])
+        group.push_some([[ELEMENT_SPAM, ], [ELEMENT_SPAM, ],
+                         [(ELEMENT_SPAM['name'], 1), ],
+                         [(ELEMENT_SPAM['name'], 1), ]])
+        assert group.is_element(ELEMENT_SPAM_RENAMED) == [False, True, False,
+                                                          False]
+
+    def test_delayed_queue(self):
+        delayed_queue = DelayedQueue(self.simple_queue)
+        delayed_queue.push_some(some_elements, delay=-1)
+        assert delayed_queue.elements() == sorted(
+            some_elements, key=JsonCodec().encode)
+        assert delayed_queue.remove(ELEMENT_BACON) is True
+        assert delayed_queue.promote() == 2
+        assert sorted(self.simple_queue.elements(), key=get_id) == \
+            [ELEMENT_EGG, ELEMENT_SPAM]
+        delayed_queue.delete()
+
+    def test_reliable_consumer(self):
+        consumer = ReliableConsumer(self.simple_queue, 'codec')
+        self.simple_queue.push_some(some_elements)
+        assert consumer.pop_some(2) == [ELEMENT_EGG, ELEMENT_BACON]
+        assert consumer.touch(ELEMENT_EGG) is True
+        assert consumer.ack(ELEMENT_EGG) is True
+        assert consumer.leased_elements() == [ELEMENT_BACON, ]
+        assert consumer.nack(ELEMENT_BACON) is True
+        assert self.simple_queue.pop() == ELEMENT_BACON
+        consumer.delete()
+
+    def teardown(self):
+        for queue in self.queues:
+            queue.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
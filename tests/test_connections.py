@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import redis
+
+from tests import redis_conn
+from pimpamqueues.connections import connections
+from pimpamqueues.connections import ConnectionRegistry
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.priorityqueue import PriorityQueue
+from pimpamqueues.shardedqueue import ShardedSimpleQueue
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+class TestConnectionRegistry(object):
+
+    def setup(self):
+        self.registry = ConnectionRegistry()
+
+    def test_get_default(self):
+        client = self.registry.get()
+        assert isinstance(client, redis.Redis)
+        assert client is self.registry.get()
+
+    def test_get_unconfigured(self):
+        with pytest.raises(PimPamQueuesError):
+            self.registry.get('unconfigured')
+
+    def test_configure(self):
+        self.registry.configure(host='redis.local', port=6380, db=2,
+                                max_connections=8, socket_timeout=5,
+                                health_check_interval=30)
+        pool = self.registry.get().connection_pool
+        assert isinstance(pool, redis.ConnectionPool)
+        assert pool.max_connections == 8
+        assert pool.connection_kwargs['host'] == 'redis.local'
+        assert pool.connection_kwargs['port'] == 6380
+        assert pool.connection_kwargs['db'] == 2
+        assert pool.connection_kwargs['socket_timeout'] == 5
+        assert pool.connection_kwargs['health_check_interval'] == 30
+
+    def test_configure_blocking(self):
+        self.registry.configure('blocking', max_connections=4, blocking=True,
+                                pool_timeout=2)
+        pool = self.registry.get('blocking').connection_pool
+        assert isinstance(pool, redis.BlockingConnectionPool)
+        assert pool.max_connections == 4
+        assert pool.timeout == 2
+
+    def test_configure_unix_socket(self):
+        self.registry.configure(unix_socket_path='/tmp/redis.sock')
+        pool = self.registry.get().connection_pool
+        assert pool.connection_class is \
+            redis.connection.UnixDomainSocketConnection
+        assert pool.connection_kwargs['path'] == '/tmp/redis.sock'
+
+    def test_configure_url(self):
+        self.registry.configure(url='redis://redis.local:6381/3')
+        pool = self.registry.get().connection_pool
+        assert pool.connection_kwargs['host'] == 'redis.local'
+        assert pool.connection_kwargs['port'] == 6381
+        assert pool.connection_kwargs['db'] == 3
+
+    def test_configure_retries(self):
+        self.registry.configure(num_retries=3)
+        pool = self.registry.get().connection_pool
+        assert pool.connection_kwargs['retry'] is not None
+
+    def test_reconfigure(self):
+        client = self.registry.get()
+        self.registry.configure(port=6380)
+        assert self.registry.get() is not client
+        assert self.registry.get().connection_pool.connection_kwargs[
+            'port'] == 6380
+
+    def test_set(self):
+        self.registry.set(redis_conn)
+        assert self.registry.get() is redis_conn
+
+    def test_close(self):
+        client = self.registry.get()
+        self.registry.close()
+        assert self.registry.get() is not client
+
+
+class TestConnectionRegistryQueues(object):
+
+    def test_default_connection(self):
+        client = connections.get()
+        assert SimpleQueue(id_args=['connections']).redis is client
+        assert SmartQueue(id_args=['connections']).redis is client
+        assert PriorityQueue(id_args=['connections']).redis is client
+        queue = ShardedSimpleQueue(id_args=['connections'], num_shards=2)
+        assert all(shard.redis is client for shard in queue.shards)
+
+    def test_given_connection(self):
+        assert SimpleQueue(id_args=['connections'],
+                           redis_conn=redis_conn).redis is redis_conn
+
+
+if __name__ == '__main__':
+    pytest.main()
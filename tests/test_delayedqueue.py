@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues import delayedqueue
+from pimpamqueues.delayedqueue import DelayedQueue
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.exceptions import PimPamQueuesError
+from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+
+ELEMENT_SPAM_UPPERCASED = b'SPAM'
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+    ELEMENT_42,
+]
+
+
+class Disambiguator(object):
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+
+class TestDelayedQueue(object):
+
+    def setup(self):
+        self.queue = SimpleQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn
+        )
+        self.delayed_queue = DelayedQueue(self.queue)
+
+    def test_push(self):
+        assert self.delayed_queue.push(ELEMENT_EGG, delay=60) == 1
+        assert self.delayed_queue.push(ELEMENT_BACON, at=0) == 2
+        assert self.delayed_queue.num() == 2
+        assert self.delayed_queue.num_due() == 1
+        assert self.delayed_queue.next_due() == 0
+
+    def test_push_without_value(self):
+        with pytest.raises(PimPamQueuesElementWithoutValueError):
+            self.delayed_queue.push(None)
+
+    def test_push_some(self):
+        now = time.time()
+        assert self.delayed_queue.push_some({ELEMENT_EGG: now + 60,
+                                             ELEMENT_BACON: now - 1}) == 2
+        assert self.delayed_queue.push_some([ELEMENT_SPAM, ELEMENT_42],
+                                            delay=30, num_block_size=1) == 4
+        assert self.delayed_queue.elements() == [ELEMENT_BACON, ELEMENT_42,
+                                                 ELEMENT_SPAM, ELEMENT_EGG]
+
+    def test_push_some_error(self):
+        with pytest.raises(PimPamQueuesError):
+            self.delayed_queue.push_some({ELEMENT_EGG: 'notatime'})
+
+    def test_promote(self):
+        self.delayed_queue.push_some(some_elements[0:3], at=time.time() - 2)
+        self.delayed_queue.push(ELEMENT_42, delay=60)
+        assert self.delayed_queue.promote() == 3
+        assert sorted(self.queue.elements()) == sorted(some_elements[0:3])
+        assert self.delayed_queue.elements() == [ELEMENT_42]
+        assert self.delayed_queue.promote() == 0
+
+        stats = self.delayed_queue.stats()
+        assert stats['num_promoted'] == 3
+        assert stats['num_queued'] == 3
+        assert 2 <= stats['lag_max'] < 10
+        assert 2 <= stats['lag_mean'] < 10
+
+    def test_promote_batches(self, monkeypatch):
+        monkeypatch.setattr(delayedqueue, 'NUM_PROMOTE_SIZE', 3)
+        self.delayed_queue.push_some(['e%s' % i for i in range(10)], at=0)
+        assert self.delayed_queue.promote(num_elements=4) == 4
+        assert self.delayed_queue.promote() == 6
+        assert self.queue.num() == 10
+
+    def test_promote_smartqueue(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'smart'],
+                           redis_conn=redis_conn)
+        delayed_queue = DelayedQueue(queue)
+        queue.push(ELEMENT_EGG)
+        delayed_queue.push_some([ELEMENT_EGG, ELEMENT_BACON], at=0)
+        assert delayed_queue.promote() == 2
+        assert queue.elements() == [ELEMENT_EGG, ELEMENT_BACON]
+        assert delayed_queue.stats()['num_queued'] == 1
+        delayed_queue.delete()
+        queue.delete()
+
+    def test_promote_smartqueue_disambiguated(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'smart'],
+                           redis_conn=redis_conn,
+                           disambiguator=Disambiguator)
+        delayed_queue = DelayedQueue(queue)
+        queue.push(ELEMENT_SPAM)
+        delayed_queue.push_some([ELEMENT_SPAM_UPPERCASED, ELEMENT_EGG],
+                                at=0)
+        assert delayed_queue.elements() == [ELEMENT_EGG, ELEMENT_SPAM]
+        assert delayed_queue.promote() == 2
+        assert queue.elements() == [ELEMENT_SPAM, ELEMENT_EGG]
+        delayed_queue.delete()
+        queue.delete()
+
+    def test_smartqueue_fingerprint(self):
+        queue = SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                           fingerprint_bits=64)
+        with pytest.raises(PimPamQueuesError):
+            DelayedQueue(queue)
+
+    def test_run_promoter(self):
+        self.delayed_queue.push(ELEMENT_EGG, delay=0.2)
+        stop_event = threading.Event()
+        promoter = threading.Thread(target=self.delayed_queue.run_promoter,
+                                    kwargs={'interval': 0.05,
+                                            'stop_event': stop_event})
+        promoter.start()
+        assert self.queue.pop(block=True, timeout=2) == ELEMENT_EGG
+        stop_event.set()
+        promoter.join()
+        assert self.delayed_queue.is_empty() is True
+
+    def test_remove(self):
+        self.delayed_queue.push(ELEMENT_EGG, delay=60)
+        assert self.delayed_queue.remove(ELEMENT_EGG) is True
+        assert self.delayed_queue.remove(ELEMENT_EGG) is False
+
+    def test_delete(self):
+        self.delayed_queue.push(ELEMENT_EGG, delay=60)
+        assert self.delayed_queue.delete() is True
+        assert self.delayed_queue.num() == 0
+
+    def teardown(self):
+        self.delayed_queue.delete()
+        self.queue.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.instrumentation import MemoryCollector
+from pimpamqueues.instrumentation import PrometheusCollector
+from pimpamqueues.instrumentation import OPERATION_PUSH
+from pimpamqueues.instrumentation import OPERATION_PUSH_SOME
+from pimpamqueues.instrumentation import OPERATION_POP
+from pimpamqueues.instrumentation import OPERATION_POP_SOME
+from pimpamqueues.instrumentation import COUNTER_BLOCKS
+from pimpamqueues.instrumentation import COUNTER_BYTES_SENT
+from pimpamqueues.instrumentation import COUNTER_DUPLICATES
+from pimpamqueues.instrumentation import COUNTER_ERRORS
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+some_elements = [b'egg', b'bacon', b'spam', b'spam', b'42']
+
+
+class TestMemoryCollector(object):
+
+    def setup(self):
+        self.collector = MemoryCollector()
+
+    def test_simple_queue(self):
+        queue = SimpleQueue(id_args=['test', 'instrumentation'],
+                            redis_conn=redis_conn, keep_previous=False,
+                            observer=self.collector)
+        queue.push_some(some_elements, num_block_size=2)
+        queue.pop()
+        queue.pop_some(10)
+        assert queue.pop() is None
+
+        assert len(self.collector.get_latencies(OPERATION_PUSH_SOME)) == 1
+        assert self.collector.get_num_elements(OPERATION_PUSH_SOME) == [5]
+        assert self.collector.get_num_elements(OPERATION_POP) == [1, 0]
+        assert self.collector.get_num_elements(OPERATION_POP_SOME) == [4]
+        assert self.collector.get_count(COUNTER_BLOCKS) == 3
+        assert self.collector.get_count(COUNTER_BYTES_SENT) == 18
+        assert self.collector.get_count(COUNTER_BLOCKS,
+                                        queue.key_queue) == 3
+
+        queue.push_some(iter(some_elements), stream=True, num_block_size=2)
+        assert self.collector.get_num_elements(OPERATION_PUSH_SOME) == [5,
+                                                                        None]
+        assert self.collector.get_count(COUNTER_BLOCKS) == 6
+        queue.delete()
+
+    def test_bucket_queue(self):
+        queue = BucketQueue(id_args=['test', 'instrumentation'],
+                            redis_conn=redis_conn, keep_previous=False,
+                            observer=self.collector)
+        queue.push_some(some_elements)
+        assert queue.push(b'egg') == ''
+        assert self.collector.get_num_elements(OPERATION_PUSH) == [1]
+        assert self.collector.get_num_elements(OPERATION_PUSH_SOME) == [5]
+        assert self.collector.get_count(COUNTER_DUPLICATES) == 2
+        assert len(self.collector.get_latencies(
+            OPERATION_PUSH, queue.key_queue_bucket)) == 1
+        queue.delete()
+
+    def test_smart_queue(self):
+        queue = SmartQueue(id_args=['test', 'instrumentation'],
+                           redis_conn=redis_conn, keep_previous=False,
+                           observer=self.collector)
+        queue.push_some(some_elements, num_block_size=2)
+        queue.push_some([b'egg', b'ham'])
+        queue.push(b'egg', force=True)
+        assert self.collector.get_count(COUNTER_DUPLICATES) == 2
+        assert self.collector.get_count(COUNTER_BLOCKS) == 5
+        assert self.collector.get_count(COUNTER_BYTES_SENT) > 0
+        assert self.collector.get_num_elements(OPERATION_PUSH) == [1]
+        assert self.collector.get_num_elements(OPERATION_PUSH_SOME) == [5, 2]
+        assert self.collector.get_num_elements(OPERATION_POP_SOME) == []
+        assert queue.pop_some(10) == [b'egg', b'bacon', b'spam', b'42',
+                                      b'ham', b'egg']
+        assert self.collector.get_num_elements(OPERATION_POP_SOME) == [6]
+        queue.delete()
+
+    def test_errors(self):
+        queue = SmartQueue(id_args=['test', 'instrumentation'],
+                           redis_conn=redis_conn, observer=self.collector)
+        with pytest.raises(PimPamQueuesError):
+            queue.push(None)
+        assert self.collector.get_count(COUNTER_ERRORS) == 1
+        assert self.collector.get_latencies(OPERATION_PUSH) == []
+
+    def test_reset(self):
+        queue = SimpleQueue(id_args=['test', 'instrumentation'],
+                            redis_conn=redis_conn, observer=self.collector)
+        queue.pop()
+        self.collector.reset()
+        assert self.collector.get_latencies(OPERATION_POP) == []
+
+
+class TestPrometheusCollector(object):
+
+    def test_expose(self):
+        collector = PrometheusCollector(buckets=(0.5, 1))
+        queue = SmartQueue(id_args=['test', 'instrumentation'],
+                           redis_conn=redis_conn, keep_previous=False,
+                           observer=collector)
+        queue.push_some(some_elements)
+        collector.observe(queue, OPERATION_POP, 0.75, 1)
+
+        text = collector.expose()
+        key = queue.key_queue
+        assert '# TYPE pimpamqueues_operation_seconds histogram' in text
+        assert ('pimpamqueues_operation_seconds_bucket{queue="%s",'
+                'operation="push_some",le="0.5"} 1' % (key, )) in text
+        assert ('pimpamqueues_operation_seconds_bucket{queue="%s",'
+                'operation="pop",le="0.5"} 0' % (key, )) in text
+        assert ('pimpamqueues_operation_seconds_bucket{queue="%s",'
+                'operation="pop",le="1.0"} 1' % (key, )) in text
+        assert ('pimpamqueues_operation_seconds_count{queue="%s",'
+                'operation="pop"} 1' % (key, )) in text
+        assert ('pimpamqueues_operation_elements_total{queue="%s",'
+                'operation="push_some"} 5' % (key, )) in text
+
+        queue.push(b'ham')
+        text = collector.expose()
+        assert ('pimpamqueues_operation_elements_total{queue="%s",'
+                'operation="push_some"} 5' % (key, )) in text
+        assert ('pimpamqueues_operation_elements_total{queue="%s",'
+                'operation="push"} 1' % (key, )) in text
+        assert ('pimpamqueues_duplicates_total{queue="%s"} 1'
+                % (key, )) in text
+        assert '# TYPE pimpamqueues_blocks_total counter' in text
+        assert text.endswith('\n')
+        queue.delete()
+
+    def test_escape(self):
+        assert PrometheusCollector.escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pimpamqueues.lrucache import LRUCache
+from pimpamqueues.lrucache import MISSING
+from pimpamqueues.lrucache import disambiguator_caches
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+class Disambiguator(object):
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+
+class TestLRUCache(object):
+
+    def setup(self):
+        self.cache = LRUCache(max_size=2)
+
+    def test_get_some(self):
+        self.cache.set_some([b'EGG', b'BACON'], [b'egg', b'bacon'])
+        assert self.cache.get_some([b'EGG', b'SPAM']) == [b'egg', MISSING]
+        stats = self.cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_ratio'] == 0.5
+
+    def test_evict_least_recently_used(self):
+        self.cache.set_some([b'EGG', b'BACON'], [b'egg', b'bacon'])
+        self.cache.get_some([b'EGG'])
+        self.cache.set_some([b'SPAM'], [b'spam'])
+        assert len(self.cache) == 2
+        assert self.cache.get_some([b'EGG', b'BACON', b'SPAM']) == [
+            b'egg', MISSING, b'spam']
+        assert self.cache.stats()['evictions'] == 1
+
+    def test_unhashable(self):
+        self.cache.set_some([{'id': 1}], [b'egg'])
+        assert len(self.cache) == 0
+        assert self.cache.get_some([{'id': 1}]) == [MISSING]
+
+    def test_clear(self):
+        self.cache.set_some([b'EGG'], [b'egg'])
+        self.cache.clear()
+        assert len(self.cache) == 0
+
+    def test_invalid(self):
+        with pytest.raises(PimPamQueuesError):
+            LRUCache(max_size=0)
+
+
+class TestDisambiguatorCacheRegistry(object):
+
+    def test_get(self):
+        cache = disambiguator_caches.get(Disambiguator, 10)
+        assert disambiguator_caches.get(Disambiguator, 20) is cache
+        assert cache.max_size == 10
+        disambiguator_caches.clear(Disambiguator)
+        assert disambiguator_caches.get(Disambiguator, 20) is not cache
+
+    def teardown(self):
+        disambiguator_caches.clear()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.luascripts import LuaScripts
+
+
+SCRIPT_ECHO = 'echo'
+
+KEY_ECHO = 'test:luascripts:echo'
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+
+
+class TestLuaScripts(object):
+
+    def setup(self):
+        self.lua_scripts = LuaScripts()
+        self.sha = self.lua_scripts.register(SCRIPT_ECHO, """
+            return ARGV
+        """)
+
+    def test_register(self):
+        assert self.lua_scripts.get_sha(SCRIPT_ECHO) == self.sha
+        assert len(self.sha) == 40
+
+    def test_evalsha(self):
+        result = self.lua_scripts.evalsha(redis_conn, SCRIPT_ECHO,
+                                          [KEY_ECHO, ],
+                                          [ELEMENT_EGG, ELEMENT_BACON])
+        assert result == [ELEMENT_EGG, ELEMENT_BACON]
+
+    def test_load_once(self):
+        for i in range(3):
+            self.lua_scripts.evalsha(redis_conn, SCRIPT_ECHO, [KEY_ECHO, ],
+                                     [ELEMENT_EGG, ])
+        stats = self.lua_scripts.stats()
+        assert stats['loads'] == 1
+        assert stats['hits'] == 3
+        assert stats['reloads'] == 0
+
+    def test_reload_noscript(self):
+        self.lua_scripts.evalsha(redis_conn, SCRIPT_ECHO, [KEY_ECHO, ],
+                                 [ELEMENT_EGG, ])
+        redis_conn.script_flush()
+        result = self.lua_scripts.evalsha(redis_conn, SCRIPT_ECHO,
+                                          [KEY_ECHO, ], [ELEMENT_BACON, ])
+        assert result == [ELEMENT_BACON, ]
+        assert self.lua_scripts.stats()['reloads'] == 1
+
+    def test_evalsha_some(self):
+        results = self.lua_scripts.evalsha_some(
+            redis_conn, SCRIPT_ECHO, [KEY_ECHO, ],
+            [[ELEMENT_EGG, ], [ELEMENT_BACON, ELEMENT_EGG]])
+        assert results == [[ELEMENT_EGG, ], [ELEMENT_BACON, ELEMENT_EGG]]
+        assert self.lua_scripts.stats()['hits'] == 2
+
+    def test_evalsha_some_reload_noscript(self):
+        self.lua_scripts.load(redis_conn, SCRIPT_ECHO)
+        redis_conn.script_flush()
+        results = self.lua_scripts.evalsha_some(
+            redis_conn, SCRIPT_ECHO, [KEY_ECHO, ],
+            [[ELEMENT_EGG, ], [ELEMENT_BACON, ]])
+        assert results == [[ELEMENT_EGG, ], [ELEMENT_BACON, ]]
+        assert self.lua_scripts.stats()['reloads'] == 1
+
+    def test_reset_stats(self):
+        self.lua_scripts.evalsha(redis_conn, SCRIPT_ECHO, [KEY_ECHO, ],
+                                 [ELEMENT_EGG, ])
+        self.lua_scripts.reset_stats()
+        assert self.lua_scripts.stats() == {'loads': 0, 'hits': 0,
+                                            'reloads': 0}
+
+
+if __name__ == '__main__':
+    pytest.main()
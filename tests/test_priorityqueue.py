@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.priorityqueue import PriorityQueue
+from pimpamqueues.priorityqueue import SmartPriorityQueue
+from pimpamqueues.exceptions import PimPamQueuesError
+from pimpamqueues.exceptions import PimPamQueuesElementWithoutValueError
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+ELEMENT_UNEXISTENT_ELEMENT = b'utopia'
+
+ELEMENT_SPAM_UPPERCASED = b'SPAM'
+
+some_elements = [
+    (ELEMENT_EGG, 3),
+    (ELEMENT_BACON, 1),
+    (ELEMENT_SPAM, 2),
+    (ELEMENT_42, 0),
+]
+
+
+class Disambiguator(object):
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+
+class TestPriorityQueue(object):
+
+    def setup(self):
+        self.queue = PriorityQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn
+        )
+
+    def test_empty(self):
+        assert self.queue.num() == 0
+        assert self.queue.is_empty() is True
+        assert self.queue.is_not_empty() is False
+
+    def test_push(self):
+        assert self.queue.push(ELEMENT_EGG) == 1
+        assert self.queue.push(ELEMENT_BACON, score=-1) == 2
+        assert self.queue.push(ELEMENT_EGG, score=5) == 2
+        assert self.queue.score(ELEMENT_EGG) == 5
+
+    def test_push_without_value(self):
+        with pytest.raises(PimPamQueuesElementWithoutValueError):
+            self.queue.push('')
+
+    def test_push_some_not_pairs(self):
+        with pytest.raises(PimPamQueuesError):
+            self.queue.push_some(['notapair'])
+
+    def test_push_some(self):
+        assert self.queue.push_some(some_elements, num_block_size=3) == 4
+        assert self.queue.elements() == [ELEMENT_42, ELEMENT_BACON,
+                                         ELEMENT_SPAM, ELEMENT_EGG]
+        assert self.queue.push_some({ELEMENT_42: 10}) == 4
+        assert self.queue.elements(queue_to=0, with_scores=True) == \
+            [(ELEMENT_BACON, 1)]
+
+    def test_push_some_empty(self):
+        assert self.queue.push_some([]) == 0
+        self.queue.push(ELEMENT_EGG)
+        assert self.queue.push_some({}) == 1
+
+    def test_update(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.update(ELEMENT_EGG, -1) is True
+        assert self.queue.update(ELEMENT_UNEXISTENT_ELEMENT, -1) is False
+        assert self.queue.num() == 4
+        assert self.queue.pop() == ELEMENT_EGG
+
+    def test_pop(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop() == ELEMENT_42
+        assert self.queue.pop(last=True) == ELEMENT_EGG
+        assert self.queue.num() == 2
+
+    def test_pop_empty(self):
+        assert self.queue.pop() is None
+        assert self.queue.pop(block=True, timeout=1) is None
+
+    def test_pop_some(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop_some(3, num_block_size=2) == [
+            ELEMENT_42, ELEMENT_BACON, ELEMENT_SPAM]
+        assert self.queue.pop_some(3) == [ELEMENT_EGG]
+        assert self.queue.pop_some(3) == []
+
+    def test_pop_some_last(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop_some(2, last=True) == [ELEMENT_EGG, ELEMENT_SPAM]
+
+    def test_pop_block(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop(block=True) == ELEMENT_42
+        assert self.queue.pop(last=True, block=True) == ELEMENT_EGG
+        assert self.queue.pop_some(5, block=True, timeout=1) == [
+            ELEMENT_BACON, ELEMENT_SPAM]
+
+    def test_is_element(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.is_element(ELEMENT_SPAM) is True
+        assert self.queue.is_element(ELEMENT_UNEXISTENT_ELEMENT) is False
+
+    def test_remove(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.remove(ELEMENT_SPAM) is True
+        assert self.queue.remove(ELEMENT_SPAM) is False
+        assert self.queue.num() == 3
+
+    def test_delete(self):
+        self.queue.push(ELEMENT_42)
+        assert self.queue.delete() is True
+        assert self.queue.num() == 0
+
+    def test_queue_new_queue_remove_queued_elements(self):
+        self.queue.push(ELEMENT_EGG)
+        queue = PriorityQueue(
+            id_args=['test', 'testing'],
+            keep_previous=False,
+            redis_conn=redis_conn
+        )
+        assert queue.is_empty() is True
+
+    def teardown(self):
+        self.queue.delete()
+
+
+class TestSmartPriorityQueue(object):
+
+    def setup(self):
+        self.queue = SmartPriorityQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn
+        )
+
+    def test_push(self):
+        assert self.queue.push(ELEMENT_EGG, 1) == ELEMENT_EGG
+        assert self.queue.push(ELEMENT_EGG, 0) == ''
+        assert self.queue.score(ELEMENT_EGG) == 1
+        assert self.queue.push(ELEMENT_EGG, 0, force=True) == ELEMENT_EGG
+        assert self.queue.score(ELEMENT_EGG) == 0
+
+    def test_push_some(self):
+        queued_elements = self.queue.push_some(
+            some_elements + [(ELEMENT_EGG, 0)], num_block_size=2,
+            num_pipeline_depth=1)
+        assert queued_elements == [element for element, s in some_elements]
+        assert self.queue.pop_some(4) == [ELEMENT_42, ELEMENT_BACON,
+                                          ELEMENT_SPAM, ELEMENT_EGG]
+        assert self.queue.push_some(some_elements) == []
+
+    def test_push_some_empty(self):
+        assert self.queue.push_some([]) == []
+        assert self.queue.num() == 0
+
+    def test_update(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.update(ELEMENT_EGG, -1) is True
+        assert self.queue.pop() == ELEMENT_EGG
+        assert self.queue.update(ELEMENT_EGG, -1) is False
+
+    def test_disambiguator(self):
+        queue = SmartPriorityQueue(id_args=['test', 'testing'],
+                                   redis_conn=redis_conn,
+                                   disambiguator=Disambiguator)
+        assert queue.push_some([(ELEMENT_SPAM, 1),
+                                (ELEMENT_SPAM_UPPERCASED, 0)]) == \
+            [ELEMENT_SPAM]
+        queue.delete()
+
+    def test_delete(self):
+        self.queue.push(ELEMENT_42)
+        assert self.queue.delete() is True
+        assert self.queue.push(ELEMENT_42) == ELEMENT_42
+
+    def teardown(self):
+        self.queue.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.bloomfilter import BloomFilter
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.priorityqueue import PriorityQueue
+from pimpamqueues.priorityqueue import SmartPriorityQueue
+from pimpamqueues.queuegroup import QueueGroup
+from pimpamqueues.shardedqueue import ShardedSimpleQueue
+from pimpamqueues.luascripts import lua_scripts
+from pimpamqueues.luascripts import SCRIPT_SMART_PUSH
+from pimpamqueues.exceptions import PimPamQueuesError
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+ELEMENT_UNEXISTENT_ELEMENT = b'utopia'
+
+ELEMENT_SPAM_UPPERCASED = b'SPAM'
+
+
+class Disambiguator(object):
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+
+class TestQueueGroup(object):
+
+    def setup(self):
+        self.simple_queue = SimpleQueue(
+            id_args=['test', 'group', 'simple'],
+            redis_conn=redis_conn
+        )
+        self.bucket_queue = BucketQueue(
+            id_args=['test', 'group', 'bucket'],
+            redis_conn=redis_conn
+        )
+        self.smart_queue = SmartQueue(
+            id_args=['test', 'group', 'smart'],
+            redis_conn=redis_conn,
+            disambiguator=Disambiguator
+        )
+        self.priority_queue = PriorityQueue(
+            id_args=['test', 'group', 'priority'],
+            redis_conn=redis_conn
+        )
+        self.smart_priority_queue = SmartPriorityQueue(
+            id_args=['test', 'group', 'smartpriority'],
+            redis_conn=redis_conn
+        )
+        self.queues = [self.simple_queue, self.bucket_queue,
+                       self.smart_queue, self.priority_queue,
+                       self.smart_priority_queue]
+        self.group = QueueGroup(self.queues)
+
+    def test_empty(self):
+        assert len(self.group) == 5
+        assert self.group.num() == [0, 0, 0, 0, 0]
+        assert self.group.is_empty() == [True, True, True, True, True]
+        assert self.group.is_not_empty() == [False, False, False, False,
+                                             False]
+
+    def test_push_some(self):
+        self.smart_queue.push(ELEMENT_EGG)
+        results = self.group.push_some([
+            [ELEMENT_EGG, ELEMENT_BACON],
+            [ELEMENT_EGG, ELEMENT_BACON],
+            [ELEMENT_EGG, ELEMENT_SPAM_UPPERCASED, ELEMENT_SPAM],
+            [(ELEMENT_EGG, 2), (ELEMENT_BACON, 1)],
+            {ELEMENT_EGG: 2, ELEMENT_BACON: 1},
+        ])
+        assert results[0] == 2
+        assert sorted(results[1]) == [ELEMENT_BACON, ELEMENT_EGG]
+        assert results[2] == [ELEMENT_SPAM, ]
+        assert results[3] == 2
+        assert sorted(results[4]) == [ELEMENT_BACON, ELEMENT_EGG]
+        assert self.group.num() == [2, 2, 2, 2, 2]
+        assert self.smart_queue.elements() == [ELEMENT_EGG, ELEMENT_SPAM]
+        assert self.priority_queue.elements() == [ELEMENT_BACON,
+                                                  ELEMENT_EGG]
+
+    def test_push_some_to_first(self):
+        self.simple_queue.push(ELEMENT_42)
+        self.smart_queue.push(ELEMENT_42)
+        group = QueueGroup([self.simple_queue, self.smart_queue])
+        group.push_some([[ELEMENT_EGG, ELEMENT_BACON],
+                         [ELEMENT_EGG, ELEMENT_BACON]], to_first=True)
+        assert self.simple_queue.elements() == [ELEMENT_EGG, ELEMENT_BACON,
+                                                ELEMENT_42]
+        assert self.smart_queue.elements() == [ELEMENT_EGG, ELEMENT_BACON,
+                                               ELEMENT_42]
+
+    def test_push_some_force(self):
+        self.smart_queue.push(ELEMENT_EGG)
+        group = QueueGroup([self.smart_queue, ])
+        assert group.push_some([[ELEMENT_EGG, ]], force=True) == \
+            [[ELEMENT_EGG, ]]
+        assert self.smart_queue.num() == 2
+
+    def test_push_some_empty(self):
+        assert self.group.push_some([[], [], [], [], []]) == [0, [], [], 0,
+                                                              []]
+
+    def test_push_some_num_collections(self):
+        with pytest.raises(PimPamQueuesError):
+            self.group.push_some([[ELEMENT_EGG, ]])
+
+    def test_push_some_error(self):
+        group = QueueGroup([self.priority_queue, ])
+        with pytest.raises(PimPamQueuesError):
+            group.push_some([{ELEMENT_EGG: 'notascore'}])
+
+    def test_push_some_dedup_filter(self):
+        queue = SmartQueue(
+            id_args=['test', 'group', 'smart', 'filter'],
+            redis_conn=redis_conn,
+            dedup_filter=BloomFilter(capacity=100)
+        )
+        QueueGroup([queue, ]).push_some([[ELEMENT_EGG, ]])
+        assert ELEMENT_EGG in queue.dedup_filter
+        assert queue.push(ELEMENT_EGG) == ''
+        queue.delete()
+
+    def test_push_some_noscript(self):
+        redis_conn.script_flush()
+        group = QueueGroup([self.smart_queue, self.bucket_queue])
+        assert group.push_some([[ELEMENT_EGG, ], [ELEMENT_BACON, ]]) == \
+            [[ELEMENT_EGG, ], [ELEMENT_BACON, ]]
+        assert lua_scripts.is_loaded(redis_conn, SCRIPT_SMART_PUSH)
+
+    def test_pop_some(self):
+        self.group.push_some([
+            [ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM],
+            [ELEMENT_EGG, ],
+            [ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM],
+            [(ELEMENT_EGG, 3), (ELEMENT_BACON, 1), (ELEMENT_SPAM, 2)],
+            [(ELEMENT_EGG, 3), (ELEMENT_BACON, 1), (ELEMENT_SPAM, 2)],
+        ])
+        assert self.group.pop_some(2) == [
+            [ELEMENT_EGG, ELEMENT_BACON],
+            [ELEMENT_EGG, ],
+            [ELEMENT_EGG, ELEMENT_BACON],
+            [ELEMENT_BACON, ELEMENT_SPAM],
+            [ELEMENT_BACON, ELEMENT_SPAM],
+        ]
+        assert self.group.pop_some(2, last=True) == [
+            [ELEMENT_SPAM, ], [], [ELEMENT_SPAM, ], [ELEMENT_EGG, ],
+            [ELEMENT_EGG, ],
+        ]
+        assert self.group.pop_some(2) == [[], [], [], [], []]
+        assert self.group.pop_some(0) == [[], [], [], [], []]
+
+    def test_is_element(self):
+        group = QueueGroup(self.queues[1:])
+        group.push_some([[ELEMENT_EGG, ], [ELEMENT_EGG, ],
+                         [(ELEMENT_EGG, 1), ], [(ELEMENT_EGG, 1), ]])
+        assert group.is_element(ELEMENT_EGG) == [True, True, True, True]
+        assert group.is_element(ELEMENT_UNEXISTENT_ELEMENT) == \
+            [False, False, False, False]
+
+    def test_is_element_dedup_window(self):
+        queue = SmartQueue(
+            id_args=['test', 'group', 'smart', 'window'],
+            redis_conn=redis_conn,
+            dedup_window=60
+        )
+        queue.push(ELEMENT_EGG)
+        group = QueueGroup([queue, ])
+        assert group.is_element(ELEMENT_EGG) == [True, ]
+        assert group.is_element(ELEMENT_BACON) == [False, ]
+        queue.delete()
+
+    def test_is_element_simple_queue(self):
+        with pytest.raises(PimPamQueuesError):
+            self.group.is_element(ELEMENT_EGG)
+
+    def test_not_grouped(self):
+        with pytest.raises(PimPamQueuesError):
+            QueueGroup([ShardedSimpleQueue(id_args=['test', 'group'],
+                                           num_shards=2,
+                                           redis_conns=[redis_conn, ])])
+
+    def teardown(self):
+        for queue in self.queues:
+            queue.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.bucketqueue import BucketQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.queuestats import QueueStats
+from pimpamqueues.delayedqueue import DelayedQueue
+from pimpamqueues.queuegroup import QueueGroup
+from pimpamqueues.reliableconsumer import ReliableConsumer
+
+
+some_elements = [b'egg', b'bacon', b'spam', b'spam', b'42']
+
+
+def get_num_enqueued(queue):
+    return sum(int(run.split(b':')[1]) for run
+               in redis_conn.lrange(queue.key_queue_enqueued, 0, -1))
+
+
+class TestSimpleQueueStats(object):
+
+    def setup(self):
+        self.queue = SimpleQueue(id_args=['test', 'stats'],
+                                 redis_conn=redis_conn, keep_previous=False,
+                                 track_stats=True)
+
+    def test_stats(self):
+        stats = self.queue.stats()
+        assert stats['num'] == 0
+        assert stats['num_pushed'] == 0
+        assert stats['push_rate'] is None
+        assert stats['head_age'] is None
+
+        self.queue.push_some(some_elements, num_block_size=2)
+        time.sleep(0.01)
+        self.queue.push(b'ham')
+        assert self.queue.pop() == b'egg'
+        assert self.queue.pop_some(2, last=True) == [b'ham', b'42']
+
+        stats = self.queue.stats()
+        assert stats['num'] == 3
+        assert stats['num_pushed'] == 6
+        assert stats['num_popped'] == 3
+        assert stats['head_age'] >= 0.01
+        assert stats['push_rate'] > 0
+        assert stats['pop_rate'] > 0
+
+    def test_head_age(self):
+        self.queue.push_some([b'egg', b'bacon'])
+        time.sleep(0.05)
+        self.queue.push(b'spam')
+        assert self.queue.stats()['head_age'] >= 0.05
+        assert self.queue.pop_some(2) == [b'egg', b'bacon']
+        assert self.queue.stats()['head_age'] < 0.05
+        self.queue.push(b'ham', to_first=True)
+        self.queue.push_some(iter([b'42']), stream=True)
+        assert self.queue.pop_some(3) == [b'ham', b'spam', b'42']
+        assert self.queue.stats()['head_age'] is None
+        assert redis_conn.exists(self.queue.key_queue_enqueued) == 0
+
+    def test_blocking_pop(self):
+        self.queue.push(b'egg')
+        assert self.queue.pop(block=True, timeout=1) == b'egg'
+        stats = self.queue.stats()
+        assert stats['num_popped'] == 1
+        assert stats['head_age'] is None
+
+    def test_reliable_consumer(self):
+        consumer = ReliableConsumer(self.queue, 'stats')
+        self.queue.push_some([b'egg', b'bacon'])
+        time.sleep(0.05)
+        assert consumer.pop_some(2) == [b'egg', b'bacon']
+        self.queue.push(b'spam')
+        stats = self.queue.stats()
+        assert stats['num_popped'] == 2
+        assert stats['head_age'] < 0.05
+        assert get_num_enqueued(self.queue) == 1
+
+        assert consumer.nack(b'egg') is True
+        stats = self.queue.stats()
+        assert stats['num_pushed'] == 4
+        assert get_num_enqueued(self.queue) == 2
+        assert consumer.pop(last=True) == b'spam'
+        assert get_num_enqueued(self.queue) == 1
+        consumer.delete()
+
+    def test_delayed_queue(self):
+        delayed_queue = DelayedQueue(self.queue)
+        delayed_queue.push_some([b'egg', b'bacon'], at=0)
+        assert delayed_queue.promote() == 2
+        stats = self.queue.stats()
+        assert stats['num_pushed'] == 2
+        assert stats['head_age'] >= 0
+        assert get_num_enqueued(self.queue) == 2
+        delayed_queue.delete()
+
+    def test_queue_group(self):
+        queue_bucket = BucketQueue(id_args=['test', 'stats', 'group'],
+                                   redis_conn=redis_conn, keep_previous=False,
+                                   track_stats=True)
+        group = QueueGroup([self.queue, queue_bucket])
+        assert group.push_some([some_elements, some_elements]) == [
+            5, [b'egg', b'bacon', b'spam', b'42']]
+        assert group.pop_some(2, last=True)[0] == [b'42', b'spam']
+        assert self.queue.stats()['num_popped'] == 2
+        assert get_num_enqueued(self.queue) == 3
+        assert queue_bucket.stats()['num_popped'] == 2
+        assert queue_bucket.stats()['num_pushed'] == 4
+        queue_bucket.delete()
+
+    def test_remove(self):
+        self.queue.push_some([b'egg', b'bacon'])
+        time.sleep(0.05)
+        self.queue.push_some([b'egg', b'spam'])
+        assert self.queue.remove(b'egg') is True
+        assert self.queue.remove(b'egg') is False
+        assert self.queue.elements() == [b'bacon', b'spam']
+        assert get_num_enqueued(self.queue) == 2
+        assert self.queue.stats()['head_age'] >= 0.05
+        assert self.queue.remove(b'bacon') is True
+        assert self.queue.stats()['head_age'] < 0.05
+
+    def test_not_tracked(self):
+        queue = SimpleQueue(id_args=['test', 'stats', 'untracked'],
+                            redis_conn=redis_conn, keep_previous=False)
+        queue.push_some(some_elements)
+        assert queue.stats() == {'num': 5}
+        assert redis_conn.exists(queue.key_queue_stats) == 0
+        queue.delete()
+
+    def test_delete(self):
+        self.queue.push(b'egg')
+        self.queue.delete()
+        assert redis_conn.exists(self.queue.key_queue_stats,
+                                 self.queue.key_queue_enqueued) == 0
+
+    def teardown(self):
+        self.queue.delete()
+
+
+class TestBucketQueueStats(object):
+
+    def setup(self):
+        self.queue = BucketQueue(id_args=['test', 'stats'],
+                                 redis_conn=redis_conn, keep_previous=False,
+                                 track_stats=True)
+
+    def test_stats(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop() is not None
+        assert len(self.queue.pop_some(2)) == 2
+        stats = self.queue.stats()
+        assert stats['num'] == 1
+        assert stats['num_pushed'] == 4
+        assert stats['num_popped'] == 3
+        assert 'head_age' not in stats
+
+    def teardown(self):
+        self.queue.delete()
+
+
+class TestSmartQueueStats(object):
+
+    def setup(self):
+        self.queue = SmartQueue(id_args=['test', 'stats'],
+                                redis_conn=redis_conn, keep_previous=False,
+                                track_stats=True)
+
+    def test_stats(self):
+        self.queue.push_some(some_elements, num_block_size=2)
+        self.queue.push(b'egg', force=True)
+        assert self.queue.pop_some(2) == [b'egg', b'bacon']
+        stats = self.queue.stats()
+        assert stats['num'] == 3
+        assert stats['num_bucket'] == 4
+        assert stats['num_pushed'] == 5
+        assert stats['num_popped'] == 2
+        assert stats['head_age'] >= 0
+
+    def test_dedup_window(self):
+        queue = SmartQueue(id_args=['test', 'stats', 'window'],
+                           redis_conn=redis_conn, keep_previous=False,
+                           track_stats=True, dedup_window=60,
+                           fingerprint_bits=64)
+        queue.push_some(some_elements)
+        stats = queue.stats()
+        assert stats['num_bucket'] == 4
+        assert stats['num_pushed'] == 4
+        queue.delete()
+
+    def teardown(self):
+        self.queue.delete()
+
+
+class TestQueueStats(object):
+
+    def test_get_age(self):
+        assert QueueStats.get_age(None, 10.0) is None
+        assert QueueStats.get_age(b'8500:3', 10.0) == 1.5
+        assert QueueStats.get_age('10500:3', 10.0) == 0.0
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.reliableconsumer import ReliableConsumer
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+ELEMENT_UNEXISTENT_ELEMENT = b'utopia'
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+    ELEMENT_42,
+]
+
+
+class TestReliableConsumer(object):
+
+    def setup(self):
+        self.queue = SimpleQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn
+        )
+        self.consumer = ReliableConsumer(self.queue, 'worker1')
+        self.consumer_expired = ReliableConsumer(self.queue, 'worker2',
+                                                 visibility_timeout=-1)
+
+    def test_pop(self):
+        self.queue.push_some(some_elements)
+        assert self.consumer.pop() == ELEMENT_EGG
+        assert self.consumer.num_leased() == 1
+        assert self.queue.num() == 3
+
+    def test_pop_last(self):
+        self.queue.push_some(some_elements)
+        assert self.consumer.pop(last=True) == ELEMENT_42
+
+    def test_pop_empty(self):
+        assert self.consumer.pop() is None
+        assert self.consumer.num_leased() == 0
+
+    def test_pop_some(self):
+        self.queue.push_some(some_elements)
+        leased_elements = self.consumer.pop_some(3, num_block_size=2)
+        assert leased_elements == some_elements[0:3]
+        assert self.consumer.num_leased() == 3
+        assert self.queue.elements() == some_elements[3:]
+
+    def test_pop_some_more_than_queued(self):
+        self.queue.push_some(some_elements)
+        assert self.consumer.pop_some(500) == some_elements
+        assert self.queue.num() == 0
+
+    def test_pop_leased_element(self):
+        self.queue.push_some([ELEMENT_EGG, ELEMENT_EGG, ELEMENT_BACON])
+        assert self.consumer.pop() == ELEMENT_EGG
+        assert self.consumer.pop() == ELEMENT_EGG
+        assert self.consumer.pop_some(2) == [ELEMENT_BACON]
+        assert self.queue.num() == 0
+        assert self.consumer.num_leased() == 3
+        assert sorted(self.consumer.leased_elements()) == [
+            ELEMENT_BACON, ELEMENT_EGG, ELEMENT_EGG]
+        assert self.consumer.ack_some([ELEMENT_EGG, ELEMENT_EGG]) == 2
+        assert self.consumer.ack(ELEMENT_EGG) is False
+        assert self.consumer.num_leased() == 1
+
+    def test_nack_leased_element(self):
+        self.queue.push_some([ELEMENT_EGG, ELEMENT_EGG])
+        self.consumer.pop_some(2)
+        assert self.consumer.nack_some([ELEMENT_EGG, ELEMENT_EGG,
+                                        ELEMENT_EGG]) == 2
+        assert self.queue.elements() == [ELEMENT_EGG, ELEMENT_EGG]
+        assert self.consumer.num_leased() == 0
+
+    def test_reap_leased_element(self):
+        self.queue.push_some([ELEMENT_EGG, ELEMENT_EGG, ELEMENT_BACON])
+        self.consumer_expired.pop_some(3)
+        assert self.consumer.reap(num_elements=1) == 1
+        assert self.consumer.reap() == 2
+        assert sorted(self.queue.elements()) == [
+            ELEMENT_BACON, ELEMENT_EGG, ELEMENT_EGG]
+        assert self.consumer_expired.num_leased() == 0
+        assert redis_conn.exists(self.consumer_expired.key_queue_leases) == 0
+
+    def test_ack(self):
+        self.queue.push_some(some_elements)
+        self.consumer.pop_some(2)
+        assert self.consumer.ack(ELEMENT_EGG) is True
+        assert self.consumer.ack(ELEMENT_EGG) is False
+        assert self.consumer.ack_some([ELEMENT_BACON, ELEMENT_SPAM]) == 1
+        assert self.consumer.num_leased() == 0
+        assert self.consumer.reap() == 0
+
+    def test_nack(self):
+        self.queue.push_some(some_elements)
+        self.consumer.pop_some(3)
+        assert self.consumer.nack(ELEMENT_BACON) is True
+        assert self.consumer.nack(ELEMENT_UNEXISTENT_ELEMENT) is False
+        assert self.queue.elements() == [ELEMENT_BACON, ELEMENT_42]
+        assert self.consumer.nack_some([ELEMENT_EGG, ELEMENT_SPAM]) == 2
+        assert self.queue.elements() == [ELEMENT_EGG, ELEMENT_SPAM,
+                                         ELEMENT_BACON, ELEMENT_42]
+        assert self.consumer.num_leased() == 0
+
+    def test_touch(self):
+        self.queue.push_some(some_elements)
+        self.consumer_expired.pop()
+        self.consumer_expired.visibility_timeout = 300
+        assert self.consumer_expired.touch(ELEMENT_EGG) is True
+        assert self.consumer_expired.touch(ELEMENT_BACON) is False
+        assert self.consumer.reap() == 0
+
+    def test_reap(self):
+        self.queue.push_some(some_elements)
+        self.consumer.pop_some(2)
+        self.consumer_expired.pop_some(2)
+        assert self.consumer.reap() == 2
+        assert sorted(self.queue.elements()) == sorted(some_elements[2:])
+        assert self.consumer.num_leased() == 2
+        assert self.consumer_expired.num_leased() == 0
+
+    def test_reap_limit(self):
+        self.queue.push_some(some_elements)
+        self.consumer_expired.pop_some(4)
+        assert self.consumer.reap(num_elements=3) == 3
+        assert self.consumer.reap(num_elements=3) == 1
+        assert self.queue.num() == 4
+
+    def test_reap_moves_live_lease(self):
+        self.queue.push_some([ELEMENT_EGG, ELEMENT_EGG])
+        self.consumer_expired.pop_some(2)
+        self.consumer_expired.visibility_timeout = 300
+        assert self.consumer_expired.touch(ELEMENT_EGG) is True
+        assert self.consumer.reap() == 1
+        assert self.consumer_expired.leased_elements() == [ELEMENT_EGG]
+        assert self.consumer_expired.ack(ELEMENT_EGG) is True
+        assert self.consumer_expired.num_leased() == 0
+
+    def test_smartqueue(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'smart'],
+                           redis_conn=redis_conn)
+        consumer = ReliableConsumer(queue, 'worker1')
+        queue.push_some(some_elements)
+        assert consumer.pop_some(2) == some_elements[0:2]
+        assert consumer.nack(ELEMENT_EGG) is True
+        assert queue.elements() == [ELEMENT_EGG] + some_elements[2:]
+        consumer.delete()
+        queue.delete()
+
+    def teardown(self):
+        self.consumer.delete()
+        self.consumer_expired.delete()
+        self.queue.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
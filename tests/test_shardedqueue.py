@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tests import redis_conn
+from pimpamqueues.codecs import JsonCodec
+from pimpamqueues.shardedqueue import ShardedSimpleQueue
+from pimpamqueues.shardedqueue import ShardedSmartQueue
+from pimpamqueues.shardedqueue import ROUTING_ROUND_ROBIN
+
+
+ELEMENT_EGG = b'egg'
+ELEMENT_BACON = b'bacon'
+ELEMENT_SPAM = b'spam'
+ELEMENT_42 = b'42'
+
+ELEMENT_SPAM_UPPERCASED = b'SPAM'
+
+ELEMENT_DICT_EGG = {'id': 1, 'name': 'egg'}
+ELEMENT_DICT_SPAM = {'id': 3, 'name': 'spam'}
+ELEMENT_DICT_SPAM_RENAMED = {'id': 3, 'name': 'SPAM'}
+
+some_elements = [
+    ELEMENT_EGG,
+    ELEMENT_BACON,
+    ELEMENT_SPAM,
+    ELEMENT_42,
+    ELEMENT_SPAM,
+    ELEMENT_SPAM_UPPERCASED,
+]
+
+
+class Disambiguator(object):
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+
+class CountingDisambiguator(object):
+
+    num_calls = 0
+
+    @staticmethod
+    def disambiguate(element):
+        CountingDisambiguator.num_calls += 1
+        return element.lower()
+
+
+def get_id(element):
+    return str(element['id'])
+
+
+class TestShardedSimpleQueue(object):
+
+    def setup(self):
+        self.queue = ShardedSimpleQueue(
+            id_args=['test', 'testing'],
+            num_shards=3,
+            redis_conns=[redis_conn, ],
+            shard_affinity=0
+        )
+
+    def test_empty(self):
+        assert self.queue.num() == 0
+        assert self.queue.is_empty() is True
+
+    def test_push_some(self):
+        assert self.queue.push_some(some_elements) == len(some_elements)
+        assert sorted(self.queue.elements()) == sorted(some_elements)
+
+    def test_push_some_count(self):
+        self.queue.shards[2].push(ELEMENT_42)
+        assert self.queue.push_some([ELEMENT_SPAM, ]) == 2
+        assert self.queue.push_some([]) == 2
+
+    def test_push_some_blocks(self):
+        elements = [ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM, ELEMENT_42]
+        queue = ShardedSimpleQueue(
+            id_args=['test', 'testing'],
+            num_shards=1,
+            redis_conns=[redis_conn, ]
+        )
+        assert queue.push_some(elements, num_block_size=3) == 4
+        assert queue.push_some(elements, to_first=True, num_block_size=3) \
+            == 8
+        assert queue.elements() == elements + elements
+
+    def test_push_hash_routing(self):
+        self.queue.push_some([ELEMENT_SPAM, ELEMENT_SPAM])
+        assert sorted(self.queue.num_shard_elements()) == [0, 0, 2]
+
+    def test_push_round_robin_routing(self):
+        queue = ShardedSimpleQueue(
+            id_args=['test', 'testing'],
+            num_shards=3,
+            redis_conns=[redis_conn, ],
+            routing=ROUTING_ROUND_ROBIN
+        )
+        queue.push_some([ELEMENT_SPAM, ELEMENT_SPAM, ELEMENT_SPAM])
+        assert queue.num_shard_elements() == [1, 1, 1]
+
+    def test_pop_work_stealing(self):
+        self.queue.shards[2].push(ELEMENT_EGG)
+        assert self.queue.pop() == ELEMENT_EGG
+        assert self.queue.pop() is None
+
+    def test_pop_shard_affinity(self):
+        self.queue.shards[1].push(ELEMENT_BACON)
+        self.queue.shards[0].push(ELEMENT_EGG)
+        assert self.queue.pop() == ELEMENT_EGG
+
+    def test_pop_some(self):
+        self.queue.push_some(some_elements)
+        assert len(self.queue.pop_some(4)) == 4
+        assert self.queue.num() == len(some_elements) - 4
+
+    def test_pop_block(self):
+        self.queue.shards[1].push(ELEMENT_42)
+        assert self.queue.pop(block=True, timeout=1) == ELEMENT_42
+
+    def test_codec(self):
+        queue = ShardedSimpleQueue(
+            id_args=['test', 'testing'],
+            num_shards=3,
+            redis_conns=[redis_conn, ],
+            shard_affinity=0,
+            codec=JsonCodec()
+        )
+        queue.push_some([ELEMENT_DICT_EGG, ELEMENT_DICT_SPAM])
+        assert sorted(queue.elements(), key=get_id) == [ELEMENT_DICT_EGG,
+                                                        ELEMENT_DICT_SPAM]
+        assert queue.pop_some(1)[0] in (ELEMENT_DICT_EGG, ELEMENT_DICT_SPAM)
+        assert queue.pop(block=True, timeout=1) in (ELEMENT_DICT_EGG,
+                                                    ELEMENT_DICT_SPAM)
+        assert queue.is_empty()
+
+    def teardown(self):
+        self.queue.delete()
+
+
+class TestShardedSmartQueue(object):
+
+    def setup(self):
+        self.queue = ShardedSmartQueue(
+            id_args=['test', 'testing'],
+            num_shards=3,
+            redis_conns=[redis_conn, ],
+            disambiguator=Disambiguator
+        )
+
+    def test_push_some(self):
+        queued_elements = self.queue.push_some(some_elements)
+        assert sorted(queued_elements) == sorted(set(some_elements) -
+                                                 set([b'SPAM']))
+        assert self.queue.push(ELEMENT_SPAM_UPPERCASED) == ''
+
+    def test_push_force(self):
+        self.queue.push(ELEMENT_EGG)
+        assert self.queue.push(ELEMENT_EGG, force=True) == ELEMENT_EGG
+        assert self.queue.num() == 2
+
+    def test_is_element(self):
+        self.queue.push(ELEMENT_SPAM)
+        assert self.queue.is_element(ELEMENT_SPAM_UPPERCASED) is True
+        assert self.queue.is_element(ELEMENT_EGG) is False
+
+    def test_push_some_to_first(self):
+        queue = ShardedSmartQueue(
+            id_args=['test', 'testing'],
+            num_shards=1,
+            redis_conns=[redis_conn, ]
+        )
+        queue.push(ELEMENT_42)
+        assert queue.push_some([ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM],
+                               to_first=True, num_block_size=2) == \
+            [ELEMENT_SPAM, ELEMENT_BACON, ELEMENT_EGG]
+        assert queue.elements() == [ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM,
+                                    ELEMENT_42]
+
+    def test_disambiguator_options(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        queue = ShardedSmartQueue(
+            id_args=['test', 'testing'],
+            num_shards=3,
+            redis_conns=[redis_conn, ],
+            disambiguator=CountingDisambiguator,
+            executor=executor,
+            cache_size=100
+        )
+        for shard in queue.shards:
+            assert shard.disambiguator is CountingDisambiguator
+            assert shard.executor is executor
+            assert shard.disambiguator_cache is not None
+
+        CountingDisambiguator.num_calls = 0
+        assert sorted(queue.push_some([ELEMENT_SPAM_UPPERCASED,
+                                       ELEMENT_EGG])) == [ELEMENT_EGG,
+                                                          ELEMENT_SPAM]
+        assert CountingDisambiguator.num_calls == 2
+        assert queue.push(ELEMENT_SPAM_UPPERCASED) == ''
+        assert CountingDisambiguator.num_calls == 2
+        queue.delete()
+        executor.shutdown()
+
+    def test_codec_dedup_key(self):
+        queue = ShardedSmartQueue(
+            id_args=['test', 'testing', 'codec'],
+            num_shards=3,
+            redis_conns=[redis_conn, ],
+            codec=JsonCodec(),
+            dedup_key=get_id
+        )
+        queued_elements = queue.push_some([ELEMENT_DICT_EGG,
+                                           ELEMENT_DICT_SPAM])
+        assert sorted(queued_elements, key=get_id) == [ELEMENT_DICT_EGG,
+                                                       ELEMENT_DICT_SPAM]
+        assert queue.push(ELEMENT_DICT_SPAM_RENAMED) == ''
+        assert queue.is_element(ELEMENT_DICT_SPAM_RENAMED) is True
+        assert queue.num() == 2
+        queue.delete()
+
+    def teardown(self):
+        self.queue.delete()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -5,6 +5,7 @@ import pytest
 
 from tests import redis_conn
 from pimpamqueues.simplequeue import SimpleQueue
+from pimpamqueues.exceptions import PimPamQueuesError
 
 
 ELEMENT_EGG = b'egg'
@@ -47,12 +48,24 @@ class TestSimpleQueue(object):
     def test_push_some(self):
         assert self.queue.push_some(some_elements) == len(some_elements)
 
+    def test_push_some_error(self):
+        with pytest.raises(PimPamQueuesError):
+            self.queue.push_some(None)
+        with pytest.raises(PimPamQueuesError):
+            self.queue.push_some(None, stream=True)
+
     def test_push_some_to_first(self):
         self.queue.push(ELEMENT_42)
         self.queue.push_some(elements=[ELEMENT_EGG, ELEMENT_BACON],
                              to_first=True)
         assert self.queue.pop() == ELEMENT_EGG
 
+    def test_push_some_stream(self):
+        elements = (element for element in some_elements)
+        assert self.queue.push_some(elements, num_block_size=2,
+                                    stream=True) == len(some_elements)
+        assert self.queue.elements() == some_elements
+
     def test_pop(self):
         self.queue.push(ELEMENT_EGG)
         assert self.queue.pop() == ELEMENT_EGG
@@ -60,6 +73,49 @@ class TestSimpleQueue(object):
     def test_pop_none(self):
         assert self.queue.pop() is None
 
+    def test_pop_some(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop_some(3) == some_elements[0:3]
+        assert self.queue.num() == len(some_elements) - 3
+
+    def test_pop_some_last(self):
+        self.queue.push_some(some_elements)
+        assert self.queue.pop_some(2, last=True) == [ELEMENT_SPAM, ELEMENT_42]
+
+    def test_pop_some_blocks(self):
+        self.queue.push_some(some_elements)
+        popped_elements = self.queue.pop_some(4, num_block_size=3)
+        assert popped_elements == some_elements[0:4]
+
+    def test_pop_some_empty_queue(self):
+        assert self.queue.pop_some(3) == []
+
+    def test_pop_block(self):
+        self.queue.push(ELEMENT_EGG)
+        assert self.queue.pop(block=True, timeout=1) == ELEMENT_EGG
+
+    def test_pop_block_timeout(self):
+        assert self.queue.pop(block=True, timeout=1) is None
+
+    def test_pop_some_block(self):
+        self.queue.push_some(some_elements)
+        popped_elements = self.queue.pop_some(3, block=True, timeout=1)
+        assert popped_elements == some_elements[0:3]
+
+    def test_pop_from(self):
+        queue_y = SimpleQueue(
+            id_args=['test', 'testing', 'y'],
+            redis_conn=redis_conn
+        )
+        queue_y.push(ELEMENT_BACON)
+
+        queue, element = SimpleQueue.pop_from([self.queue, queue_y],
+                                              timeout=1)
+        queue_y.delete()
+
+        assert queue is queue_y
+        assert element == ELEMENT_BACON
+
     def test_elements(self):
         self.queue.push_some(some_elements)
         elements = self.queue.elements()
@@ -91,6 +147,18 @@ class TestSimpleQueue(object):
         )
         assert queue.is_empty() is True
 
+    def test_iter_elements(self):
+        self.queue.push_some(some_elements)
+        assert list(self.queue.iter_elements(batch=2)) == some_elements
+        assert list(self.queue.iter_elements(batch=5)) == some_elements
+        assert list(self.queue.iter_elements(batch=2, prefetch=True)) == \
+            some_elements
+        assert self.queue.num() == len(some_elements)
+
+    def test_iter_elements_empty(self):
+        assert list(self.queue.iter_elements()) == []
+        assert list(self.queue.iter_elements(prefetch=True)) == []
+
     def teardown(self):
         self.queue.delete()
 
@@ -1,11 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from tests import redis_conn
+from pimpamqueues.bloomfilter import BloomFilter
+from pimpamqueues.lrucache import disambiguator_caches
 from pimpamqueues.smartqueue import SmartQueue
+from pimpamqueues.smartqueue import REPLY_COUNT
+from pimpamqueues.smartqueue import REPLY_INDICES
+from pimpamqueues.exceptions import PimPamQueuesError
 from pimpamqueues.exceptions import PimPamQueuesDisambiguatorInvalidError
+from pimpamqueues.exceptions import PimPamQueuesFingerprintInvalidError
 
 
 ELEMENT_EGG = b'egg'
@@ -34,6 +44,20 @@ class Disambiguator(object):
         return element.lower()
 
 
+class DisambiguatorSome(object):
+
+    calls = []
+
+    @staticmethod
+    def disambiguate(element):
+        return element.lower()
+
+    @staticmethod
+    def disambiguate_some(elements):
+        DisambiguatorSome.calls.append(len(elements))
+        return [element.lower() for element in elements]
+
+
 class DisambiguatorInvalid(object):
 
     @staticmethod
@@ -68,6 +92,31 @@ class TestSmartQueue(object):
         queued_elements = self.queue.push_some(some_elements)
         assert (set(queued_elements) - set(some_elements)) == set()
 
+    def test_push_some_error(self):
+        with pytest.raises(PimPamQueuesError):
+            self.queue.push_some(None)
+        with pytest.raises(PimPamQueuesError):
+            list(self.queue.iter_push_some(None))
+
+    def test_push_some_pipelined(self):
+        queued_elements = self.queue.push_some(some_elements,
+                                               num_block_size=2,
+                                               num_pipeline_depth=3)
+        assert queued_elements == self.queue.elements()
+        assert len(queued_elements) == len(set(some_elements))
+
+    def test_push_some_stream(self):
+        elements = (element for element in some_elements)
+        queued_elements = self.queue.push_some(elements, num_block_size=3,
+                                               stream=True)
+        assert queued_elements == self.queue.elements()
+
+    def test_iter_push_some(self):
+        queued_elements = self.queue.iter_push_some(some_elements,
+                                                    num_block_size=2)
+        assert next(queued_elements) == ELEMENT_EGG
+        assert self.queue.num() == 2
+
     def test_push_smart(self):
         self.queue.push(ELEMENT_EGG)
         self.queue.push(ELEMENT_BACON)
@@ -120,6 +169,11 @@ class TestSmartQueue(object):
     def test_pop_none(self):
         assert self.queue.pop() is None
 
+    def test_pop_some(self):
+        queued_elements = self.queue.push_some(some_elements)
+        assert self.queue.pop_some(2) == queued_elements[0:2]
+        assert self.queue.push(queued_elements[0]) == ''
+
     def test_elements(self):
         self.queue.push_some(some_elements)
         elements = self.queue.elements()
@@ -149,6 +203,128 @@ class TestSmartQueue(object):
         assert (set(queued_elements) - (set(some_elements)) == set())
         assert self.queue.push(ELEMENT_SPAM_UPPERCASED) == ''
 
+    def test_disambiguate_some_hook(self):
+        DisambiguatorSome.calls[:] = []
+        self.queue = SmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn,
+            disambiguator=DisambiguatorSome,
+        )
+        assert self.queue.push_some(some_elements, num_block_size=3) == [
+            ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM, ELEMENT_42]
+        assert DisambiguatorSome.calls == [3, 3, 2]
+
+    def test_disambiguate_thread_pool(self):
+        elements = [b'%d' % (i % 500, ) for i in range(1200)] + \
+            [ELEMENT_SPAM_UPPERCASED, ELEMENT_SPAM]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.queue = SmartQueue(
+                id_args=['test', 'testing'],
+                redis_conn=redis_conn,
+                disambiguator=Disambiguator,
+                executor=executor,
+            )
+            assert self.queue.disambiguate_some(elements) == \
+                [element.lower() for element in elements]
+            assert self.queue.push_some(elements, num_block_size=100,
+                                        num_pipeline_depth=2) == \
+                elements[0:500] + [ELEMENT_SPAM]
+            assert self.queue.push_some(iter([b'EGG', b'egg']), stream=True,
+                                        num_block_size=1) == [ELEMENT_EGG]
+            assert self.queue.push_some([b'BACON', b'bacon'], to_first=True,
+                                        num_block_size=1) == [ELEMENT_BACON]
+        assert self.queue.first_elements(3) == [ELEMENT_BACON, b'0', b'1']
+        assert self.queue.num() == 503
+
+    def test_disambiguate_process_pool(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.queue = SmartQueue(
+                id_args=['test', 'testing'],
+                redis_conn=redis_conn,
+                disambiguator=DisambiguatorSome,
+                executor=executor,
+            )
+            assert self.queue.push_some(some_elements, num_block_size=2) == [
+                ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM, ELEMENT_42]
+
+    def test_disambiguate_cache(self):
+        DisambiguatorSome.calls[:] = []
+        self.queue = SmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn,
+            disambiguator=DisambiguatorSome,
+            cache_size=2,
+        )
+        queue = SmartQueue(
+            id_args=['test', 'testing', 'cache'],
+            redis_conn=redis_conn,
+            disambiguator=DisambiguatorSome,
+            cache_size=100,
+        )
+        assert queue.disambiguator_cache is self.queue.disambiguator_cache
+        assert self.queue.push_some([ELEMENT_SPAM_UPPERCASED, ELEMENT_EGG,
+                                     ELEMENT_SPAM_UPPERCASED]) == [
+            ELEMENT_SPAM_UPPERCASED.lower(), ELEMENT_EGG]
+        assert DisambiguatorSome.calls == [3]
+        assert queue.disambiguate(ELEMENT_SPAM_UPPERCASED) == ELEMENT_SPAM
+        assert DisambiguatorSome.calls == [3]
+        assert queue.disambiguate(ELEMENT_BACON) == ELEMENT_BACON
+        stats = queue.disambiguator_cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 4
+        assert stats['evictions'] == 1
+        disambiguator_caches.clear()
+
+    def test_queued_cache(self):
+        self.queue = SmartQueue(
+            id_args=['test', 'testing'],
+            redis_conn=redis_conn,
+            queued_cache_size=100,
+        )
+        assert self.queue.push_some(some_elements) == [
+            ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM, ELEMENT_42,
+            ELEMENT_SPAM_UPPERCASED]
+        assert self.queue.push_some([ELEMENT_EGG, ELEMENT_SPAM]) == []
+        assert self.queue.queued_cache.stats()['hits'] == 2
+        assert self.queue.push(ELEMENT_EGG, force=True) == ELEMENT_EGG
+        self.queue.delete()
+        assert self.queue.push(ELEMENT_EGG) == ELEMENT_EGG
+
+    def test_queued_cache_checked(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'cached'],
+                           redis_conn=redis_conn, keep_previous=False,
+                           fingerprint_bits=64, two_phase=True,
+                           queued_cache_size=100)
+        queue_uncached = SmartQueue(id_args=['test', 'testing', 'cached'],
+                                    redis_conn=redis_conn,
+                                    fingerprint_bits=64)
+        queue_uncached.push(ELEMENT_BACON)
+        assert queue.push(ELEMENT_BACON) == ''
+        assert queue.push_some([ELEMENT_EGG, ELEMENT_BACON]) == [ELEMENT_EGG]
+        assert queue.queued_cache.stats()['hits'] == 1
+        assert len(queue.queued_cache) == 2
+        queue.delete()
+
+    def test_queued_cache_invalid(self):
+        with pytest.raises(PimPamQueuesError):
+            SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                       queued_cache_size=100, dedup_window=60)
+
+    def test_iter_bucket(self):
+        self.queue.push_some(some_elements)
+        self.queue.pop()
+        assert set(self.queue.iter_bucket(batch=2)) == set(some_elements)
+        assert list(self.queue.iter_elements(batch=2, prefetch=True)) == \
+            self.queue.elements()
+
+        queue = SmartQueue(id_args=['test', 'testing', 'window'],
+                           redis_conn=redis_conn, dedup_window=60,
+                           keep_previous=False)
+        queue.push_some(some_elements)
+        assert set(queue.iter_bucket(batch=1, prefetch=True)) == \
+            set(some_elements)
+        queue.delete()
+
     def test_disambiguate_invalid(self):
         with pytest.raises(PimPamQueuesDisambiguatorInvalidError):
             self.queue = SmartQueue(
@@ -174,6 +350,156 @@ class TestSmartQueue(object):
         )
         assert queue.is_empty() is True
 
+    def test_fingerprint_push_some(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'fingerprint'],
+                           redis_conn=redis_conn, fingerprint_bits=64)
+        assert queue.push_some(some_elements) == [
+            ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM, ELEMENT_42,
+            ELEMENT_SPAM_UPPERCASED]
+        assert queue.push(ELEMENT_EGG) == ''
+        assert queue.push(ELEMENT_EGG, force=True) == ELEMENT_EGG
+        assert queue.is_element(ELEMENT_SPAM)
+        assert len(redis_conn.srandmember(queue.key_queue_bucket)) == 8
+        assert queue.pop() == ELEMENT_EGG
+        queue.delete()
+
+    def test_fingerprint_invalid(self):
+        with pytest.raises(PimPamQueuesFingerprintInvalidError):
+            SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                       fingerprint_bits=32)
+
+    def test_fingerprint_convert_bucket(self):
+        self.queue.push_some(some_elements)
+        queue = SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                           fingerprint_bits=128)
+        assert queue.convert_bucket(num_block_size=2) == 5
+        assert queue.is_element(ELEMENT_BACON)
+        assert len(redis_conn.srandmember(queue.key_queue_bucket)) == 16
+        assert queue.push_some(some_elements) == []
+        assert queue.num() == 5
+
+    def test_fingerprint_convert_bucket_twice(self):
+        self.queue.push_some(some_elements)
+        queue = SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                           fingerprint_bits=64)
+        assert queue.convert_bucket() == 5
+        with pytest.raises(PimPamQueuesError):
+            queue.convert_bucket()
+        assert queue.is_element(ELEMENT_BACON)
+        queue.delete()
+        assert redis_conn.exists(queue.key_queue_bucket_fingerprints) == 0
+
+    def test_fingerprint_convert_empty_bucket(self):
+        queue = SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                           fingerprint_bits=64)
+        assert queue.convert_bucket() == 0
+        queue.push(ELEMENT_EGG)
+        with pytest.raises(PimPamQueuesError):
+            queue.convert_bucket()
+        assert queue.is_element(ELEMENT_EGG)
+
+    def test_fingerprint_not_string(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'fingerprint'],
+                           redis_conn=redis_conn, fingerprint_bits=64,
+                           dedup_key=len)
+        assert queue.fingerprint(3) == queue.fingerprint('3')
+        assert queue.push_some([ELEMENT_EGG, ELEMENT_42, ELEMENT_BACON]) == \
+            [ELEMENT_EGG, ELEMENT_42, ELEMENT_BACON]
+        assert queue.push(b'ham') == ''
+        queue.delete()
+
+    def test_dedup_window(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'window'],
+                           redis_conn=redis_conn, dedup_window=60)
+        assert queue.push_some(some_elements) == [
+            ELEMENT_EGG, ELEMENT_BACON, ELEMENT_SPAM, ELEMENT_42,
+            ELEMENT_SPAM_UPPERCASED]
+        assert queue.push(ELEMENT_EGG) == ''
+        assert queue.push(ELEMENT_EGG, force=True) == ELEMENT_EGG
+        assert queue.is_element(ELEMENT_EGG) is True
+        assert 0 < redis_conn.pttl(queue.key_queue_bucket) <= 60000
+
+        redis_conn.zadd(queue.key_queue_bucket, {ELEMENT_EGG: 0})
+        assert queue.is_element(ELEMENT_EGG) is False
+        assert queue.push(ELEMENT_EGG) == ELEMENT_EGG
+        assert queue.num() == 7
+        queue.delete()
+
+    def test_dedup_window_fingerprint(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'window'],
+                           redis_conn=redis_conn, dedup_window=60,
+                           fingerprint_bits=64)
+        assert queue.push_some([ELEMENT_EGG, ELEMENT_EGG]) == [ELEMENT_EGG]
+        assert queue.is_element(ELEMENT_EGG) is True
+        assert queue.elements() == [ELEMENT_EGG]
+        queue.delete()
+
+    def test_dedup_window_expire_bucket(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'window'],
+                           redis_conn=redis_conn, dedup_window=60)
+        redis_conn.zadd(queue.key_queue_bucket,
+                        dict(('e%s' % i, i) for i in range(250)))
+        assert queue.expire_bucket() == 100
+        assert queue.push(ELEMENT_EGG) == ELEMENT_EGG
+        assert redis_conn.zcard(queue.key_queue_bucket) == 51
+        assert queue.expire_bucket(num_elements=1000) == 50
+        assert redis_conn.zrange(queue.key_queue_bucket, 0, -1) == \
+            [ELEMENT_EGG]
+        queue.delete()
+
+    def test_dedup_window_short(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'window'],
+                           redis_conn=redis_conn, dedup_window=0.05)
+        assert queue.push(ELEMENT_EGG) == ELEMENT_EGG
+        time.sleep(0.1)
+        assert queue.push(ELEMENT_EGG) == ELEMENT_EGG
+        queue.delete()
+
+    def test_dedup_window_filter(self):
+        with pytest.raises(PimPamQueuesError):
+            SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                       dedup_window=60, dedup_filter=BloomFilter())
+
+    def test_push_some_reply_count(self):
+        assert self.queue.push_some(some_elements, reply=REPLY_COUNT) == 5
+        assert self.queue.push_some(some_elements, reply=REPLY_COUNT) == 0
+
+    def test_push_some_reply_indices(self):
+        assert self.queue.push_some(some_elements, num_block_size=3,
+                                    num_pipeline_depth=1,
+                                    reply=REPLY_INDICES) == [0, 1, 2, 5, 7]
+        assert self.queue.push_some([ELEMENT_42, b'ham'],
+                                    reply=REPLY_INDICES) == [1]
+
+    def test_push_some_reply_indices_to_first(self):
+        assert self.queue.push_some(some_elements, to_first=True,
+                                    reply=REPLY_INDICES) == [7, 6, 5, 1, 0]
+        assert self.queue.elements() == [
+            ELEMENT_EGG, ELEMENT_BACON, ELEMENT_42, ELEMENT_SPAM,
+            ELEMENT_SPAM_UPPERCASED]
+
+    def test_push_some_reply_indices_stream(self):
+        assert self.queue.push_some(iter(some_elements), stream=True,
+                                    num_block_size=3,
+                                    reply=REPLY_INDICES) == [0, 1, 2, 5, 7]
+
+    def test_two_phase(self):
+        queue = SmartQueue(id_args=['test', 'testing', 'twophase'],
+                           redis_conn=redis_conn, fingerprint_bits=64,
+                           two_phase=True)
+        assert queue.push_some(some_elements[0:3]) == some_elements[0:3]
+        assert queue.push_some(some_elements, num_block_size=2,
+                               reply=REPLY_INDICES) == [5, 7]
+        assert queue.push(ELEMENT_EGG) == ''
+        assert queue.push(ELEMENT_EGG, force=True) == ELEMENT_EGG
+        assert queue.num() == 6
+        queue.delete()
+
+    def test_two_phase_invalid(self):
+        with pytest.raises(PimPamQueuesError):
+            SmartQueue(id_args=['test', 'testing'], redis_conn=redis_conn,
+                       two_phase=True)
+
     def teardown(self):
         self.queue.delete()
 
@@ -33,6 +33,14 @@ class TestTools(object):
         assert self.block_slices_3_141592[0] == [0, 3]
         assert self.block_slices_0_1000[0] == [0, 0]
 
+    def test_blocks(self):
+        blocks = list(Tools.get_blocks(iter(range(27)), 10))
+        assert len(blocks) == 3
+        assert blocks[2] == list(range(20, 27))
+
+    def test_blocks_empty(self):
+        assert list(Tools.get_blocks(iter([]), 10)) == []
+
 
 if __name__ == '__main__':
     pytest.main()